@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+"""
+Bootstrap confidence intervals of the fitted and derived quantities.
+
+Each replicate is a resampled spectrum, refitted from the best fit (warm
+start) with the same cost, bounds, disabled sliders and constraints. Every
+numeric output of the fit (sliders, secondary variables, mismatch, V(t),
+mx, mt...) is recorded, and the percentile interval of each one is reported.
+
+Two resampling modes:
+  - "residuals": Z* = Z_fit * (Z / Z_fit)[i] with i drawn with replacement,
+    so the frequencies are kept and the relative misfit is resampled.
+  - "points": the frequency points themselves are drawn with replacement.
+
+The replicates run on a process pool that BootstrapRunner keeps between
+runs with the same settings, so a folder is bootstrapped without restarting
+the workers. Each worker builds its Calculator once; a task carries a chunk
+of replicate seeds with the spectrum (a few kB) once for the whole chunk.
+"""
+import os
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from .PoolJobs import JobMonitor, iter_completed
+
+MODES = ("residuals", "points")
+
+# Columns of [VariablesToPrint] that are not numbers.
+NON_NUMERIC_VARIABLES = ("file", "date/time", "model", "comment")
+
+
+def interval_columns(variables_to_print) -> list:
+    """Return the names of the interval columns of the numeric variables, low then high."""
+    return [f"{key}_{bound}" for key in variables_to_print if key not in NON_NUMERIC_VARIABLES
+            for bound in ("lo", "hi")]
+
+
+@dataclass
+class BootstrapSettings:
+    """Fit settings sent once to every worker process."""
+    model_name: str
+    negative_rinf: bool
+    gaussian_prior: bool
+    disabled_variables: frozenset
+    lower_bounds: dict
+    upper_bounds: dict
+    backend: str = "auto"
+    optimizer: str = "trf"
+    tolerance: float = 1e-8
+    # (N, T) of the V(t) transform.
+    time_domain: tuple = (2 ** 14, 4)
+
+
+@dataclass
+class BootstrapResult:
+    """
+    Values of every numeric output over the successful replicates, and
+    their percentile intervals at level percent.
+    """
+    level: float
+    requested: int
+    samples: dict = field(default_factory=dict)
+    intervals: dict = field(default_factory=dict)
+
+    @property
+    def replicates(self) -> int:
+        """Number of successful replicates."""
+        return max((len(values) for values in self.samples.values()), default=0)
+
+    def columns(self) -> dict:
+        """Return the intervals as {key_lo: low, key_hi: high}, named as interval_columns."""
+        columns = {}
+        for key, (low, high) in self.intervals.items():
+            columns[f"{key}_lo"] = low
+            columns[f"{key}_hi"] = high
+        return columns
+
+    @classmethod
+    def from_outputs(cls, outputs: list, level: float, requested: int) -> "BootstrapResult":
+        """Build the result from the output dicts of the successful replicates."""
+        result = cls(level, requested)
+        if not outputs:
+            return result
+        tail = (100.0 - level) / 2
+        for key in outputs[0]:
+            values = np.array([output.get(key, np.nan) for output in outputs], dtype=float)
+            result.samples[key] = values
+            finite = values[np.isfinite(values)]
+            if finite.size:
+                low, high = np.percentile(finite, [tail, 100.0 - tail])
+                result.intervals[key] = (float(low), float(high))
+        return result
+
+
+def resample(experiment_data: dict, z_fit: np.ndarray, mode: str, rng: np.random.Generator) -> dict:
+    """Return one bootstrap replicate of the spectrum (see the modes above)."""
+    freq = np.asarray(experiment_data["freq"])
+    z = np.asarray(experiment_data["Z_real"]) + 1j * np.asarray(experiment_data["Z_imag"])
+    index = rng.integers(0, freq.size, freq.size)
+    if mode == "points":
+        # Keep the order of the frequencies, as in the input files.
+        index.sort()
+        z_new, freq_new = z[index], freq[index]
+    elif mode == "residuals":
+        z_new, freq_new = z_fit * (z / z_fit)[index], freq
+    else:
+        raise ValueError(f"Bootstrap.resample: unknown mode '{mode}'. Expected one of {MODES}.")
+    return {"freq": np.array(freq_new, dtype=float), "Z_real": z_new.real.copy(), "Z_imag": z_new.imag.copy()}
+
+
+###############################################################################
+# Runner
+###############################################################################
+class BootstrapRunner(object):
+    """
+    Runs bootstrap replicates on a process pool of max_workers processes
+    (all the cores by default, in this process when it is 1). The pool is
+    kept for the next runs while the settings do not change.
+    """
+    def __init__(self, max_workers: int = None):
+        self.max_workers = max_workers
+        self._executor = None
+        self._settings = None
+
+    def run(self, settings: BootstrapSettings, experiment_data: dict, z_fit: np.ndarray,
+            best_fit: dict, cost: str, replicates: int, level: float = 95, mode: str = "residuals",
+            seed=None, progress=None, monitor: JobMonitor = None) -> BootstrapResult:
+        """
+        Refit replicates resampled spectra from best_fit, whose impedance on
+        the frequencies of experiment_data is z_fit. progress(done, total)
+        is called as the replicates complete. A cancelled monitor stops the
+        run: the intervals are computed from the replicates completed so far,
+        or JobInterrupted is raised (see PoolJobs.JobMonitor).
+        """
+        if mode not in MODES:
+            raise ValueError(f"BootstrapRunner.run: unknown mode '{mode}'. Expected one of {MODES}.")
+        seeds = np.random.SeedSequence(seed).generate_state(replicates).tolist()
+        data = {key: np.asarray(experiment_data[key], dtype=float) for key in ("freq", "Z_real", "Z_imag")}
+        outputs, done = [], 0
+
+        for chunk_outputs in self._map_chunks(settings, (data, z_fit, best_fit, cost, mode), seeds, monitor):
+            done += len(chunk_outputs)
+            outputs.extend(output for output in chunk_outputs if output is not None)
+            if progress is not None:
+                progress(done, replicates)
+
+        return BootstrapResult.from_outputs(outputs, level, replicates)
+
+    def close(self) -> None:
+        """Stop the worker processes."""
+        if self._executor is not None:
+            self._executor.shutdown()
+        self._executor = None
+        self._settings = None
+
+    def _map_chunks(self, settings: BootstrapSettings, task: tuple, seeds: list, monitor: JobMonitor = None):
+        """Yield the outputs of the chunks of seeds as they complete, until monitor is cancelled."""
+        if self.max_workers == 1:
+            if self._settings != settings:
+                _init_bootstrap_worker(settings)
+                self._settings = settings
+            for chunk in _chunks(seeds, len(seeds)):
+                if monitor is not None and monitor.check():
+                    return
+                yield _bootstrap_chunk(*task, chunk)
+            return
+
+        if self._executor is None or self._settings != settings:
+            self.close()
+            self._executor = ProcessPoolExecutor(self.max_workers, initializer=_init_bootstrap_worker,
+                                                 initargs=(settings,))
+            self._settings = settings
+        workers = self.max_workers or os.cpu_count() or 1
+        chunks = _chunks(seeds, 4 * workers)
+        futures = {self._executor.submit(_bootstrap_chunk, *task, chunk): chunk for chunk in chunks}
+        broken = False
+        # A cancel leaves the pool to the next run: only the chunks not started are cancelled.
+        for future in iter_completed(futures, monitor):
+            chunk = futures[future]
+            try:
+                chunk_outputs = future.result()
+            except Exception as e:
+                # The other chunks are kept: their replicates are still valid.
+                print(f"Bootstrap: a chunk of {len(chunk)} replicates failed: {type(e).__name__}: {e}")
+                broken = broken or isinstance(e, BrokenExecutor)
+                chunk_outputs = [None] * len(chunk)
+            yield chunk_outputs
+        if broken:
+            # A dead worker breaks the pool: the next run starts a new one.
+            self.close()
+
+
+def _chunks(seeds: list, n_chunks: int) -> list:
+    """Split seeds into at most n_chunks chunks of about the same size."""
+    size = max(1, -(-len(seeds) // n_chunks))
+    return [seeds[i:i + size] for i in range(0, len(seeds), size)]
+
+
+###############################################################################
+# Workers
+###############################################################################
+# Each process builds its Calculator once, in the initializer.
+_worker_calculator = None
+
+
+def _init_bootstrap_worker(settings: BootstrapSettings) -> None:
+    # Imported here: the Calculator owns a BootstrapRunner.
+    from .Calculator import Calculator
+
+    global _worker_calculator
+    _worker_calculator = Calculator.from_settings(settings)
+
+
+def _bootstrap_chunk(experiment_data: dict, z_fit: np.ndarray, best_fit: dict,
+                     cost: str, mode: str, seeds: list) -> list:
+    """Return the numeric outputs of one replicate per seed, None for the failed ones."""
+    calculator = _worker_calculator
+    fit_function = calculator.fit_model_bode if cost == "bode" else calculator.fit_model_cole
+    outputs = []
+    for seed in seeds:
+        replicate = resample(experiment_data, z_fit, mode, np.random.default_rng(seed))
+        try:
+            calculator.initialize_expdata(replicate)
+            fit = fit_function(best_fit)
+            outputs.append({key: float(value) for key, value in calculator.output_values(fit).items()
+                            if isinstance(value, (int, float, np.number)) and not isinstance(value, bool)})
+        except Exception as e:
+            # Any failure of one refit (ValueError, LinAlgError, FloatingPointError,
+            # numba errors...) only drops that replicate.
+            print(f"Bootstrap: a replicate failed: {type(e).__name__}: {e}")
+            outputs.append(None)
+    return outputs
+
+
+#------------------------------------------------------------------------------
+# Test
+#------------------------------------------------------------------------------
+def manual_test_bootstrap():
+    """
+    Bootstrap a noisy synthetic Series spectrum in this process and print
+    the intervals of a few parameters next to their true values.
+    Run with: python -m AuxiliaryClasses.Bootstrap
+    """
+    from .Calculator import Calculator
+    from .ModelCircuits import ModelCircuitSeries
+
+    true_params = {
+        "Linf": 1e-6, "Rinf": 1e3, "Rh": 5e4, "Fh": 1e4, "Ph": 0.8,
+        "Rm": 1e3, "Fm": 1e2, "Pm": 0.6, "Rl": 2e4, "Fl": 1.0, "Pl": 0.5,
+        "Re": 1e8, "Qe": 1e-6, "Pef": 0.5, "Pei": 0.3,
+    }
+    freq = np.logspace(6, -1, 40)
+    z, _ = ModelCircuitSeries().run_model(true_params, freq)
+    z *= 1 + 0.01 * np.random.default_rng(0).standard_normal(freq.size)
+
+    calculator = Calculator()
+    calculator.set_bounds({k: ("DoubleSliderWithTicks", 0.0, 1.0) if k.startswith('P')
+                           else ("EPowerSliderWithTicks", -10, 10) for k in true_params})
+    calculator.set_circuit_model(ModelCircuitSeries.name)
+    calculator.set_bootstrap(replicates=20, max_workers=1)
+    calculator.initialize_expdata({"freq": freq, "Z_real": z.real, "Z_imag": z.imag})
+
+    best_fit = calculator.fit_model_cole(true_params)
+    result = calculator.run_bootstrap(best_fit, "cole", seed=0)
+    print(f"{result.replicates}/{result.requested} replicates, {result.level:g}% intervals:")
+    for key in ("Rh", "Fh", "Ph", "Rl", "Fl", "Pl"):
+        low, high = result.intervals[key]
+        print(f"    {key}: true {true_params[key]:.4g}, interval [{low:.4g}, {high:.4g}]")
+
+
+if __name__ == '__main__':
+    manual_test_bootstrap()
@@ -1,5 +1,6 @@
 
 from dataclasses import dataclass
+from functools import partial
 
 import numpy as np
 import scipy.optimize as opt
@@ -9,9 +10,17 @@ from scipy.optimize import Bounds
 from scipy.interpolate import PchipInterpolator
 
 from PyQt5.QtCore import QCoreApplication, QObject, pyqtSignal
-from .ModelCircuits import ModelCircuitParent, ModelCircuitParallel, ModelCircuitSeries
+from .ModelCircuits import ModelCircuitParent, ModelCircuitParallel, ModelCircuitSeries, ModelCircuitRegistry
 from .TimeDomainBuilder import TimeDomainBuilder
-from .FitBuilder import FitBuilder
+from .FitBuilder import CoarseFitSettings, FitBuilder, FitMonitor, MultiStartResult
+from .FitThread import FitThread, JobThread
+from .FitCache import FitCache
+from .FitTelemetry import TelemetryLog
+from .Bootstrap import BootstrapResult, BootstrapRunner, BootstrapSettings
+from .CircuitKernels import set_backend as set_kernel_backend, get_backend as get_kernel_backend
+from .FitChain import FitChain
+from .PoolJobs import JobMonitor
+from .RangeSweep import RangeSweepResult, run_range_sweep
 
 # Bounds are scaled. Need to add padding for 0 values, handle Qei,
 # and implement a way of making Rinf negative.
@@ -20,6 +29,10 @@ from .FitBuilder import FitBuilder
 # The calculations related to the circuit models have been moved to the class "models"
 #--------------------------------------------------------------------------------------
 
+# Weight of the Gaussian prior of each cost function.
+PRIOR_WEIGHTS = {"cole": 10 ** 6, "bode": 400}
+
+
 @dataclass
 class CalculationResult:
     """
@@ -40,6 +53,8 @@ class CalculationResult:
     timedomain_time: np.ndarray = None
     timedomain_volt_down: np.ndarray = None
     timedomain_volt_up: np.ndarray = None
+    # True when the time-domain curve is a preview, coarser than [TimeDomain] points.
+    timedomain_preview: bool = False
 
 ###############################################################################
 # Calculator
@@ -50,6 +65,12 @@ class Calculator(QObject):
     config.ini. It also calculates secondary variables that were previously in Main.
     """
     model_manual_result = pyqtSignal(CalculationResult)
+    # Background fits: (evaluations, cost, best params so far), then the best fit ({} if discarded).
+    fit_progress = pyqtSignal(int, float, dict)
+    fit_finished = pyqtSignal(dict)
+    # Pool jobs (multi-start, bootstrap, range sweep): (done, total), then (name, result or None if discarded).
+    job_progress = pyqtSignal(int, int)
+    job_finished = pyqtSignal(str, object)
 
     def __init__(self) -> None:
         super().__init__()
@@ -60,7 +81,8 @@ class Calculator(QObject):
             "Z_imag": np.zeros(5),
         }
         # Initialize the circuit model.
-        self._model_circuit = ModelCircuitParallel()
+        self.circuit_registry = ModelCircuitRegistry()
+        self._model_circuit = self.circuit_registry.get_model_circuit(ModelCircuitParallel.name)
         # Instantiate Fit with both experiment data and the circuit model.
         self.fit_builder = FitBuilder(self._experiment_data, self._model_circuit)
         self.time_domain_builder = TimeDomainBuilder(self._model_circuit)
@@ -68,11 +90,44 @@ class Calculator(QObject):
         # Dictionary for additional fit variables.
         self._fit_variables = {'model': self._model_circuit.name}
         self._calculator_variables = {}
+        # Secondary variables (q, par_second, par_other_sec) of the last manual run.
+        self._secondary_variables = ({}, {}, {})
+        # Multi-start fits: number of starting points and of processes (None: all cores).
+        self.multistart_starts = 16
+        self.multistart_workers = None
+        # Fits of the session, used to warm-start the next files.
+        self.fit_chain = FitChain()
+        # Background fit: running thread, and wall-clock budget in seconds (None: no limit).
+        self._fit_thread = None
+        self.fit_time_budget = None
+        # Background pool job: running thread and its name (see start_job).
+        self._job_thread = None
+        self._job_name = None
+        # Two-stage fits: CoarseFitSettings of the first stage (None: one stage),
+        # budget of the refinement (None: fit_time_budget), and whether the running fit refines.
+        self.coarse_fit = None
+        self.refine_time_budget = None
+        self._fit_refining = False
+        # Tracking refits: range changes of at most tracking_shift points, tracking_evaluations evaluations.
+        self.tracking_shift = 3
+        self.tracking_evaluations = 8
+        # Bootstrap intervals: replicates, resampling mode, level (%), and the pool runner.
+        self.bootstrap_replicates = 100
+        self.bootstrap_mode = "residuals"
+        self.bootstrap_level = 95.0
+        self.bootstrap_runner = BootstrapRunner()
+        # Frequency-range sweep.
+        self.sweep_steps = 8
+        self.sweep_min_points = 10
+        self.sweep_workers = None
 
     # Public Methods (Interface Unchanged)
     def initialize_expdata(self, file_data: dict) -> None:
         """Set the experimental data from an external dictionary."""
         
+        # A running fit would mix the old and the new data.
+        self._discard_running_fit()
+
         self._experiment_data = file_data
         self.fit_builder.set_expdata(self._experiment_data)
 
@@ -81,6 +136,146 @@ class Calculator(QObject):
         
         self._model_circuit.negative_rinf = state
 
+    def set_backend(self, backend: str) -> None:
+        """Select the backend of the circuit kernels: 'auto', 'numpy' or 'numba'."""
+        
+        set_kernel_backend(backend)
+
+    def set_time_domain_cache(self, max_entries: int) -> None:
+        """Keep the last max_entries time-domain responses, by rock parameters (0 disables it)."""
+        
+        self.time_domain_builder.set_cache_size(max_entries)
+
+    def set_time_domain_resolution(self, points: int, duration: float) -> None:
+        """Compute V(t) from points frequencies (a power of 2) over duration seconds."""
+        
+        self.time_domain_builder.set_resolution(points, duration)
+
+    def set_time_domain_preview(self, points: int) -> None:
+        """Compute V(t) from points frequencies in the previews of run_model_manual (0: full resolution)."""
+        
+        self.time_domain_builder.set_preview_resolution(points)
+
+    def set_optimizer(self, name: str) -> None:
+        """Select the optimizer backend of the fits: 'trf', 'lm', 'quick', 'auto' or the experimental 'dogbox'."""
+        
+        self.fit_builder.set_optimizer(name)
+
+    def set_fit_tolerance(self, tolerance: float) -> None:
+        """Set the tolerance (ftol, xtol and gtol) of the fits; quick uses a looser one derived from it."""
+        
+        self.fit_builder.set_fit_tolerance(tolerance)
+
+    def set_multistart(self, n_starts: int, max_workers: int) -> None:
+        """Set the number of starts of the multi-start fits and of worker processes (0: all cores)."""
+        
+        self.multistart_starts = max(1, int(n_starts))
+        self.multistart_workers = int(max_workers) or None
+
+    def set_bootstrap(self, replicates: int, max_workers: int = 0, mode: str = "residuals",
+                      level: float = 95) -> None:
+        """
+        Set the bootstrap replicates, worker processes (0: all cores),
+        resampling mode ("residuals" or "points") and interval level in %.
+        """
+        self.bootstrap_replicates = max(0, int(replicates))
+        self.bootstrap_mode = mode
+        self.bootstrap_level = float(level)
+        self.bootstrap_runner.close()
+        self.bootstrap_runner = BootstrapRunner(int(max_workers) or None)
+
+    def set_range_sweep(self, steps: int, min_points: int = 10, max_workers: int = 0) -> None:
+        """
+        Sweep grids of steps x steps sub-ranges of at least min_points points,
+        on max_workers processes (0 uses all the cores, 1 fits in this process).
+        """
+        self.sweep_steps = max(1, int(steps))
+        self.sweep_min_points = max(2, int(min_points))
+        self.sweep_workers = int(max_workers) or None
+
+    def set_fit_cache(self, max_entries: int, path: str = None) -> None:
+        """
+        Keep the results of the last max_entries Cole and Bode fits (0 disables
+        the cache), in memory and, when path is given, in that .json file.
+        """
+        self.fit_builder.set_fit_cache(FitCache(max_entries, path) if max_entries > 0 else None)
+
+    def fit_cache_stats(self):
+        """Return the hits, misses and entries of the fit cache, or None without a cache."""
+        
+        fit_cache = self.fit_builder.fit_cache
+        return None if fit_cache is None else fit_cache.stats()
+
+    def set_fit_telemetry(self, history: int, path: str = None) -> None:
+        """
+        Keep the telemetry of the last history fits and, when path is given,
+        append each fit to that JSON-lines file.
+        """
+        self.fit_builder.telemetry_log = TelemetryLog(history, path)
+
+    def fit_telemetry(self):
+        """Return the FitTelemetry of the last fit, or None before the first fit."""
+        
+        return self.fit_builder.last_telemetry
+
+    def set_fit_time_budget(self, seconds: float) -> None:
+        """Set the wall-clock budget of the background fits (0: no limit)."""
+        
+        self.fit_time_budget = float(seconds) or None
+
+    def set_two_stage_fit(self, enabled: bool, settings: CoarseFitSettings = None,
+                          refine_time_budget: float = 0) -> None:
+        """
+        Run start_fit in two stages: a coarse fit with settings, applied at
+        once, then the full fit from it in the background, within
+        refine_time_budget seconds (0: fit_time_budget).
+        """
+        self.coarse_fit = (settings or CoarseFitSettings()) if enabled else None
+        self.refine_time_budget = float(refine_time_budget) or None
+
+    def coarse_fit_telemetry(self):
+        """Return the FitTelemetry of the first stage of the last fit, or None if it had none."""
+        
+        return self.fit_builder.last_coarse_telemetry
+
+    def set_tracking(self, max_shift: int, max_evaluations: int) -> None:
+        """Track range changes of at most max_shift points, with at most max_evaluations evaluations."""
+        self.tracking_shift = max(1, int(max_shift))
+        self.tracking_evaluations = max(2, int(max_evaluations))
+
+    def track_fit(self, cost: str, initial_params: dict) -> dict:
+        """Re-solve the last fit after a small change of the frequency range (see FitBuilder.fit_model_tracking)."""
+        
+        return self.fit_builder.fit_model_tracking(cost, initial_params, PRIOR_WEIGHTS[cost], self.tracking_evaluations)
+
+    def tracking_telemetry(self):
+        """Return the FitTelemetry of the last tracking refit, or None."""
+        
+        return self.fit_builder.last_tracking_telemetry
+
+    def set_fit_chain(self, state: bool) -> None:
+        """Enable or disable the warm start of new files from the closest fitted file."""
+        
+        self.fit_chain.set_enabled(state)
+
+    def chain_initial_guess(self):
+        """
+        Return (params, source file) to start the fit of the current data
+        when chaining is enabled and a file has been fitted, None otherwise.
+        """
+        if not self.fit_chain.enabled:
+            return None
+        return self.fit_chain.initial_guess(self._experiment_data)
+
+    def record_chain_fit(self, file_name: str, best_fit: dict, warm: bool):
+        """
+        Keep the last fit of file_name for the next warm starts. Returns the
+        evaluations saved by a warm start, or None if unknown.
+        """
+        self.fit_chain.record(file_name, self._experiment_data, best_fit,
+                              self.fit_builder.last_evaluations, warm)
+        return self.fit_chain.saved_evaluations(file_name)
+
     def set_gaussian_prior(self, state: bool) -> None:
         """Enable or disable the Gaussian prior for model fitting."""
         
@@ -102,14 +297,16 @@ class Calculator(QObject):
     def get_latest_secondaries(self) -> dict:
         """Return the most recent dictionary of secondary variables."""
         
-        return dict(self._model_circuit.par_second | self._calculator_variables | self._model_circuit.par_other_sec)
+        _, par_second, par_other_sec = self._secondary_variables
+        return dict(par_second | self._calculator_variables | par_other_sec)
 
     def get_model_parameters(self) -> dict:
         """
         Return the combined dictionary of model parameters, integrating:
         """
         integral_variables = self.time_domain_builder.get_integral_variables()
-        model_variables = self._model_circuit.q | self._model_circuit.par_second | self._model_circuit.par_other_sec
+        q, par_second, par_other_sec = self._secondary_variables
+        model_variables = q | par_second | par_other_sec
         fit_variables = self._fit_variables
         calc_variables = self._calculator_variables
         
@@ -121,46 +318,236 @@ class Calculator(QObject):
           - True selects ModelCircuitSeries.
           - False selects ModelCircuitParallel.
         """
-        
-        neg_rinf, old_q, old_vsec, old_ovsec = self._model_circuit.init_parameters()
-        if state:
-            self._model_circuit = ModelCircuitSeries(
-                negative_rinf=neg_rinf,
-                q=dict(old_q),
-                par_second=dict(old_vsec),
-                par_other_sec=dict(old_ovsec)
-            )
-        else:
-            self._model_circuit = ModelCircuitParallel(
-                negative_rinf=neg_rinf,
-                q=dict(old_q),
-                par_second=dict(old_vsec),
-                par_other_sec=dict(old_ovsec)
-            )
+        self.set_circuit_model(ModelCircuitSeries.name if state else ModelCircuitParallel.name)
+
+    def set_circuit_model(self, model_name: str) -> None:
+        """
+        Select any circuit model of the registry by name, keeping the sign
+        of Rinf of the current one.
+        """
+        self._discard_running_fit()
+        self._model_circuit = self.circuit_registry.get_model_circuit(
+            model_name,
+            negative_rinf=self._model_circuit.negative_rinf
+        )
         self.time_domain_builder.set_model_circuit(self._model_circuit)
         self.fit_builder.set_model_circuit(self._model_circuit)
+        self._fit_variables['model'] = self._model_circuit.name
         
         print(f"Using {self._model_circuit.name}")
 
-    def fit_model_cole(self, initial_params: dict) -> dict:
+    def fit_model_cole(self, initial_params: dict, monitor: FitMonitor = None) -> dict:
         """Fit the model using the Cole cost function."""
         
-        prior_weight = 10 ** 6
-        return self.fit_builder.fit_model_cole(initial_params, prior_weight)
+        prior_weight = PRIOR_WEIGHTS["cole"]
+        return self.fit_builder.fit_model_cole(initial_params, prior_weight, monitor)
 
-    def fit_model_bode(self, initial_params: dict) -> dict:
+    def fit_model_bode(self, initial_params: dict, monitor: FitMonitor = None) -> dict:
         """Fit the model using the Bode cost function."""
                 
-        prior_weight = 400
-        return self.fit_builder.fit_model_bode(initial_params, prior_weight)
+        prior_weight = PRIOR_WEIGHTS["bode"]
+        return self.fit_builder.fit_model_bode(initial_params, prior_weight, monitor)
+
+    def start_fit(self, cost: str, initial_params: dict) -> bool:
+        """
+        Start the Cole or Bode fit in a background thread, within
+        fit_time_budget. fit_progress and fit_finished are emitted in the
+        thread of the Calculator. Returns False if a fit or job is already running.
+        With set_two_stage_fit, the coarse fit is run and emitted first, and
+        the thread refines it (unless the fit is in the fit cache).
+        """
+        if self.is_busy():
+            return False
+        fit_function = self.fit_model_bode if cost == "bode" else self.fit_model_cole
+        time_budget = self.fit_time_budget
+        self.fit_builder.last_coarse_telemetry = None
+        self._fit_refining = False
+        if (self.coarse_fit is not None
+                and not self.fit_builder.has_cached_fit(cost, initial_params, PRIOR_WEIGHTS[cost])):
+            try:
+                coarse = self.fit_builder.fit_model_coarse(cost, initial_params, PRIOR_WEIGHTS[cost], self.coarse_fit)
+            except Exception as e:
+                # The full fit still runs from initial_params, and reports its own failure.
+                print(f"Calculator.start_fit: the coarse fit failed: {type(e).__name__}: {e}")
+            else:
+                fit_function = self._refinement(fit_function, initial_params)
+                initial_params = coarse
+                time_budget = self.refine_time_budget or self.fit_time_budget
+                self._fit_refining = True
+        thread = FitThread(fit_function, initial_params, time_budget)
+        thread.progress.connect(self._on_fit_thread_progress)
+        thread.fit_done.connect(self._on_fit_thread_done)
+        self._fit_thread = thread
+        thread.start()
+        return True
+
+    def is_fitting(self) -> bool:
+        """Return True while a background fit is running."""
+        
+        return self._fit_thread is not None and self._fit_thread.isRunning()
+
+    def is_refining(self) -> bool:
+        """Return True while the background refinement of a two-stage fit is running."""
+        
+        return self._fit_refining and self.is_fitting()
+
+    def cancel_fit(self, keep_best: bool = True, wait: bool = False) -> None:
+        """
+        Stop the background fit: its best point so far is applied, or nothing
+        if keep_best is False. With wait, return once the thread has ended.
+        """
+        if not self.is_fitting():
+            return
+        self._fit_thread.cancel(keep_best)
+        if wait:
+            self._fit_thread.wait()
+
+    def is_busy(self) -> bool:
+        """Return True while a background fit or pool job is running."""
+        
+        return self.is_fitting() or self.is_running_job()
+
+    def start_job(self, name: str, job_function) -> bool:
+        """
+        Run job_function(progress=..., monitor=...) in a background thread.
+        job_progress and job_finished(name, result) are emitted in the
+        thread of the Calculator. Returns False if a fit or job is running.
+        """
+        if self.is_busy():
+            return False
+        thread = JobThread(job_function)
+        thread.progress.connect(self._on_job_thread_progress)
+        thread.job_done.connect(self._on_job_thread_done)
+        self._job_thread, self._job_name = thread, name
+        thread.start()
+        return True
+
+    def is_running_job(self) -> bool:
+        """Return True while a background pool job is running."""
+        
+        return self._job_thread is not None and self._job_thread.isRunning()
+
+    def cancel_job(self, keep_best: bool = True, wait: bool = False) -> None:
+        """
+        Stop the background job: the part completed so far is kept, or
+        nothing if keep_best is False. With wait, return once the thread has
+        ended (the tasks running in the worker processes are not waited for).
+        """
+        if not self.is_running_job():
+            return
+        self._job_thread.cancel(keep_best)
+        if wait:
+            self._job_thread.wait()
+
+    def fit_model_multistart(self, initial_params: dict, cost: str = "cole", progress=None,
+                             monitor: JobMonitor = None) -> MultiStartResult:
+        """
+        Fit from several space-filling starts on a process pool and keep the
+        best one. cost is "cole" or "bode"; progress(done, total) is called
+        as the fits complete.
+        """
+        return self._multistart_job(initial_params, cost)(progress=progress, monitor=monitor)
 
-    def run_model_manual(self, params: dict) -> CalculationResult:
+    def start_multistart(self, initial_params: dict, cost: str = "cole") -> bool:
+        """Run fit_model_multistart as the background job "multistart" (see start_job)."""
+        
+        return self.start_job("multistart", self._multistart_job(initial_params, cost))
+
+    def run_bootstrap(self, best_fit: dict, cost: str = "cole", progress=None, seed=None,
+                      monitor: JobMonitor = None) -> BootstrapResult:
+        """
+        Bootstrap the fit best_fit of the current data: refit resampled
+        spectra from it on the process pool, and return the percentile
+        intervals of every output. progress(done, total) is called as the
+        replicates complete.
+        """
+        return self._bootstrap_job(best_fit, cost, seed)(progress=progress, monitor=monitor)
+
+    def start_bootstrap(self, best_fit: dict, cost: str = "cole", seed=None) -> bool:
+        """Run run_bootstrap as the background job "bootstrap" (see start_job)."""
+        
+        return self.start_job("bootstrap", self._bootstrap_job(best_fit, cost, seed))
+
+    def run_range_sweep(self, file_data: dict, initial_params: dict, cost: str = "cole",
+                        progress=None, monitor: JobMonitor = None) -> RangeSweepResult:
+        """
+        Refit the whole file file_data on the grid of frequency sub-ranges of
+        set_range_sweep, from initial_params, on the process pool (see
+        RangeSweep.py). progress(done, total) is called as the rows complete.
+        """
+        return self._range_sweep_job(file_data, initial_params, cost)(progress=progress, monitor=monitor)
+
+    def start_range_sweep(self, file_data: dict, initial_params: dict, cost: str = "cole") -> bool:
+        """Run run_range_sweep as the background job "sweep" (see start_job)."""
+        
+        return self.start_job("sweep", self._range_sweep_job(file_data, initial_params, cost))
+
+    def worker_settings(self) -> BootstrapSettings:
+        """Return the fit settings that rebuild this Calculator in a worker process (see from_settings)."""
+        
+        fit_builder = self.fit_builder
+        return BootstrapSettings(
+            model_name=self._model_circuit.name,
+            negative_rinf=self._model_circuit.negative_rinf,
+            gaussian_prior=fit_builder.gaussian_prior,
+            disabled_variables=frozenset(fit_builder.disabled_variables),
+            lower_bounds=dict(fit_builder.lower_bounds),
+            upper_bounds=dict(fit_builder.upper_bounds),
+            backend=get_kernel_backend(),
+            optimizer=fit_builder.optimizer.name,
+            tolerance=fit_builder.optimizer_registry.tolerance,
+            time_domain=(self.time_domain_builder.N, self.time_domain_builder.T),
+        )
+
+    @classmethod
+    def from_settings(cls, settings: BootstrapSettings) -> "Calculator":
+        """Build a Calculator that fits like the one whose worker_settings are settings."""
+        
+        calculator = cls()
+        calculator.set_backend(settings.backend)
+        calculator.set_optimizer(settings.optimizer)
+        calculator.set_fit_tolerance(settings.tolerance)
+        calculator.set_time_domain_resolution(*settings.time_domain)
+        calculator.set_circuit_model(settings.model_name)
+        calculator.set_rinf_negative(settings.negative_rinf)
+        calculator.set_gaussian_prior(settings.gaussian_prior)
+        calculator.fit_builder.lower_bounds = dict(settings.lower_bounds)
+        calculator.fit_builder.upper_bounds = dict(settings.upper_bounds)
+        calculator.fit_builder.disabled_variables = set(settings.disabled_variables)
+        return calculator
+
+    def fit_mismatch(self, params: dict) -> float:
+        """Return the mismatch (sum of |Z - Z_model|^2) of params on the current data."""
+        
+        freq = self._experiment_data["freq"]
+        z = self._experiment_data["Z_real"] + 1j * self._experiment_data["Z_imag"]
+        z_model = self._model_circuit.evaluate(params, freq).z
+        return float(np.sum(np.abs(z - z_model) ** 2))
+
+    def output_values(self, params: dict) -> dict:
+        """
+        Run the model with params and return the values printed to the
+        output file: the sliders (Rinf signed), the model parameters and
+        the chargeability of the time-domain response. The V(...) samples
+        and the chargeability come from TimeDomainBuilder.direct_values:
+        the same values as the IFFT curve, without building it.
+        """
+        self.run_model_manual(params, time_domain=False)
+        chargeability = self.time_domain_builder.direct_values(params, self._model_circuit)
+        values = dict(params)
+        if self._model_circuit.negative_rinf and 'Rinf' in values:
+            values['Rinf'] *= -1
+        return values | self.get_model_parameters() | chargeability
+
+    def run_model_manual(self, params: dict, preview: bool = False, time_domain: bool = True) -> CalculationResult:
         """
         Run the model with the given parameters.
 
         1) Compute main impedance arrays over the experimental frequencies.
         2) Compute special frequencies and their impedance.
-        3) Compute the time-domain response.
+        3) Compute the time-domain response (at the preview resolution
+           when preview is True; skipped, leaving the time-domain arrays
+           None, when time_domain is False).
         4) Pack all results into a CalculationResult and emit a signal.
         """
 
@@ -168,17 +555,21 @@ class Calculator(QObject):
         z_experimental = self._experiment_data["Z_real"].copy() + 1j * self._experiment_data["Z_imag"].copy()
         
         # Calculate Z for the full model, and for the rock alone.
-        z, _ = self._model_circuit.run_model(params, freq_array)
-        z_real, z_imag = z.real, z.imag
+        evaluation = self._model_circuit.evaluate(params, freq_array)
+        self._secondary_variables = evaluation.secondary
+        z_real, z_imag = evaluation.z.real, evaluation.z.imag
         
-        rock_z = self._model_circuit.estimate_rock(params, freq_array, z_experimental)
+        rock_z = self._model_circuit.estimate_rock(params, freq_array, z_experimental, evaluation.terms)
         rock_z_real, rock_z_imag = rock_z.real, rock_z.imag
 
         #calculate the special frequencies wanted
-        special_freq, spec_zr, spec_zi = self._calculate_special_frequencies(params)
+        special_freq, spec_zr, spec_zi = self._calculate_special_frequencies(params, evaluation.secondary)
         
         # Time domain response.
-        t_freq, t_time, t_volt_down, t_volt_up = self.run_time_domain(params)
+        if time_domain:
+            t_freq, t_time, t_volt_down, t_volt_up = self.run_time_domain(params, preview)
+        else:
+            t_freq = t_time = t_volt_down = t_volt_up = None
 
         result = CalculationResult(
             main_freq=freq_array,
@@ -195,19 +586,20 @@ class Calculator(QObject):
             timedomain_freq=t_freq,
             timedomain_time=t_time,
             timedomain_volt_down=t_volt_down,
-            timedomain_volt_up=t_volt_up
+            timedomain_volt_up=t_volt_up,
+            timedomain_preview=self.time_domain_builder.resolution(preview) != self.time_domain_builder.N
         )
         
         self.model_manual_result.emit(result)
-        self._update_fit_variables(z_real, z_imag, params)
+        self._update_fit_variables(z_real, z_imag, params, evaluation.secondary)
 
         return result
 
-    def run_time_domain(self, params: dict):
+    def run_time_domain(self, params: dict, preview: bool = False):
         """
         Calculate time-domain values using a real IFFT.
         """
-        return self.time_domain_builder.run_time_domain(params, self._model_circuit)
+        return self.time_domain_builder.run_time_domain(params, self._model_circuit, preview)
 
     def transform_to_time_domain(self):
         """
@@ -233,7 +625,59 @@ class Calculator(QObject):
     """
 
     # Private Methods
-    def _calculate_special_frequencies(self, params: dict):
+    def _discard_running_fit(self) -> None:
+        """Stop a running background fit or job without applying its result."""
+        
+        self.cancel_fit(keep_best=False, wait=True)
+        self.cancel_job(keep_best=False, wait=True)
+
+    def _multistart_job(self, initial_params: dict, cost: str):
+        """Return the multi-start fit as a job function of start_job."""
+        return partial(self.fit_builder.fit_model_multistart, cost, dict(initial_params), PRIOR_WEIGHTS[cost],
+                       n_starts=self.multistart_starts, max_workers=self.multistart_workers)
+
+    def _bootstrap_job(self, best_fit: dict, cost: str, seed):
+        """Return the bootstrap of the current data as a job function of start_job."""
+        z_fit = self._model_circuit.evaluate(best_fit, self._experiment_data["freq"]).z
+        return partial(self.bootstrap_runner.run, self.worker_settings(), self._experiment_data, z_fit,
+                       dict(best_fit), cost, self.bootstrap_replicates, self.bootstrap_level,
+                       self.bootstrap_mode, seed)
+
+    def _range_sweep_job(self, file_data: dict, initial_params: dict, cost: str):
+        """Return the range sweep of file_data as a job function of start_job."""
+        return partial(run_range_sweep, self.worker_settings(), file_data, dict(initial_params), cost,
+                       self.sweep_steps, self.sweep_min_points, self.sweep_workers)
+
+    def _refinement(self, fit_function, initial_params: dict):
+        """Wrap fit_function so that Ctrl+Z still restores initial_params, not the coarse fit."""
+        def _refine(params: dict, monitor: FitMonitor = None) -> dict:
+            try:
+                return fit_function(params, monitor)
+            finally:
+                self.fit_builder.set_previous_fit(initial_params)
+        return _refine
+
+    def _on_fit_thread_progress(self, evaluations: int, cost: float, params: dict) -> None:
+        thread = self.sender()
+        if thread is self._fit_thread and not thread.discarded:
+            self.fit_progress.emit(evaluations, cost, params)
+
+    def _on_fit_thread_done(self, best_fit: dict) -> None:
+        thread = self.sender()
+        if thread is self._fit_thread:
+            self.fit_finished.emit({} if thread.discarded else best_fit)
+
+    def _on_job_thread_progress(self, done: int, total: int) -> None:
+        thread = self.sender()
+        if thread is self._job_thread and not thread.discarded:
+            self.job_progress.emit(done, total)
+
+    def _on_job_thread_done(self, result) -> None:
+        thread = self.sender()
+        if thread is self._job_thread:
+            self.job_finished.emit(self._job_name, None if thread.discarded else result)
+
+    def _calculate_special_frequencies(self, params: dict, secondary=None):
 
         #enkin 2025-05-07  Set params without influence of electrode
         params_no_electrode = params.copy()
@@ -244,9 +688,9 @@ class Calculator(QObject):
         fixed_special_frequencies = np.array([0.1])  # Point of interest, f = 0.1Hz
         dynamic_special_freq = self._get_special_freqs(params)     #slider frequencies
     
-        #fsf_z, _ = self._model_circuit.run_model(params, fixed_special_frequencies, old_par_second=True)
-        fsf_z, _ = self._model_circuit.run_model(params_no_electrode, fixed_special_frequencies, old_par_second=True)   #enkin 2025-05-07
-        dsf_z, _ = self._model_circuit.run_model(params, dynamic_special_freq, old_par_second=True)
+        #fsf_z = self._model_circuit.evaluate(params, fixed_special_frequencies, secondary).z
+        fsf_z = self._model_circuit.evaluate(params_no_electrode, fixed_special_frequencies, secondary).z   #enkin 2025-05-07
+        dsf_z = self._model_circuit.evaluate(params, dynamic_special_freq, secondary).z
     
         # Adding reference resistance to the dictionary
         self._calculator_variables['R01'] = float(fsf_z.real[0])
@@ -267,7 +711,7 @@ class Calculator(QObject):
             slider_values["Fl"],
         ], dtype=float)
     
-    def _update_fit_variables(self, z_real, z_imag, params: dict) -> None:
+    def _update_fit_variables(self, z_real, z_imag, params: dict, secondary=None) -> None:
         """
         Update internal fit variables such as mismatch and resistance at 0.1Hz.
         """
@@ -277,7 +721,7 @@ class Calculator(QObject):
         self._fit_variables['mismatch'] = mismatch
         
         # Compute resistance at 0.1Hz.
-        z_1Hz = self._model_circuit.run_model(params, [0.1])[0]
+        z_1Hz = self._model_circuit.evaluate(params, [0.1], secondary).z
         self._fit_variables['Res.1Hz'] = float(abs(z_1Hz.real))
         
         freq_array = self._experiment_data["freq"]
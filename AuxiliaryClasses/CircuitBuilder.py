@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+"""
+Declarative description of impedance circuits.
+
+A circuit is a tree of elements (R, L, CPE, Series, Parallel) whose leaves
+name the values they read: slider keys of config.ini (Rh, Ph, Linf...) or
+secondary variables (Qh, pRm, R0...). compile_circuit turns the tree into a
+single vectorized function of those values and of the angular frequencies.
+
+The frequency-dependent bases (omega, log(omega), log(j*omega)) of a
+frequency array are a FrequencyBasis, so each CPE is a single real exp of the
+precomputed log(omega) times a phase constant. The owners of the arrays that
+are evaluated many times (ExperimentWorkspace, TimeDomainPlan) build it once
+and pass it to the models instead of the array.
+"""
+import numpy as np
+
+
+###############################################################################
+# Frequency Basis
+###############################################################################
+class FrequencyBasis(object):
+    """
+    Log-domain bases of a frequency array, computed once.
+
+    log_omega is log(2*pi*f) with the zero frequencies mapped to 0, so that
+    exp(0 * log_omega) is 1 there; log_s is log(j*omega) = log_omega + j*pi/2.
+    """
+    def __init__(self, freq_array):
+        self.freq = np.asarray(freq_array, dtype=float)
+        self.omega = 2.0 * np.pi * self.freq
+        self.has_negative = bool(np.any(self.freq < 0))
+        self.has_zero = bool(np.any(self.freq == 0))
+        self.log_omega = np.log(np.where(self.omega > 0, self.omega, 1.0))
+        self.log_s = self.log_omega + 0.5j * np.pi
+        self.size = self.omega.size
+        self.shape = self.omega.shape
+
+    def omega_power(self, p):
+        """Return omega ** p as exp(p * log(omega))."""
+        return np.exp(p * self.log_omega)
+
+
+class CircuitElement(object):
+    """
+    Parent class for the nodes of a circuit description.
+    A node with a name also returns its own impedance when evaluated.
+    """
+    def __init__(self, name=None):
+        self.name = name
+
+    def symbols(self) -> set:
+        """Return the names of every value read by the node and its children."""
+        return set()
+
+    def exponents(self) -> set:
+        """Return the names of the CPE frequency exponents (omega ** p)."""
+        return set()
+
+    def phases(self) -> set:
+        """Return the names of the CPE phase exponents ((1j) ** p)."""
+        return set()
+
+    def children(self) -> tuple:
+        return ()
+
+    def compile(self, index=None):
+        """
+        Return a function (values, shared, named) -> impedance.
+        values is read with the symbols as keys or, when index maps every
+        symbol to a position, as a sequence. shared holds the subexpressions
+        common to the whole circuit and named receives the impedance of every
+        named node.
+        """
+        evaluate = self._compile(index)
+        if self.name is None:
+            return evaluate
+
+        def _named(values, shared, named, name=self.name):
+            z = evaluate(values, shared, named)
+            named[name] = z
+            return z
+        return _named
+
+    def _compile(self, index):
+        raise NotImplementedError
+
+    @staticmethod
+    def _key(index, symbol):
+        """Return the key of values that holds symbol."""
+        return symbol if index is None else index[symbol]
+
+
+class R(CircuitElement):
+    """Resistor whose resistance is the value named symbol."""
+
+    def __init__(self, symbol: str, name=None):
+        super().__init__(name)
+        self.symbol = symbol
+
+    def symbols(self) -> set:
+        return {self.symbol}
+
+    def _compile(self, index):
+        key = self._key(index, self.symbol)
+        return lambda values, shared, named: values[key]
+
+
+class L(CircuitElement):
+    """Inductor whose inductance is the value named symbol."""
+
+    def __init__(self, symbol: str, name=None):
+        super().__init__(name)
+        self.symbol = symbol
+
+    def symbols(self) -> set:
+        return {self.symbol}
+
+    def _compile(self, index):
+        key = self._key(index, self.symbol)
+
+        def _inductor(values, shared, named):
+            linf = values[key]
+            if np.any(linf == 0):
+                raise ValueError("Inductance (linf) cannot be zero.")
+            return 1j * shared["basis"].omega * linf
+        return _inductor
+
+
+class CPE(CircuitElement):
+    """
+    Constant phase element 1 / (q * (1j) ** pi * omega ** pf).
+    When pi is not given, the phase exponent is the frequency exponent.
+    """
+
+    def __init__(self, q: str, pf: str, pi: str = None, name=None):
+        super().__init__(name)
+        self.q = q
+        self.pf = pf
+        self.pi = pf if pi is None else pi
+
+    def symbols(self) -> set:
+        return {self.q, self.pf, self.pi}
+
+    def exponents(self) -> set:
+        return {self.pf}
+
+    def phases(self) -> set:
+        return {self.pi}
+
+    def _compile(self, index):
+        q_key, pf, pi = self._key(index, self.q), self.pf, self.pi
+
+        def _cpe(values, shared, named):
+            q = values[q_key]
+            if np.any(q == 0):
+                raise ValueError("Parameter q cannot be zero.")
+            return shared["j_pow_inv"][pi] / q * shared["omega_pow_inv"][pf]
+        return _cpe
+
+
+class _Composite(CircuitElement):
+    """Node made of several elements."""
+
+    def __init__(self, *elements, name=None):
+        super().__init__(name)
+        if not elements:
+            raise ValueError(f"{type(self).__name__} needs at least one element.")
+        self.elements = elements
+
+    def children(self) -> tuple:
+        return self.elements
+
+    def symbols(self) -> set:
+        return set().union(*(e.symbols() for e in self.elements))
+
+    def exponents(self) -> set:
+        return set().union(*(e.exponents() for e in self.elements))
+
+    def phases(self) -> set:
+        return set().union(*(e.phases() for e in self.elements))
+
+
+class Series(_Composite):
+    """Elements in series: the impedances add up, left to right."""
+
+    def _compile(self, index):
+        evaluators = [e.compile(index) for e in self.elements]
+
+        def _series(values, shared, named):
+            z = evaluators[0](values, shared, named)
+            for evaluate in evaluators[1:]:
+                z = z + evaluate(values, shared, named)
+            return z
+        return _series
+
+
+class Parallel(_Composite):
+    """Elements in parallel: the admittances add up."""
+
+    def _compile(self, index):
+        evaluators = [e.compile(index) for e in self.elements]
+
+        def _parallel(values, shared, named):
+            impedances = [evaluate(values, shared, named) for evaluate in evaluators]
+            if any(np.any(z == 0) for z in impedances):
+                raise ValueError("Cannot take parallel of impedance 0 (=> infinite admittance).")
+            denominator = 1.0 / impedances[0]
+            for z in impedances[1:]:
+                denominator = denominator + (1.0 / z)
+            return 1.0 / denominator
+        return _parallel
+
+
+###############################################################################
+# Compiler
+###############################################################################
+class CompiledCircuit(object):
+    """
+    Vectorized evaluation function of a circuit description.
+
+    Calling it with the values (scalars or column arrays) and a
+    FrequencyBasis returns (impedance, named impedances). The values are a
+    mapping by symbol or, when the circuit was compiled with known symbols,
+    a sequence in the order of known_symbols.
+    The powers omega ** -pf (an exp of the cached log(omega)) and
+    (1j) ** -pi are computed once per distinct exponent and shared by every
+    CPE that uses it.
+    """
+    def __init__(self, tree: CircuitElement, known_symbols=None):
+        self.tree = tree
+        self.symbols = tuple(sorted(tree.symbols()))
+        self.exponents = tuple(sorted(tree.exponents()))
+        self.phases = tuple(sorted(tree.phases()))
+        index = None if known_symbols is None else {s: i for i, s in enumerate(known_symbols)}
+        self._exponent_keys = [(p, CircuitElement._key(index, p)) for p in self.exponents]
+        self._phase_keys = [(p, CircuitElement._key(index, p)) for p in self.phases]
+        self._evaluate = tree.compile(index)
+
+    def __call__(self, values, basis: FrequencyBasis):
+        shared = {
+            "basis": basis,
+            "omega_pow_inv": {p: basis.omega_power(-values[key]) for p, key in self._exponent_keys},
+            "j_pow_inv": {p: (1j) ** -values[key] for p, key in self._phase_keys},
+        }
+        named = {}
+        z = self._evaluate(values, shared, named)
+        if np.ndim(z) == 0:
+            # Circuits without frequency dependence still return one value per frequency.
+            z = np.full(basis.shape, z, dtype=complex)
+        return z, named
+
+
+def compile_circuit(tree: CircuitElement, known_symbols=None) -> CompiledCircuit:
+    """
+    Compile a circuit description. When known_symbols is given, every value
+    read by the circuit must be one of them, and the compiled circuit reads
+    its values by position in known_symbols.
+    """
+    if known_symbols is not None:
+        known_symbols = tuple(known_symbols)
+        unknown = tree.symbols() - set(known_symbols)
+        if unknown:
+            raise ValueError(f"compile_circuit: unknown symbols {sorted(unknown)}.")
+    return CompiledCircuit(tree, known_symbols)
@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+"""
+Optional JIT-compiled kernels of the Series and Parallel circuits.
+
+When numba is installed, the impedance of both circuits and the Cole and Bode
+residuals are compiled to fused loops over the frequencies. The terms that do
+not depend on the frequency are computed once per parameter set, and the
+powers of omega reuse log(omega) from the cached FrequencyBasis. Without numba,
+available() is False and the models use their NumPy implementation.
+
+The backend is chosen with set_backend ("auto", "numpy" or "numba"), usually
+from the [Performance] section of config.ini.
+"""
+import math
+
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+
+# Kernel ids, used as ModelCircuitParent.KERNEL.
+SERIES = 0
+PARALLEL = 1
+
+BACKENDS = ("auto", "numpy", "numba")
+
+_requested_backend = "auto"
+
+
+#------------------------------------------------------------------------------
+# Backend selection
+#------------------------------------------------------------------------------
+def available() -> bool:
+    """Return True if numba could be imported."""
+    return numba is not None
+
+
+def set_backend(name) -> None:
+    """
+    Select the backend: "auto" (numba when available), "numpy" or "numba".
+    Forcing numba when it is not installed falls back to NumPy with a message.
+    """
+    global _requested_backend
+    name = (name or "auto").strip().lower()
+    if name not in BACKENDS:
+        raise ValueError(f"CircuitKernels.set_backend: unknown backend '{name}'. Expected one of {BACKENDS}.")
+    if name == "numba" and not available():
+        print("CircuitKernels.set_backend: numba is not installed, using numpy.")
+    _requested_backend = name
+
+
+def get_backend() -> str:
+    """Return the backend in use, "numpy" or "numba"."""
+    if _requested_backend == "numpy" or not available():
+        return "numpy"
+    return "numba"
+
+
+#------------------------------------------------------------------------------
+# Public kernels (only called when get_backend() is "numba")
+#------------------------------------------------------------------------------
+# basis is the FrequencyBasis of the frequencies (its omega and log_omega are
+# used) and the parameters follow ModelCircuitParent.PARAMETER_KEYS, Rinf signed.
+def impedance_batch(kernel: int, parameter_sets: np.ndarray, basis):
+    """Return the (M x F) circuit and rock impedances of M parameter sets."""
+    parameter_sets = np.ascontiguousarray(parameter_sets, dtype=np.float64)
+    z = np.empty((parameter_sets.shape[0], basis.size), dtype=np.complex128)
+    z_rock = np.empty_like(z)
+    _impedance_batch(kernel, parameter_sets, basis.omega, basis.log_omega, z, z_rock)
+    return z, z_rock
+
+
+def cole_residual(kernel: int, parameters: np.ndarray, basis,
+                  exp_real: np.ndarray, exp_imag: np.ndarray, weight: float) -> np.ndarray:
+    """Return the weighted Cole residual vector, as FitBuilder._residual_cole."""
+    residual = np.empty(2 * basis.size)
+    _cole_residual(kernel, parameters, basis.omega, basis.log_omega, exp_real, exp_imag, weight, residual)
+    return _checked(residual)
+
+
+def bode_residual(kernel: int, parameters: np.ndarray, basis,
+                  exp_log_abs: np.ndarray, exp_log_phase: np.ndarray, weight: float) -> np.ndarray:
+    """
+    Return the weighted Bode residual vector, as FitBuilder._residual_bode.
+    The experimental side is given as in ExperimentWorkspace: log10|Z| and
+    log10(|phase in degrees| + 1e-10).
+    """
+    residual = np.empty(2 * basis.size)
+    _bode_residual(kernel, parameters, basis.omega, basis.log_omega, exp_log_abs, exp_log_phase, weight, residual)
+    return _checked(residual)
+
+
+def _checked(residual: np.ndarray) -> np.ndarray:
+    """Raise ValueError where the NumPy models would (zero impedances), as the fit expects."""
+    if not np.all(np.isfinite(residual)):
+        raise ValueError("CircuitKernels: the circuit evaluation is not finite.")
+    return residual
+
+
+#------------------------------------------------------------------------------
+# Compiled loops
+#------------------------------------------------------------------------------
+def _jit(func):
+    """Compile func with numba when it is available; leave it as is otherwise."""
+    if numba is None:
+        return func
+    return numba.njit(cache=True, error_model="numpy")(func)
+
+
+@_jit
+def _cpe_coefficient(q, pi):
+    """q * (1j) ** pi: the admittance of a CPE is this times omega ** pf."""
+    angle = 0.5 * math.pi * pi
+    return q * complex(math.cos(angle), math.sin(angle))
+
+
+@_jit
+def _q_from_f0(r, f0, p):
+    # The checks and messages of ModelCircuitParent._q_from_f0.
+    if r == 0:
+        raise ValueError("Resistance r cannot be zero.")
+    if f0 <= 0:
+        raise ValueError("Resonant frequency f0 must be positive.")
+    return 1.0 / (r * (2.0 * math.pi * f0) ** p)
+
+
+@_jit
+def _cpe_q(q):
+    """Return q, raising the ValueError of the NumPy CPE when it is zero."""
+    if q == 0:
+        raise ValueError("Parameter q cannot be zero.")
+    return q
+
+
+@_jit
+def _setup(kernel, p):
+    """
+    Return the frequency-independent terms of a parameter set:
+    CPE coefficients c and exponents e (h, m, l, electrode) and resistances r.
+    Series: r = (Rh, Rm, Rl, Re, Rinf). Parallel: r = (pRh, pRm, pRl, Re, R0).
+    Invalid parameters raise the ValueError of the NumPy models.
+    """
+    linf, rinf, rh, fh, ph, rm, fm, pm, rl, fl, pl, re, qe, pef, pei = (
+        p[0], p[1], p[2], p[3], p[4], p[5], p[6], p[7], p[8], p[9], p[10], p[11], p[12], p[13], p[14])
+    qh = _q_from_f0(rh, fh, ph)
+    qm = _q_from_f0(rm, fm, pm)
+    ql = _q_from_f0(rl, fl, pl)
+    if linf == 0:
+        raise ValueError("Inductance (linf) cannot be zero.")
+
+    if kernel == SERIES:
+        c = (_cpe_coefficient(_cpe_q(qh), ph), _cpe_coefficient(_cpe_q(qm), pm),
+             _cpe_coefficient(_cpe_q(ql), pl), _cpe_coefficient(_cpe_q(qe), pei))
+        r = (rh, rm, rl, re, rinf)
+    else:
+        s1 = rinf + rh
+        s2 = s1 + rm
+        s3 = s2 + rl
+        c = (_cpe_coefficient(_cpe_q(qh * (rh / s1) ** 2), ph), _cpe_coefficient(_cpe_q(qm * (rm / s2) ** 2), pm),
+             _cpe_coefficient(_cpe_q(ql * (rl / s3) ** 2), pl), _cpe_coefficient(_cpe_q(qe), pei))
+        r = (rinf * s1 / rh, s1 * s2 / rm, s2 * s3 / rl, re, s3)
+    return linf, c, (ph, pm, pl, pef), r
+
+
+@_jit
+def _point(kernel, linf, c, e, r, omega, log_omega):
+    """(z, z_rock) at one angular frequency, from the terms of _setup."""
+    # Admittances of the CPEs: c * omega ** e.
+    y_h = c[0] * math.exp(e[0] * log_omega)
+    y_m = c[1] * math.exp(e[1] * log_omega)
+    y_l = c[2] * math.exp(e[2] * log_omega)
+    y_e = c[3] * math.exp(e[3] * log_omega)
+    zarce = 1.0 / (y_e + 1.0 / r[3])
+
+    if kernel == SERIES:
+        z_rock = 1.0 / (y_m + 1.0 / r[1]) + 1.0 / (y_l + 1.0 / r[2])
+        zarch = 1.0 / (y_h + 1.0 / r[0])
+        return 1j * omega * linf + r[4] + zarch + z_rock + zarce, z_rock
+
+    line_h = r[0] + 1.0 / y_h
+    line_m = r[1] + 1.0 / y_m
+    line_l = r[2] + 1.0 / y_l
+    z_rock = 1.0 / (1.0 / line_m + 1.0 / line_l + 1.0 / r[4])
+    return 1j * omega * linf + 1.0 / (1.0 / line_h + 1.0 / z_rock) + zarce, z_rock
+
+
+@_jit
+def _impedance_batch(kernel, parameter_sets, omega, log_omega, z, z_rock):
+    for m in range(parameter_sets.shape[0]):
+        linf, c, e, r = _setup(kernel, parameter_sets[m])
+        for i in range(omega.size):
+            z[m, i], z_rock[m, i] = _point(kernel, linf, c, e, r, omega[i], log_omega[i])
+
+
+@_jit
+def _cole_residual(kernel, p, omega, log_omega, exp_real, exp_imag, weight, residual):
+    n = omega.size
+    linf, c, e, r = _setup(kernel, p)
+    for i in range(n):
+        z, _ = _point(kernel, linf, c, e, r, omega[i], log_omega[i])
+        residual[i] = (z.real - exp_real[i]) * weight
+        residual[n + i] = (z.imag - exp_imag[i]) * weight
+
+
+@_jit
+def _bode_residual(kernel, p, omega, log_omega, exp_log_abs, exp_log_phase, weight, residual):
+    n = omega.size
+    linf, c, e, r = _setup(kernel, p)
+    for i in range(n):
+        z, _ = _point(kernel, linf, c, e, r, omega[i], log_omega[i])
+        z_phase_deg = math.degrees(math.atan2(z.imag, z.real))
+        res_abs = math.log10(math.hypot(z.real, z.imag)) - exp_log_abs[i]
+        res_phase = math.log10(abs(z_phase_deg) + 1e-10) - exp_log_phase[i]
+        residual[i] = res_abs * weight
+        residual[n + i] = res_phase * weight
@@ -4,6 +4,7 @@ from typing import Optional
 
 # Import slider classes. Replace with the actual module if needed.
 from .CustomSliders import EPowerSliderWithTicks, DoubleSliderWithTicks
+from .FitBuilder import CoarseFitSettings
 
 
 class ConfigImporter:
@@ -40,10 +41,54 @@ class ConfigImporter:
         self.general_font: Optional[int] = None
         self.small_font: Optional[int] = None
 
+        # Performance
+        self.performance_backend: str = "auto"
+        self.time_domain_cache: int = 32
+        self.time_domain_points: int = 2 ** 14
+        self.time_domain_duration: float = 4
+        self.time_domain_preview_points: int = 2 ** 11
+        self.time_domain_preview_delay: float = 0.15
+        self.multistart_starts: int = 16
+        self.multistart_workers: int = 0
+        self.fit_time_budget: float = 30
+        self.fit_optimizer: str = "trf"
+        self.fit_tolerance: float = 1e-8
+        self.two_stage_fit: bool = False
+        self.coarse_fit = CoarseFitSettings()
+        self.refine_time_budget: float = 0
+        self.tracking_enabled: bool = False
+        self.tracking_shift: int = 3
+        self.tracking_evaluations: int = 8
+        self.fit_cache_size: int = 256
+        self.fit_cache_file: Optional[str] = None
+        self.bootstrap_replicates: int = 100
+        self.bootstrap_workers: int = 0
+        self.bootstrap_mode: str = "residuals"
+        self.bootstrap_level: float = 95
+        self.bootstrap_columns: bool = False
+        self.sweep_steps: int = 8
+        self.sweep_min_points: int = 10
+        self.sweep_workers: int = 0
+        self.sweep_parameter: str = "Rh"
+        self.telemetry_history: int = 200
+        self.telemetry_log: Optional[str] = None
+        self.telemetry_columns: bool = False
+
         # Read and process the configuration file.
         self._read_config_file()
         self._check_sliders_length()
 
+    def get_default_parameters(self) -> dict:
+        """Return the default slider values in model units (10 ** value for the power sliders)."""
+        params = {}
+        for (key, slider), value in zip(self.slider_configurations.items(), self.slider_default_values):
+            params[key] = 10 ** value if "Power" in str(slider[0]) else value
+        return params
+
+    def get_default_disabled(self) -> set:
+        """Return the keys of the sliders that are disabled by default."""
+        return {key for key, disabled in zip(self.slider_configurations, self.slider_default_disabled) if disabled}
+
     def set_input_file(self, new_input_file: str) -> None:
         if self._validate_path(new_input_file):
             self._update_config("InputFile", "path", new_input_file)
@@ -154,6 +199,128 @@ class ConfigImporter:
             self.general_font = int(font.value if hasattr(font, "value") else font)
             self.small_font = int(small_font.value if hasattr(small_font, "value") else small_font)
 
+        if 'Performance' in self.config:
+            backend = self.config['Performance'].get('backend')
+            backend = backend.value if hasattr(backend, "value") else backend
+            if backend:
+                self.performance_backend = backend.strip().lower()
+            cache_size = self.config['Performance'].get('time_domain_cache')
+            if cache_size is not None:
+                self.time_domain_cache = int(cache_size.value if hasattr(cache_size, "value") else cache_size)
+
+        if 'TimeDomain' in self.config:
+            section = self.config['TimeDomain']
+            values = {key: (option.value if hasattr(option, "value") else option)
+                      for key, option in section.items()}
+            if values.get('points'):
+                self.time_domain_points = int(values['points'])
+            if values.get('duration'):
+                self.time_domain_duration = float(values['duration'])
+            if values.get('preview_points'):
+                self.time_domain_preview_points = int(values['preview_points'])
+            if values.get('preview_delay'):
+                self.time_domain_preview_delay = float(values['preview_delay'])
+
+        if 'MultiStart' in self.config:
+            starts = self.config['MultiStart'].get('starts')
+            workers = self.config['MultiStart'].get('workers')
+            if starts is not None:
+                self.multistart_starts = int(starts.value if hasattr(starts, "value") else starts)
+            if workers is not None:
+                self.multistart_workers = int(workers.value if hasattr(workers, "value") else workers)
+
+        if 'Fit' in self.config:
+            budget = self.config['Fit'].get('time_budget')
+            optimizer = self.config['Fit'].get('optimizer')
+            tolerance = self.config['Fit'].get('tolerance')
+            if budget is not None:
+                self.fit_time_budget = float(budget.value if hasattr(budget, "value") else budget)
+            if tolerance is not None:
+                self.fit_tolerance = float(tolerance.value if hasattr(tolerance, "value") else tolerance)
+            optimizer = optimizer.value if hasattr(optimizer, "value") else optimizer
+            if optimizer and optimizer.strip():
+                self.fit_optimizer = optimizer.strip().lower()
+
+        if 'TwoStageFit' in self.config:
+            section = self.config['TwoStageFit']
+            values = {key: (option.value if hasattr(option, "value") else option)
+                      for key, option in section.items()}
+            if values.get('enabled'):
+                self.two_stage_fit = values['enabled'].strip().lower() in ("yes", "true", "1", "on")
+            if values.get('coarse_points'):
+                self.coarse_fit.max_points = int(values['coarse_points'])
+            if values.get('coarse_tolerance'):
+                self.coarse_fit.tolerance = float(values['coarse_tolerance'])
+            if values.get('coarse_max_nfev'):
+                self.coarse_fit.max_nfev = int(values['coarse_max_nfev'])
+            if values.get('coarse_budget'):
+                self.coarse_fit.time_budget = float(values['coarse_budget'])
+            if values.get('refine_budget'):
+                self.refine_time_budget = float(values['refine_budget'])
+
+        if 'Tracking' in self.config:
+            section = self.config['Tracking']
+            values = {key: (option.value if hasattr(option, "value") else option)
+                      for key, option in section.items()}
+            if values.get('enabled'):
+                self.tracking_enabled = values['enabled'].strip().lower() in ("yes", "true", "1", "on")
+            if values.get('max_shift'):
+                self.tracking_shift = int(values['max_shift'])
+            if values.get('max_evaluations'):
+                self.tracking_evaluations = int(values['max_evaluations'])
+
+        if 'FitCache' in self.config:
+            size = self.config['FitCache'].get('size')
+            cache_file = self.config['FitCache'].get('file')
+            if size is not None:
+                self.fit_cache_size = int(size.value if hasattr(size, "value") else size)
+            cache_file = cache_file.value if hasattr(cache_file, "value") else cache_file
+            if cache_file and cache_file.strip():
+                # Relative paths are relative to the folder of config.ini.
+                folder = os.path.dirname(os.path.abspath(self.config_file))
+                self.fit_cache_file = os.path.join(folder, cache_file.strip())
+
+        if 'Bootstrap' in self.config:
+            section = self.config['Bootstrap']
+            values = {key: (option.value if hasattr(option, "value") else option)
+                      for key, option in section.items()}
+            if values.get('replicates'):
+                self.bootstrap_replicates = int(values['replicates'])
+            if values.get('workers'):
+                self.bootstrap_workers = int(values['workers'])
+            if values.get('mode'):
+                self.bootstrap_mode = values['mode'].strip().lower()
+            if values.get('level'):
+                self.bootstrap_level = float(values['level'])
+            if values.get('columns'):
+                self.bootstrap_columns = values['columns'].strip().lower() in ("yes", "true", "1", "on")
+
+        if 'RangeSweep' in self.config:
+            section = self.config['RangeSweep']
+            values = {key: (option.value if hasattr(option, "value") else option)
+                      for key, option in section.items()}
+            if values.get('steps'):
+                self.sweep_steps = int(values['steps'])
+            if values.get('min_points'):
+                self.sweep_min_points = int(values['min_points'])
+            if values.get('workers'):
+                self.sweep_workers = int(values['workers'])
+            if values.get('parameter') and values['parameter'].strip():
+                self.sweep_parameter = values['parameter'].strip()
+
+        if 'Telemetry' in self.config:
+            section = self.config['Telemetry']
+            values = {key: (option.value if hasattr(option, "value") else option)
+                      for key, option in section.items()}
+            if values.get('history'):
+                self.telemetry_history = int(values['history'])
+            if values.get('log') and values['log'].strip():
+                # Relative paths are relative to the folder of config.ini.
+                folder = os.path.dirname(os.path.abspath(self.config_file))
+                self.telemetry_log = os.path.join(folder, values['log'].strip())
+            if values.get('columns'):
+                self.telemetry_columns = values['columns'].strip().lower() in ("yes", "true", "1", "on")
+
     @staticmethod
     def _safe_import(class_name: str):
         slider_classes = {
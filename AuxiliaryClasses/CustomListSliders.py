@@ -363,6 +363,20 @@ class ListSliderRange(QtWidgets.QSlider):
                               self.values_list[self._low],
                               self.values_list[self._high])
 
+    def set_range(self, low: int, high: int):
+        """
+        Set both handles (low < high) and emit the updated indices and
+        corresponding values.
+        """
+        if not self.minimum() <= low < high <= self.maximum():
+            return
+        self._low = low
+        self._high = high
+        self.update()
+        self.sliderMoved.emit(self._low, self._high,
+                              self.values_list[self._low],
+                              self.values_list[self._high])
+
     def up_min(self):
         """
         Shift the lower handle upward by one index.
@@ -71,6 +71,10 @@ class CustomSliders(QWidget):
     def value_changed(self):
         return self._slider.valueChanged
 
+    def user_action(self):
+        """Signal of the moves made by the user (drag, click, keys, wheel), not by set_value."""
+        return self._slider.actionTriggered
+
     def set_is_disabled(self, state: bool):
         self.is_disabled = state
         self._react_to_is_disbled_state()
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+Experimental data in the form used by the residual functions of FitBuilder.
+
+The data only changes with FitBuilder.set_expdata, so everything the
+residuals need from it (contiguous real and imaginary parts, log10 of the
+modulus and of the absolute phase in degrees, the FrequencyBasis of the
+models) is computed once there, from read-only copies of the arrays. The
+model side is then written in place into the residual vector, so a residual
+call only allocates the impedance of the model and that vector. The vector
+itself cannot be a shared buffer: least_squares keeps the residual of the
+previous step (and of the finite-difference base point) while it evaluates
+the next one.
+"""
+import numpy as np
+
+from .CircuitBuilder import FrequencyBasis
+
+# Added to |phase| in degrees before its log10, as in the Bode residual.
+PHASE_FLOOR = 1e-10
+
+
+class ExperimentWorkspace(object):
+    """Precomputed experimental arrays of one data set, read-only once built."""
+    def __init__(self, experiment_data: dict):
+        # Copies: editing the data dict in place cannot desynchronize them.
+        self.freq = self._read_only(experiment_data["freq"])
+        self.real = self._read_only(experiment_data["Z_real"])
+        self.imag = self._read_only(experiment_data["Z_imag"])
+        self.size = self.freq.size
+        # Passed to the models instead of freq, so it is computed once per data set.
+        self.basis = FrequencyBasis(self.freq)
+
+        with np.errstate(divide="ignore"):
+            self.log_abs = np.log10(np.hypot(self.real, self.imag))
+            self.log_phase = self.log_abs_phase(self.real, self.imag, np.empty(self.size))
+
+    def decimated(self, max_points: int) -> "ExperimentWorkspace":
+        """
+        Return the workspace of at most max_points evenly spaced points, both
+        ends included (self when it has no more points).
+        """
+        if self.size <= max_points:
+            return self
+        return self.take(np.unique(np.linspace(0, self.size - 1, max(2, max_points)).round().astype(int)))
+
+    def take(self, index: np.ndarray) -> "ExperimentWorkspace":
+        """Return the workspace of the points at index."""
+        return ExperimentWorkspace({"freq": self.freq[index], "Z_real": self.real[index], "Z_imag": self.imag[index]})
+
+    @staticmethod
+    def _read_only(values) -> np.ndarray:
+        array = np.array(values, dtype=float)
+        array.flags.writeable = False
+        return array
+
+    @staticmethod
+    def log_abs_phase(real: np.ndarray, imag: np.ndarray, out: np.ndarray) -> np.ndarray:
+        """Write log10(|phase in degrees| + PHASE_FLOOR) of real + j*imag into out."""
+        np.arctan2(imag, real, out=out)
+        np.degrees(out, out=out)
+        np.abs(out, out=out)
+        out += PHASE_FLOOR
+        return np.log10(out, out=out)
@@ -4,10 +4,128 @@ Created on Wed Mar  5 14:08:21 2025
 
 @author: agarcian
 """
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+
 import numpy as np
-import scipy.optimize as opt
 from PyQt5.QtCore import QCoreApplication, QObject, pyqtSignal
 from .ModelCircuits import ModelCircuitParent, ModelCircuitParallel, ModelCircuitSeries
+from .CircuitKernels import cole_residual, bode_residual
+from .ParameterLayout import ParameterLayout
+from .ExperimentWorkspace import ExperimentWorkspace, PHASE_FLOOR
+from .FitCache import CachedFit, FitCache
+from .FitTelemetry import FitTelemetry, FitTimer, TelemetryLog
+from .Optimizers import BroydenTracker, LeastSquaresOptimizer, OptimizerRegistry
+from .PoolJobs import JobInterrupted, JobMonitor, iter_completed
+
+# Indices in the parameter vectors of the exponents that weight the
+# residuals, and of the frequencies ordered as Fh >= Fm >= Fl.
+_WEIGHT_INDICES = ModelCircuitParent.LAYOUT.indices(("Ph", "Pm", "Pl", "Pef"))
+_ORDERED_UPPER = ModelCircuitParent.LAYOUT.indices(("Fm", "Fl"))
+_ORDERED_LOWER = ModelCircuitParent.LAYOUT.indices(("Fh", "Fm"))
+
+@dataclass
+class MultiStartResult:
+    """
+    Outcome of FitBuilder.fit_model_multistart: the best fit and every
+    successful start as (cost, fit), ranked by increasing cost.
+    """
+    best: dict
+    ranked: list = field(default_factory=list)
+
+
+@dataclass
+class CoarseFitSettings:
+    """
+    First stage of the interactive fits (FitBuilder.fit_model_coarse): at most
+    max_points frequencies, the tolerance of ftol/xtol/gtol, at most max_nfev
+    evaluations, and time_budget seconds.
+    """
+    max_points: int = 40
+    tolerance: float = 1e-3
+    max_nfev: int = 60
+    time_budget: float = 0.1
+
+
+@dataclass
+class TrackingState:
+    """
+    Jacobian of the model rows of the last Cole or Bode fit (w.r.t. the
+    scaled free_keys), with the data it was fitted on, for fit_model_tracking.
+    """
+    cost: str
+    free_keys: tuple
+    workspace: ExperimentWorkspace
+    jacobian: np.ndarray
+
+
+class FitInterrupted(Exception):
+    """Raised inside a fit when its FitMonitor is cancelled or out of time."""
+
+
+class FitMonitor(object):
+    """
+    Watches the residual evaluations of one fit: keeps the best point so far,
+    reports progress(evaluations, cost, params) at most every interval
+    seconds, and stops the fit when cancel() is called (from any thread) or
+    when time_budget seconds (None: no limit) have elapsed.
+    A stopped fit returns its best point, unless cancelled with keep_best=False.
+    """
+    def __init__(self, time_budget: float = None, progress=None, interval: float = 0.25):
+        self.time_budget = time_budget or None
+        self.progress = progress
+        self.interval = interval
+        self.keep_best = True
+        self.evaluations = 0
+        self.best_x = None
+        self.best_cost = np.inf
+        self.stop_reason = None
+        self._cancelled = threading.Event()
+        self._to_params = None
+        self._start_time = self._last_report = time.perf_counter()
+
+    def cancel(self, keep_best: bool = True) -> None:
+        """Stop the fit at its next evaluation."""
+        self.keep_best = keep_best
+        self._cancelled.set()
+
+    def is_cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self._start_time
+
+    def start(self, to_params) -> None:
+        """Reset the counters; to_params converts a scaled vector to the reported params."""
+        self._to_params = to_params
+        self.evaluations = 0
+        self.best_x = None
+        self.best_cost = np.inf
+        self.stop_reason = None
+        self._start_time = self._last_report = time.perf_counter()
+
+    def update(self, x: np.ndarray, residual: np.ndarray) -> None:
+        """Record one evaluation; raise FitInterrupted if the fit must stop."""
+        self.evaluations += 1
+        cost = 0.5 * float(residual @ residual)
+        if cost < self.best_cost:
+            self.best_cost = cost
+            self.best_x = np.array(x, copy=True)
+
+        now = time.perf_counter()
+        if self.progress is not None and self.best_x is not None and now - self._last_report >= self.interval:
+            self._last_report = now
+            self.progress(self.evaluations, self.best_cost, self._to_params(self.best_x))
+
+        if self._cancelled.is_set():
+            self.stop_reason = "cancelled"
+        elif self.time_budget is not None and now - self._start_time >= self.time_budget:
+            self.stop_reason = "time budget"
+        if self.stop_reason is not None:
+            raise FitInterrupted(self.stop_reason)
+
 
 ###############################################################################
 # Fit_class 
@@ -23,6 +141,7 @@ class FitBuilder(QObject):
     def __init__(self, experiment_data, model_circuit) -> None:
         super().__init__()
         self._experiment_data = experiment_data
+        self._workspace = ExperimentWorkspace(experiment_data)
         self._model_circuit = model_circuit  # Injected dependency
         
         self.lower_bounds = {}
@@ -30,6 +149,22 @@ class FitBuilder(QObject):
         self.disabled_variables = set()
         self.gaussian_prior = False
         self._previous_fit_params = {}
+        # Residual evaluations and final cost of the last fit, and whether it came from the cache.
+        self.last_evaluations = 0
+        self.last_cost = np.nan
+        self.last_fit_cached = False
+        # Optional FitCache of the Cole and Bode fits.
+        self.fit_cache = None
+        # Telemetry of the last fit, and of the fits of the session.
+        self.last_telemetry = None
+        self.last_coarse_telemetry = None
+        self.last_tracking_telemetry = None
+        self._tracking_state = None
+        self.telemetry_log = TelemetryLog()
+        self._timer = FitTimer()
+        # Backend of the least-squares fits (see Optimizers.py).
+        self.optimizer_registry = OptimizerRegistry()
+        self.optimizer = self.optimizer_registry.get_default_optimizer()
         
         #Base weigthing variables
         self.base_weight =3 #Randy changes this value to change the weight against low p
@@ -60,111 +195,552 @@ class FitBuilder(QObject):
             
     def set_expdata(self, experiment_data: dict) -> None:
         self._experiment_data = experiment_data
+        self._workspace = ExperimentWorkspace(experiment_data)
 
     def set_model_circuit(self, model_circuit) -> None:
         """Update the circuit model dependency."""
         self._model_circuit = model_circuit
+
+    def set_optimizer(self, name: str) -> None:
+        """Select the optimizer backend of the fits by name ("trf", "lm", "quick", "auto" or the experimental "dogbox")."""
+        self.optimizer = self.optimizer_registry.get_optimizer(name)
+
+    def set_fit_tolerance(self, tolerance: float) -> None:
+        """Set ftol, xtol and gtol of the fits; the quick optimizer derives its own from it."""
+        self.optimizer_registry.set_tolerance(tolerance)
             
-    def fit_model_cole(self, initial_params: dict, prior_weight: float) -> dict:
+    def fit_model_cole(self, initial_params: dict, prior_weight: float, monitor: FitMonitor = None) -> dict:
         """Fit the model using the Cole cost function."""
-        return self.fit_model(self._residual_cole, initial_params, prior_weight)
+        return self._fit_with_cache("cole", initial_params, prior_weight, monitor)
 
-    def fit_model_bode(self, initial_params: dict, prior_weight: float) -> dict:
+    def fit_model_bode(self, initial_params: dict, prior_weight: float, monitor: FitMonitor = None) -> dict:
         """Fit the model using the Bode cost function."""
-        return self.fit_model(self._residual_bode, initial_params, prior_weight)
+        return self._fit_with_cache("bode", initial_params, prior_weight, monitor)
+
+    def set_fit_cache(self, fit_cache: FitCache) -> None:
+        """Use fit_cache for the Cole and Bode fits (None disables the cache)."""
+        self.fit_cache = fit_cache
     
+    def set_previous_fit(self, params: dict) -> None:
+        """Set the parameters restored by recover_previous_fit (Ctrl+Z)."""
+        self._previous_fit_params = params
+
     def recover_previous_fit(self):
 
         self.model_manual_values.emit(self._previous_fit_params)
             
-    def fit_model(self, residual_func, initial_params: dict, prior_weight: float = 0) -> dict:
+    def fit_model(self, residual_func, initial_params: dict, prior_weight: float = 0,
+                  jacobian_func=None, monitor: FitMonitor = None) -> dict:
         """
         Fit the model using a provided residual function and (optionally) a Gaussian prior
         that penalizes deviation from the initial guess.
+        residual_func takes a parameter vector in the order of the model
+        LAYOUT. When jacobian_func is given, it takes the same vector and the
+        ParameterLayout of the fit, and returns the derivatives of
+        residual_func with respect to the scaled free parameters; otherwise
+        they are estimated by finite differences.
+        A monitor reports the progress of the fit and can stop it early; the
+        best point so far is then returned, or FitInterrupted is raised (and
+        nothing is emitted) if it was cancelled with keep_best=False.
+        The FitTelemetry of the fit is kept in last_telemetry and telemetry_log.
         """
         self._previous_fit_params = initial_params
-        
-        all_keys = list(initial_params.keys())
-        free_keys = [k for k in all_keys if k not in self.disabled_variables]
-        locked_params = {k: initial_params[k] for k in self.disabled_variables if k in initial_params}
-        x0 = self._scale_params(free_keys, initial_params)
-        lower_bounds_scaled, upper_bounds_scaled = self._build_bounds(free_keys)
+        best_fit, _ = self._solve(residual_func, initial_params, prior_weight, jacobian_func, monitor)
+        self.telemetry_log.append(self.last_telemetry)
+        self.model_manual_values.emit(best_fit)
+        return best_fit
+
+    def fit_model_coarse(self, cost: str, initial_params: dict, prior_weight: float,
+                         settings: CoarseFitSettings) -> dict:
+        """
+        Quick first stage of an interactive Cole or Bode fit: the fit of a
+        decimated copy of the data with loose tolerances and few evaluations,
+        stopped with its best point after settings.time_budget seconds.
+        The result is emitted but neither cached nor added to telemetry_log;
+        its telemetry is kept in last_coarse_telemetry.
+        """
+        residual_func, jacobian_func = self._cost_functions(cost)
+        workspace, optimizer = self._workspace, self.optimizer
+        self._workspace = workspace.decimated(settings.max_points)
+        self.optimizer = LeastSquaresOptimizer("coarse", "trf", settings.tolerance, settings.max_nfev)
+        try:
+            best_fit, _ = self._solve(residual_func, initial_params, prior_weight, jacobian_func,
+                                      FitMonitor(settings.time_budget))
+        finally:
+            self._workspace, self.optimizer = workspace, optimizer
+        self.last_coarse_telemetry = self.last_telemetry
+        self._previous_fit_params = initial_params
+        self.model_manual_values.emit(best_fit)
+        return best_fit
+
+    def fit_model_tracking(self, cost: str, initial_params: dict, prior_weight: float,
+                           max_nfev: int = 8) -> dict:
+        """
+        Re-solve the Cole or Bode fit after a small change of the frequency
+        range, from initial_params (the previous solution), with at most
+        max_nfev evaluations of BroydenTracker. It starts from the Jacobian
+        of the last fit: its rows are reused for the frequencies kept and only
+        computed for the new ones. The result is emitted but neither cached
+        nor added to telemetry_log; its telemetry is kept in
+        last_tracking_telemetry.
+        """
+        residual_func, jacobian_func = self._cost_functions(cost)
+        layout = self._model_circuit.LAYOUT.with_disabled(self.disabled_variables)
+        initial_jacobian = self._tracking_jacobian(cost, layout, layout.to_array(initial_params), jacobian_func)
+        best_fit, _ = self._solve(residual_func, initial_params, prior_weight, jacobian_func,
+                                  optimizer=BroydenTracker(max_nfev), initial_jacobian=initial_jacobian)
+        self.last_tracking_telemetry = self.last_telemetry
+        self._previous_fit_params = initial_params
+        self.model_manual_values.emit(best_fit)
+        return best_fit
+
+    def has_cached_fit(self, cost: str, initial_params: dict, prior_weight: float) -> bool:
+        """Return True if the fit cache holds this fit with the current data and settings."""
+        if self.fit_cache is None:
+            return False
+        return self._cache_key(cost, initial_params, prior_weight) in self.fit_cache
+
+    def fit_model_multistart(self, cost: str, initial_params: dict, prior_weight: float,
+                             n_starts: int = 16, max_workers: int = None,
+                             progress=None, seed=None, monitor: JobMonitor = None) -> MultiStartResult:
+        """
+        Run the Cole or Bode fit (cost is "cole" or "bode") from the initial
+        parameters and from n_starts - 1 space-filling points of the bounds,
+        on a process pool of max_workers processes (all the cores by default,
+        in this process when it is 1). Disabled parameters keep their initial
+        values. progress(done, total) is called as the fits complete.
+        A cancelled monitor stops the pool: the best of the starts completed
+        so far is kept, or JobInterrupted is raised (and nothing is emitted)
+        if it was cancelled with keep_best=False or no start completed.
+        The best fit is emitted like the one of fit_model.
+        """
+        self._previous_fit_params = initial_params
+        starts = self._multistart_points(initial_params, n_starts, seed)
+        outcomes, done = [], [0]
+
+        def _collect(outcome):
+            done[0] += 1
+            if outcome is not None:
+                outcomes.append(outcome)
+            if progress is not None:
+                progress(done[0], len(starts))
+
+        if max_workers == 1:
+            for start in starts:
+                if monitor is not None and monitor.check():
+                    break
+                _collect(self._fit_start(cost, start, prior_weight))
+        else:
+            initargs = (self._experiment_data, self._model_circuit, self.lower_bounds,
+                        self.upper_bounds, set(self.disabled_variables), self.gaussian_prior, self.optimizer.name,
+                        self.optimizer_registry.tolerance)
+            executor = ProcessPoolExecutor(max_workers, initializer=_init_multistart_worker, initargs=initargs)
+            try:
+                futures = [executor.submit(_multistart_worker, cost, start, prior_weight) for start in starts]
+                for future in iter_completed(futures, monitor):
+                    try:
+                        _collect(future.result())
+                    except Exception as e:
+                        print(f"FitBuilder.fit_model_multistart: a start failed: {e}")
+                        _collect(None)
+            finally:
+                # Once cancelled, the starts still running are not waited for.
+                executor.shutdown(wait=monitor is None or not monitor.is_cancelled(), cancel_futures=True)
+
+        if not outcomes:
+            if monitor is not None and monitor.is_cancelled():
+                raise JobInterrupted("cancelled before any start completed")
+            raise ValueError("FitBuilder.fit_model_multistart: every start failed.")
+        ranked = sorted(outcomes, key=lambda outcome: outcome[0])
+        result = MultiStartResult(best=ranked[0][1], ranked=ranked)
+        self.model_manual_values.emit(result.best)
+        return result
+
+    def _fit_with_cache(self, cost: str, initial_params: dict, prior_weight: float,
+                        monitor: FitMonitor = None) -> dict:
+        """
+        Run fit_model with the "cole" or "bode" cost, or return the cached
+        result of the same fit. Fits stopped by their monitor are not cached.
+        """
+        residual_func, jacobian_func = self._cost_functions(cost)
+        self.last_fit_cached = False
+        if self.fit_cache is None:
+            return self.fit_model(residual_func, initial_params, prior_weight, jacobian_func, monitor)
+
+        start = time.perf_counter()
+        key = self._cache_key(cost, initial_params, prior_weight)
+        cached = self.fit_cache.get(key)
+        if cached is not None:
+            self._previous_fit_params = initial_params
+            self.last_evaluations, self.last_cost, self.last_fit_cached = cached.evaluations, cached.cost, True
+            self.last_telemetry = FitTelemetry.from_timer(
+                FitTimer(), time.perf_counter() - start, cost_function=cost, model=self._model_circuit.name,
+                optimizer=self.optimizer.name, nfev=cached.evaluations, njev=0, status=None, message="cached", cost=cached.cost, cached=True)
+            self.telemetry_log.append(self.last_telemetry)
+            best_fit = dict(cached.best_fit)
+            self.model_manual_values.emit(best_fit)
+            return best_fit
+
+        best_fit = self.fit_model(residual_func, initial_params, prior_weight, jacobian_func, monitor)
+        if monitor is None or monitor.stop_reason is None:
+            entry = CachedFit({key: float(value) for key, value in best_fit.items()},
+                              int(self.last_evaluations), float(self.last_cost), time.perf_counter() - start)
+            self.fit_cache.put(key, entry)
+        return best_fit
+
+    def _cache_key(self, cost: str, initial_params: dict, prior_weight: float) -> str:
+        """Return the FitCache key of a fit from initial_params with the current data and settings."""
+        layout = self._model_circuit.LAYOUT
+        workspace = self._workspace
+        settings = {
+            "model": self._model_circuit.name,
+            "negative_rinf": bool(self._model_circuit.negative_rinf),
+            "cost": cost,
+            "optimizer": self.optimizer.name,
+            "tolerance": self.optimizer_registry.tolerance,
+            "gaussian_prior": bool(self.gaussian_prior),
+            "prior_weight": float(prior_weight) if self.gaussian_prior else 0.0,
+            "disabled": tuple(sorted(self.disabled_variables)),
+            "extra": tuple(sorted((k, float(v)) for k, v in initial_params.items() if k not in layout.index)),
+        }
+        arrays = (workspace.freq, workspace.real, workspace.imag,
+                  layout.to_array(initial_params),
+                  layout.to_array({**initial_params, **self.lower_bounds}),
+                  layout.to_array({**initial_params, **self.upper_bounds}))
+        return FitCache.fit_key(arrays, settings)
+
+    def _fit_start(self, cost: str, initial_params: dict, prior_weight: float):
+        """
+        Fit from one start of fit_model_multistart, without emitting.
+        Returns (cost of the model residual, best fit), or None if the
+        start cannot be fitted.
+        """
+        residual_func, jacobian_func = self._cost_functions(cost)
+        try:
+            best_fit, values = self._solve(residual_func, initial_params, prior_weight, jacobian_func)
+            residual = residual_func(values)
+        except ValueError:
+            return None
+        return 0.5 * float(residual @ residual), best_fit
+
+    def _cost_functions(self, cost: str):
+        """
+        Return the (residual, Jacobian) functions of the "cole" or "bode"
+        cost. The Jacobian is None (2-point finite differences) when the
+        model has no closed form, or when its residual is a numba kernel:
+        the closed form is NumPy, and 2-point over the kernel is faster
+        (Benchmarks.benchmark_jacobians).
+        """
+        functions = {"cole": (self._residual_cole, self._jacobian_cole),
+                     "bode": (self._residual_bode, self._jacobian_bode)}
+        if cost not in functions:
+            raise ValueError(f"FitBuilder: unknown cost '{cost}'. Expected 'cole' or 'bode'.")
+        residual_func, jacobian_func = functions[cost]
+        if not self._model_circuit.has_jacobian() or self._model_circuit.jit_kernel() is not None:
+            jacobian_func = None
+        return residual_func, jacobian_func
+
+    def _multistart_points(self, initial_params: dict, n_starts: int, seed=None) -> list:
+        """
+        Return the initial parameters followed by n_starts - 1 points of a
+        Latin hypercube of the scaled bounds. Only the free parameters with
+        finite bounds are spread; the others keep their initial values.
+        """
+        layout = self._model_circuit.LAYOUT.with_disabled(self.disabled_variables)
+        initial_values = layout.to_array(initial_params)
+        lower, upper = self._build_bounds(layout, initial_params)
+        spread = np.isfinite(lower) & np.isfinite(upper)
+        x_initial = layout.scale_free(initial_values)
+
+        rng = np.random.default_rng(seed)
+        n_points = max(n_starts - 1, 0)
+        # One stratum per point in every dimension, shuffled independently.
+        strata = np.argsort(rng.random((n_points, spread.sum())), axis=0)
+        unit = (strata + rng.random(strata.shape)) / max(n_points, 1)
+
+        starts = [initial_params]
+        for row in unit:
+            x = x_initial.copy()
+            x[spread] = lower[spread] + row * (upper[spread] - lower[spread])
+            starts.append({**initial_params, **layout.to_dict(layout.compose(x, initial_values))})
+        return starts
+
+    def _solve(self, residual_func, initial_params: dict, prior_weight: float = 0,
+               jacobian_func=None, monitor: FitMonitor = None, optimizer=None, initial_jacobian=None):
+        """
+        Run the least-squares fit of fit_model, with optimizer (default: the
+        selected one). Returns the best fit dict and its parameter vector.
+        initial_jacobian (model rows at initial_params) replaces jacobian_func
+        for optimizers that take a Jacobian matrix (BroydenTracker).
+        """
+        layout = self._model_circuit.LAYOUT.with_disabled(self.disabled_variables)
+        initial_values = layout.to_array(initial_params)
+        x0 = layout.scale_free(initial_values)
+        lower_bounds_scaled, upper_bounds_scaled = self._build_bounds(layout, initial_params)
+        # Read once: F11 may be toggled while a background fit runs.
+        gaussian_prior = self.gaussian_prior
+        optimizer = optimizer or self.optimizer
+        timer = self._timer = FitTimer()
+        # Size of the last residual, kept by the penalty of a failed evaluation
+        # (MINPACK, used by "lm", rejects residuals that change size).
+        residual_size = [10000]
     
         def _residual_wrapper(x_free: np.ndarray) -> np.ndarray:
-            free_params = self._descale_params(free_keys, x_free)
-            full_params = {**locked_params, **free_params}
+            values = layout.compose(x_free, initial_values)
     
+            start = time.perf_counter()
             try:
-                model_residual = residual_func(full_params)
+                model_residual = residual_func(values)
             except ValueError:
                 # Return a large penalty if the model evaluation fails.
-                return np.ones(10000) * 1e6
+                return np.ones(residual_size[0]) * 1e6
+            finally:
+                timer.evaluation += time.perf_counter() - start
     
-            if self.gaussian_prior:
+            if gaussian_prior:
+                start = time.perf_counter()
                 prior_res = self._compute_gaussian_prior(x_free, x0, lower_bounds_scaled, upper_bounds_scaled, prior_weight)
-                invalid_penalty = self._compute_invalid_guess_penalty(full_params, prior_weight)
+                invalid_penalty = self._compute_invalid_guess_penalty(values, prior_weight)
                 model_residual = np.concatenate([model_residual, prior_res, invalid_penalty])
+                timer.prior += time.perf_counter() - start
             
+            residual_size[0] = model_residual.size
             return model_residual
 
-        result = opt.least_squares(
-            _residual_wrapper,
-            x0=x0,
-            bounds=(lower_bounds_scaled, upper_bounds_scaled),
-            method='trf',
-            max_nfev=2000
-        )
-        best_fit_free = self._descale_params(free_keys, result.x)
-        best_fit = {**locked_params, **best_fit_free}
-        
-        if 'Pei' in best_fit.keys(): #special case angle Pei
-            best_fit['Pei'] = (best_fit['Pei']+1)%4. - 1
-        
-        self.model_manual_values.emit(best_fit)
-        return best_fit
+        def _monitored_residual(x_free: np.ndarray) -> np.ndarray:
+            residual = _residual_wrapper(x_free)
+            monitor.update(x_free, residual)
+            return residual
+
+        def _jacobian_wrapper(x_free: np.ndarray) -> np.ndarray:
+            values = layout.compose(x_free, initial_values)
+
+            start = time.perf_counter()
+            try:
+                model_jacobian = jacobian_func(values, layout)
+            except ValueError:
+                # The penalty returned by the residual does not depend on x.
+                return np.zeros((residual_size[0], x_free.size))
+            finally:
+                timer.evaluation += time.perf_counter() - start
+
+            if gaussian_prior:
+                start = time.perf_counter()
+                prior_jac = self._compute_gaussian_prior_jacobian(lower_bounds_scaled, upper_bounds_scaled, prior_weight)
+                invalid_jac = self._compute_invalid_guess_penalty_jacobian(values, layout, prior_weight)
+                model_jacobian = np.vstack([model_jacobian, prior_jac, invalid_jac])
+                timer.prior += time.perf_counter() - start
+
+            return model_jacobian
+
+        def _to_fit(x_free: np.ndarray):
+            values = layout.compose(x_free, initial_values)
+            fit = {**initial_params, **layout.to_dict(values)}
+            if 'Pei' in fit.keys(): #special case angle Pei
+                fit['Pei'] = (fit['Pei']+1)%4. - 1
+            return fit, values
+
+        if monitor is not None:
+            monitor.start(lambda x_free: _to_fit(x_free)[0])
+
+        jac = _jacobian_wrapper if jacobian_func is not None else '2-point'
+        if initial_jacobian is not None:
+            jac = initial_jacobian
+            if gaussian_prior:
+                jac = np.vstack([initial_jacobian,
+                                 self._compute_gaussian_prior_jacobian(lower_bounds_scaled, upper_bounds_scaled, prior_weight),
+                                 self._compute_invalid_guess_penalty_jacobian(initial_values, layout, prior_weight)])
+
+        start = time.perf_counter()
+        try:
+            result = optimizer.solve(
+                _residual_wrapper if monitor is None else _monitored_residual,
+                x0, jac, lower_bounds_scaled, upper_bounds_scaled,
+            )
+            best_x, self.last_evaluations, self.last_cost = result.x, result.nfev, result.cost
+            njev, status, message, method = result.njev or 0, result.status, result.message, result.optimizer
+            self._keep_tracking_state(self._cost_name(residual_func), layout, getattr(result, "jac", None))
+        except FitInterrupted:
+            if not monitor.keep_best or monitor.best_x is None:
+                raise
+            best_x, self.last_evaluations, self.last_cost = monitor.best_x, monitor.evaluations, monitor.best_cost
+            # least_squares does not report its Jacobian count when interrupted.
+            njev, status, message, method = 0, None, f"stopped ({monitor.stop_reason})", optimizer.name
+            print(f"FitBuilder: fit stopped ({monitor.stop_reason}) after "
+                  f"{monitor.evaluations} evaluations, keeping the best point so far.")
+
+        self.last_telemetry = FitTelemetry.from_timer(
+            timer, time.perf_counter() - start, cost_function=self._cost_name(residual_func),
+            model=self._model_circuit.name, optimizer=method, nfev=int(self.last_evaluations), njev=int(njev),
+            status=status, message=message, cost=float(self.last_cost))
+        return _to_fit(best_x)
+
+    def _keep_tracking_state(self, cost: str, layout: ParameterLayout, jacobian) -> None:
+        """Keep the model rows of the final Jacobian of a Cole or Bode fit for fit_model_tracking."""
+        rows = 2 * self._workspace.size
+        if (cost in ("cole", "bode") and isinstance(jacobian, np.ndarray)
+                and jacobian.shape[0] >= rows and jacobian.shape[1] == len(layout.free_keys)):
+            self._tracking_state = TrackingState(cost, tuple(layout.free_keys), self._workspace,
+                                                 np.array(jacobian[:rows]))
+
+    def _tracking_jacobian(self, cost: str, layout: ParameterLayout, values: np.ndarray, jacobian_func):
+        """
+        Return the model rows of the Jacobian at values for the current data,
+        from the TrackingState of the last fit when it was the same cost, free
+        parameters and data; rows of new frequencies are computed. None when
+        there is nothing to reuse.
+        """
+        state = self._tracking_state
+        workspace = self._workspace
+        if state is None or state.cost != cost or state.free_keys != tuple(layout.free_keys):
+            return None
+        position = {f: i for i, f in enumerate(state.workspace.freq)}
+        old = np.array([position.get(f, -1) for f in workspace.freq])
+        kept = np.flatnonzero(old >= 0)
+        if (kept.size == 0
+                or not np.array_equal(workspace.real[kept], state.workspace.real[old[kept]])
+                or not np.array_equal(workspace.imag[kept], state.workspace.imag[old[kept]])):
+            return None
+
+        n, m = workspace.size, state.workspace.size
+        jacobian = np.empty((2 * n, len(layout.free_keys)))
+        jacobian[kept] = state.jacobian[old[kept]]
+        jacobian[n + kept] = state.jacobian[m + old[kept]]
+        new = np.flatnonzero(old < 0)
+        if new.size:
+            if jacobian_func is None:
+                return None
+            self._workspace = workspace.take(new)
+            try:
+                rows = jacobian_func(values, layout)
+            except ValueError:
+                return None
+            finally:
+                self._workspace = workspace
+            jacobian[new] = rows[:new.size]
+            jacobian[n + new] = rows[new.size:]
+        return jacobian
+
+    def _cost_name(self, residual_func) -> str:
+        """Return "cole" or "bode" for the residuals of these costs, else the name of residual_func."""
+        if residual_func == self._residual_cole:
+            return "cole"
+        if residual_func == self._residual_bode:
+            return "bode"
+        return getattr(residual_func, "__name__", "custom")
 
     # Private Methods (Interface Unchanged)
-    def _residual_cole(self, params: dict) -> np.ndarray:
+    # The residuals and Jacobians take parameter vectors in the order of the
+    # model LAYOUT, so no dict is built at each step of the optimizer.
+    def _residual_cole(self, values: np.ndarray) -> np.ndarray:
         """Return the residual vector for the Cole model."""
-        freq_array = self._experiment_data["freq"]
-        z, _ = self._model_circuit.run_model(params, freq_array)
-        z_real, z_imag = z.real, z.imag
-        exp_real = self._experiment_data["Z_real"]
-        exp_imag = self._experiment_data["Z_imag"]
-        weight = self._weight_function(params)
-        return np.concatenate([(z_real - exp_real) * weight, (z_imag - exp_imag) * weight])
-
-    def _residual_bode(self, params: dict) -> np.ndarray:
+        workspace = self._workspace
+        weight = self._weight_function(values)
+
+        start = time.perf_counter()
+        jit_inputs = self._model_circuit.jit_inputs(values, workspace.basis)
+        if jit_inputs is not None:
+            # One kernel for the model and the residual, timed as model.
+            residual = cole_residual(*jit_inputs, workspace.real, workspace.imag, weight)
+            self._timer.model += time.perf_counter() - start
+            return residual
+
+        z = self._model_circuit.impedance(values, workspace.basis)
+        self._timer.model += time.perf_counter() - start
+        n = workspace.size
+        residual = np.empty(2 * n)
+        np.subtract(z.real, workspace.real, out=residual[:n])
+        np.subtract(z.imag, workspace.imag, out=residual[n:])
+        residual *= weight
+        return residual
+
+    def _residual_bode(self, values: np.ndarray) -> np.ndarray:
         """Return the residual vector for the Bode model."""
-        freq_array = self._experiment_data["freq"]
-        z, _ = self._model_circuit.run_model(params, freq_array)
-        z_real, z_imag = z.real, z.imag
-        z_abs = np.hypot(z_real, z_imag)
-        z_phase_deg = np.degrees(np.arctan2(z_imag, z_real))
-        exp_real = self._experiment_data["Z_real"]
-        exp_imag = self._experiment_data["Z_imag"]
-        exp_abs = np.hypot(exp_real, exp_imag)
-        exp_phase_deg = np.degrees(np.arctan2(exp_imag, exp_real))
-        res_abs = np.log10(z_abs) - np.log10(exp_abs)
-        res_phase = np.log10(np.abs(z_phase_deg) + 1e-10) - np.log10(np.abs(exp_phase_deg) + 1e-10)
-        weight = self._weight_function(params)
-        return np.concatenate([res_abs * weight, res_phase * weight])
-
-    def _weight_function(self, params: dict) -> float:
+        workspace = self._workspace
+        weight = self._weight_function(values)
+
+        start = time.perf_counter()
+        jit_inputs = self._model_circuit.jit_inputs(values, workspace.basis)
+        if jit_inputs is not None:
+            residual = bode_residual(*jit_inputs, workspace.log_abs, workspace.log_phase, weight)
+            self._timer.model += time.perf_counter() - start
+            return residual
+
+        z = self._model_circuit.impedance(values, workspace.basis)
+        self._timer.model += time.perf_counter() - start
+        n = workspace.size
+        residual = np.empty(2 * n)
+        res_abs, res_phase = residual[:n], residual[n:]
+        np.abs(z, out=res_abs)
+        np.log10(res_abs, out=res_abs)
+        res_abs -= workspace.log_abs
+        ExperimentWorkspace.log_abs_phase(z.real, z.imag, out=res_phase)
+        res_phase -= workspace.log_phase
+        residual *= weight
+        return residual
+
+    def _jacobian_cole(self, values: np.ndarray, layout: ParameterLayout) -> np.ndarray:
+        """Return the derivatives of the Cole residual vector w.r.t. the scaled free parameters."""
+        workspace = self._workspace
+        z, dz = self._scaled_model_jacobian(values, layout, workspace.basis)
+        weight = self._weight_function(values)
+        d_weight = self._weight_gradient(values, layout)
+        return np.vstack([
+            dz.real * weight + np.outer(z.real - workspace.real, d_weight),
+            dz.imag * weight + np.outer(z.imag - workspace.imag, d_weight),
+        ])
+
+    def _jacobian_bode(self, values: np.ndarray, layout: ParameterLayout) -> np.ndarray:
+        """Return the derivatives of the Bode residual vector w.r.t. the scaled free parameters."""
+        workspace = self._workspace
+        z, dz = self._scaled_model_jacobian(values, layout, workspace.basis)
+        # d(log z) = d(ln|z|) + 1j * d(phase)
+        d_log_z = dz / z[:, np.newaxis]
+        z_phase_deg = np.degrees(np.angle(z))
+        res_abs = np.log10(np.abs(z)) - workspace.log_abs
+        res_phase = np.log10(np.abs(z_phase_deg) + PHASE_FLOOR) - workspace.log_phase
+
+        d_abs = d_log_z.real / np.log(10)
+        phase_factor = np.sign(z_phase_deg) / ((np.abs(z_phase_deg) + PHASE_FLOOR) * np.log(10))
+        d_phase = np.degrees(d_log_z.imag) * phase_factor[:, np.newaxis]
+
+        weight = self._weight_function(values)
+        d_weight = self._weight_gradient(values, layout)
+        return np.vstack([
+            d_abs * weight + np.outer(res_abs, d_weight),
+            d_phase * weight + np.outer(res_phase, d_weight),
+        ])
+
+    def _scaled_model_jacobian(self, values: np.ndarray, layout: ParameterLayout, freq_array: np.ndarray):
+        """
+        Return the model impedance and its (F x n_free) derivatives with
+        respect to the scaled free parameters (log10 or x10, see ParameterLayout).
+        """
+        start = time.perf_counter()
+        z, jacobian = self._model_circuit.run_model_jacobian(values, freq_array)
+        self._timer.model += time.perf_counter() - start
+        return z, jacobian[:, layout.free_indices] * layout.free_scale_derivatives(values)
+
+    def _weight_function(self, values: np.ndarray) -> float:
         """
         Assign dynamic weights to errors based on selected parameters.
         """
-        weight = 1
-        for key in ["Ph", "Pm", "Pl", "Pef"]:
-            weight *= 1 + self.base_weight * np.exp(self.exp_weight * params[key])
-        return weight
+        return np.prod(1 + self.base_weight * np.exp(self.exp_weight * values[_WEIGHT_INDICES]))
+
+    def _weight_gradient(self, values: np.ndarray, layout: ParameterLayout) -> np.ndarray:
+        """Return the derivatives of _weight_function w.r.t. the scaled free parameters."""
+        weight = self._weight_function(values)
+        term = self.base_weight * np.exp(self.exp_weight * values[_WEIGHT_INDICES])
+        gradient = np.zeros(layout.size)
+        gradient[_WEIGHT_INDICES] = weight * self.exp_weight * term / (1 + term)
+        return gradient[layout.free_indices] * layout.free_scale_derivatives(values)
                  
-    def _compute_invalid_guess_penalty(self, params: dict, prior_weight: float) -> np.ndarray:
+    def _compute_invalid_guess_penalty(self, values: np.ndarray, prior_weight: float) -> np.ndarray:
         """
         Returns the penalty array if the guess is invalid, otherwise zeros.
         """
         arbitrary_scaling = 1e4
-        deviation = self._invalid_guess(params)
+        deviation = self._invalid_guess(values)
         return deviation * arbitrary_scaling * prior_weight
 
     def _compute_gaussian_prior(
@@ -178,50 +754,230 @@ class FitBuilder(QObject):
         sigmas = (upper_bounds - lower_bounds) * gaussian_fraction
         return prior_weight * ((x_guess - x0) / sigmas)
 
-    def _invalid_guess(self, params: dict) -> np.ndarray:
+    def _compute_invalid_guess_penalty_jacobian(self, values: np.ndarray, layout: ParameterLayout,
+                                                prior_weight: float) -> np.ndarray:
+        """
+        Return the derivatives of _compute_invalid_guess_penalty w.r.t. the scaled free parameters.
+        """
+        arbitrary_scaling = 1e4
+        jacobian = np.zeros((2, layout.size))
+        active = values[_ORDERED_UPPER] - values[_ORDERED_LOWER] > 0
+        for row in np.flatnonzero(active):
+            jacobian[row, _ORDERED_UPPER[row]] += 1.0
+            jacobian[row, _ORDERED_LOWER[row]] -= 1.0
+        jacobian = jacobian[:, layout.free_indices] * layout.free_scale_derivatives(values)
+        return jacobian * arbitrary_scaling * prior_weight
+
+    def _compute_gaussian_prior_jacobian(
+        self, lower_bounds: np.ndarray, upper_bounds: np.ndarray,
+        prior_weight: float, gaussian_fraction: int = 5
+    ) -> np.ndarray:
+        """
+        Return the derivatives of _compute_gaussian_prior (a diagonal matrix).
+        """
+        sigmas = (upper_bounds - lower_bounds) * gaussian_fraction
+        return np.diag(prior_weight / sigmas)
+
+    def _invalid_guess(self, values: np.ndarray) -> np.ndarray:
         """
         Test validity criteria: Fh >= Fm >= Fl.
         Returns positive deviations if invalid, zeros otherwise.
         """
-        return np.array([
-            max(0.0, params["Fm"] - params["Fh"]),
-            max(0.0, params["Fl"] - params["Fm"])
-        ])
+        return np.maximum(0.0, values[_ORDERED_UPPER] - values[_ORDERED_LOWER])
     
-    def _build_bounds(self, free_keys: list) -> (np.ndarray, np.ndarray):
+    def _build_bounds(self, layout: ParameterLayout, initial_params: dict) -> (np.ndarray, np.ndarray):
         """
         Build scaled lower and upper bounds arrays for free parameters.
+        Locked parameters need no bounds: their initial values fill the vectors.
         """
-        lower_scaled = self._scale_params(free_keys, self.lower_bounds)
-        upper_scaled = self._scale_params(free_keys, self.upper_bounds)
+        lower_scaled = layout.scale_free(layout.to_array({**initial_params, **self.lower_bounds}))
+        upper_scaled = layout.scale_free(layout.to_array({**initial_params, **self.upper_bounds}))
         return lower_scaled, upper_scaled
-    
-    # ---------- Parameter Scaling ----------
-    @staticmethod
-    def _scale_params(keys: list, params: dict) -> np.ndarray:
-        """
-        Convert parameter values into a scaled vector for optimization.
-        """
-        scaled = []
-        for key in keys:
-            value = params[key]
-            if key.startswith('P'):
-                scaled.append(value * 10.0)
-            else:
-                if value <= 0:
-                    raise ValueError(f"Parameter {key} must be > 0; got {value}.")
-                scaled.append(np.log10(value))
-        return np.array(scaled)
 
-    @staticmethod
-    def _descale_params(keys: list, x: np.ndarray) -> dict:
-        """
-        Convert a scaled vector back to the original parameter dictionary.
-        """
-        descale = {}
-        for i, key in enumerate(keys):
-            if key.startswith('P'):
-                descale[key] = x[i] / 10.0
-            else:
-                descale[key] = 10 ** x[i]
-        return descale
+
+###############################################################################
+# Multi-start workers
+###############################################################################
+# Each process of the pool builds its FitBuilder once, in the initializer;
+# the tasks only carry the starting parameters.
+_worker_fit_builder = None
+
+
+def _init_multistart_worker(experiment_data, model_circuit, lower_bounds, upper_bounds,
+                            disabled_variables, gaussian_prior, optimizer, tolerance) -> None:
+    global _worker_fit_builder
+    _worker_fit_builder = FitBuilder(experiment_data, model_circuit)
+    _worker_fit_builder.set_optimizer(optimizer)
+    _worker_fit_builder.set_fit_tolerance(tolerance)
+    _worker_fit_builder.lower_bounds = lower_bounds
+    _worker_fit_builder.upper_bounds = upper_bounds
+    _worker_fit_builder.disabled_variables = disabled_variables
+    _worker_fit_builder.gaussian_prior = gaussian_prior
+
+
+def _multistart_worker(cost: str, initial_params: dict, prior_weight: float):
+    return _worker_fit_builder._fit_start(cost, initial_params, prior_weight)
+
+
+###############################################################################
+#   Test
+###############################################################################
+def manual_test_jacobian():
+    """
+    Compare the closed-form Jacobians of the Cole and Bode residuals with
+    central finite differences (to 1e-6 of the largest entry), for both
+    circuit models, then time one fit with and without them: the closed
+    form must need fewer model evaluations. Run with:
+    python -m AuxiliaryClasses.FitBuilder
+    """
+    import time
+
+    true_params = {
+        "Linf": 1e-6, "Rinf": 1e3, "Rh": 5e4, "Fh": 1e4, "Ph": 0.8,
+        "Rm": 1e3, "Fm": 1e2, "Pm": 0.6, "Rl": 2e4, "Fl": 1.0, "Pl": 0.5,
+        "Re": 1e8, "Qe": 1e-6, "Pef": 0.5, "Pei": 0.3,
+    }
+    guess = {k: v * (1.3 if not k.startswith('P') else 0.9) for k, v in true_params.items()}
+    freq = np.logspace(6, -1, 40)
+    slider_configurations = {
+        k: ("DoubleSliderWithTicks", 0.0, 1.0) if k.startswith('P') else ("EPowerSliderWithTicks", -10, 10)
+        for k in true_params
+    }
+    for model in (ModelCircuitParallel(negative_rinf=True), ModelCircuitSeries()):
+        z, _ = model.run_model(true_params, freq)
+        data = {"freq": freq, "Z_real": z.real * 1.02, "Z_imag": z.imag * 0.97}
+        fit = FitBuilder(data, model)
+        fit.set_bounds(slider_configurations)
+
+        layout = model.LAYOUT
+        values = layout.to_array(guess)
+        x = layout.scale_free(values)
+        for name, residual, jacobian in (("Cole", fit._residual_cole, fit._jacobian_cole),
+                                         ("Bode", fit._residual_bode, fit._jacobian_bode)):
+            analytic = jacobian(layout.compose(x, values), layout)
+            numeric = np.zeros_like(analytic)
+            for i in range(x.size):
+                step = np.zeros_like(x)
+                step[i] = 1e-6
+                numeric[:, i] = (residual(layout.compose(x + step, values))
+                                 - residual(layout.compose(x - step, values))) / 2e-6
+            error = np.max(np.abs(analytic - numeric)) / np.max(np.abs(numeric))
+            print(f"{model.name} {name}: max relative Jacobian error = {error:.2e}")
+            assert error < 1e-6, f"{model.name} {name}: the closed-form Jacobian is off by {error:.2e}"
+
+            evaluations = []
+            for use_jacobian in (False, True):
+                calls = [0]
+
+                def counted(values, residual=residual):
+                    calls[0] += 1
+                    return residual(values)
+
+                start = time.perf_counter()
+                fit.fit_model(counted, guess, 0, jacobian if use_jacobian else None)
+                label = "analytic" if use_jacobian else "finite differences"
+                print(f"    fit with {label:<18}: {calls[0]:4d} model evaluations, "
+                      f"{1e3 * (time.perf_counter() - start):8.1f} ms")
+                evaluations.append(calls[0])
+            assert evaluations[1] < evaluations[0], f"{model.name} {name}: no fewer evaluations {evaluations}"
+
+
+def manual_test_fit_monitor():
+    """
+    Stop a finite-difference Bode fit with a short time budget, and one that
+    is cancelled before it starts: the first keeps its best point, the second
+    raises FitInterrupted. Run with: python -m AuxiliaryClasses.FitBuilder
+    """
+    params = {
+        "Linf": 1e-6, "Rinf": 1e3, "Rh": 5e4, "Fh": 1e4, "Ph": 0.8,
+        "Rm": 1e3, "Fm": 1e2, "Pm": 0.6, "Rl": 2e4, "Fl": 1.0, "Pl": 0.5,
+        "Re": 1e8, "Qe": 1e-6, "Pef": 0.5, "Pei": 0.3,
+    }
+    freq = np.logspace(6, -1, 40)
+    model = ModelCircuitSeries()
+    z, _ = model.run_model(params, freq)
+    fit = FitBuilder({"freq": freq, "Z_real": z.real * 1.02, "Z_imag": z.imag * 0.97}, model)
+    fit.set_bounds({k: ("DoubleSliderWithTicks", 0.0, 1.0) if k.startswith('P') else ("EPowerSliderWithTicks", -10, 10)
+                    for k in params})
+    guess = {k: v * (1.3 if not k.startswith('P') else 0.9) for k, v in params.items()}
+
+    monitor = FitMonitor(time_budget=0.02, progress=lambda n, cost, p: print(f"    {n} evaluations, cost {cost:.4g}"),
+                         interval=0.005)
+    fit.fit_model(fit._residual_bode, guess, 0, None, monitor)
+    print(f"Time budget: stopped ({monitor.stop_reason}) after {fit.last_evaluations} evaluations, "
+          f"best cost {monitor.best_cost:.4g}")
+
+    monitor = FitMonitor()
+    monitor.cancel(keep_best=False)
+    try:
+        fit.fit_model(fit._residual_bode, guess, 0, None, monitor)
+        print("Cancelled fit: not interrupted (unexpected)")
+    except FitInterrupted:
+        print("Cancelled fit: FitInterrupted raised, nothing emitted (expected)")
+
+
+
+def manual_test_coarse_fit():
+    """
+    Fit a dense synthetic Parallel spectrum with the coarse first stage, then
+    refine it, and compare the time and cost of both stages.
+    Run with: python -m AuxiliaryClasses.FitBuilder
+    """
+    params = {
+        "Linf": 1e-6, "Rinf": 1e3, "Rh": 5e4, "Fh": 1e4, "Ph": 0.8,
+        "Rm": 1e3, "Fm": 1e2, "Pm": 0.6, "Rl": 2e4, "Fl": 1.0, "Pl": 0.5,
+        "Re": 1e8, "Qe": 1e-6, "Pef": 0.5, "Pei": 0.3,
+    }
+    freq = np.logspace(6, -2, 200)
+    model = ModelCircuitParallel()
+    z = model.evaluate(params, freq).z
+    fit = FitBuilder({"freq": freq, "Z_real": z.real * 1.02, "Z_imag": z.imag * 0.97}, model)
+    fit.set_bounds({k: ("DoubleSliderWithTicks", 0.0, 1.0) if k.startswith('P') else ("EPowerSliderWithTicks", -10, 10)
+                    for k in params})
+    guess = {k: v * (1.5 if not k.startswith('P') else 0.9) for k, v in params.items()}
+
+    for cost in ("cole", "bode"):
+        coarse = fit.fit_model_coarse(cost, guess, 0, CoarseFitSettings(time_budget=1.0))
+        print(f"{cost} coarse: {fit.last_coarse_telemetry.summary()}")
+        fit._fit_with_cache(cost, coarse, 0)
+        print(f"{cost} refined: {fit.last_telemetry.summary()}")
+
+
+
+def manual_test_tracking():
+    """
+    Fit a noisy synthetic Series spectrum, then trim its range one point at a
+    time and follow the fit with fit_model_tracking. Prints the cost before
+    and after tracking and the cost of a full refit of the same range.
+    Run with: python -m AuxiliaryClasses.FitBuilder
+    """
+    params = {
+        "Linf": 1e-6, "Rinf": 1e3, "Rh": 5e4, "Fh": 1e4, "Ph": 0.8,
+        "Rm": 1e3, "Fm": 1e2, "Pm": 0.6, "Rl": 2e4, "Fl": 1.0, "Pl": 0.5,
+        "Re": 1e8, "Qe": 1e-6, "Pef": 0.5, "Pei": 0.3,
+    }
+    freq = np.logspace(6, -2, 60)
+    model = ModelCircuitSeries()
+    z, _ = model.run_model(params, freq)
+    z *= 1 + 0.03 * np.random.default_rng(1).standard_normal(freq.size)
+    data = {"freq": freq, "Z_real": z.real, "Z_imag": z.imag}
+    fit = FitBuilder(data, model)
+    fit.set_bounds({k: ("DoubleSliderWithTicks", 0.0, 1.0) if k.startswith('P') else ("EPowerSliderWithTicks", -10, 10)
+                    for k in params})
+    tracked = fit.fit_model_bode(params, 0)
+
+    for low in range(1, 6):
+        fit.set_expdata({key: values[low:] for key, values in data.items()})
+        start_cost = 0.5 * float(np.sum(fit._residual_bode(model.LAYOUT.to_array(tracked)) ** 2))
+        tracked = fit.fit_model_tracking("bode", tracked, 0)
+        tracking = fit.last_tracking_telemetry
+        fit._solve(fit._residual_bode, tracked, 0, fit._jacobian_bode)
+        print(f"range {low}..59: cost {start_cost:.5g} -> tracking {tracking.cost:.5g} ({tracking.nfev} evaluations, "
+              f"{tracking.njev} Jacobians) / full refit {fit.last_cost:.5g} ({fit.last_evaluations} evaluations)")
+
+
+if __name__ == '__main__':
+    manual_test_jacobian()
+    manual_test_fit_monitor()
+    manual_test_coarse_fit()
+    manual_test_tracking()
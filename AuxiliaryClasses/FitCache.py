@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""
+Cache of the F1/F2 fit results, keyed by everything that determines them.
+
+The key is a hash of the experimental arrays of the fitted frequency range,
+the circuit model and the sign of Rinf, the cost function, the Gaussian
+prior (flag and weight), the bounds, the disabled parameters and the initial
+guess. The same fit started again from the same state is returned at once.
+Entries are evicted in least-recently-used order beyond max_entries, and
+can be written to a .json file so that they survive the session.
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+
+import numpy as np
+
+
+@dataclass
+class CachedFit:
+    """Best fit of one key, with the diagnostics of the fit that found it."""
+    best_fit: dict
+    evaluations: int
+    cost: float
+    elapsed: float
+
+
+class FitCache(object):
+    """
+    LRU of CachedFit keyed by the digests of fit_key. When path is given,
+    the entries are read from it on creation and written back after every
+    new entry.
+    """
+    def __init__(self, max_entries: int = 256, path: str = None):
+        self.max_entries = max(1, int(max_entries))
+        self.path = path or None
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if self.path is not None:
+            self.load()
+
+    # ---------- Keys ----------
+    @staticmethod
+    def fit_key(arrays, settings: dict) -> str:
+        """
+        Return the digest of some float arrays (experimental data, bounds,
+        initial values) and of a dict of settings with a stable repr.
+        """
+        digest = hashlib.blake2b(digest_size=16)
+        for array in arrays:
+            array = np.ascontiguousarray(array, dtype=np.float64)
+            digest.update(str(array.shape).encode())
+            digest.update(array.tobytes())
+        digest.update(repr(sorted(settings.items())).encode())
+        return digest.hexdigest()
+
+    # ---------- Entries ----------
+    def get(self, key: str):
+        """Return the CachedFit of key (and mark it as recently used), or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: str, entry: CachedFit) -> None:
+        """Store entry, evicting the least recently used ones beyond max_entries."""
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        if self.path is not None:
+            self.save()
+
+    def clear(self) -> None:
+        """Forget every entry and reset the statistics (the file is kept until the next save)."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def stats(self) -> dict:
+        """Return the number of hits, misses and entries, and the hit rate."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries),
+                    "max_entries": self.max_entries, "hit_rate": self.hits / lookups if lookups else 0.0}
+
+    def __contains__(self, key: str) -> bool:
+        """Return True if key is cached, without counting a hit or a miss."""
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    # ---------- Persistence ----------
+    def save(self) -> None:
+        """Write the entries to path, oldest first, replacing the file atomically."""
+        with self._lock:
+            data = [[key, asdict(entry)] for key, entry in self._entries.items()]
+        temporary = f"{self.path}.tmp"
+        try:
+            with open(temporary, "w") as f:
+                json.dump(data, f)
+            os.replace(temporary, self.path)
+        except OSError as e:
+            print(f"FitCache.save: cannot write '{self.path}': {e}")
+
+    def load(self) -> None:
+        """Read the entries of path, if it exists; an unreadable file is ignored."""
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            entries = [(key, CachedFit(**entry)) for key, entry in data]
+        except (OSError, ValueError, TypeError) as e:
+            print(f"FitCache.load: ignoring '{self.path}': {e}")
+            return
+        with self._lock:
+            for key, entry in entries[-self.max_entries:]:
+                self._entries[key] = entry
+
+
+#------------------------------------------------------------------------------
+# Test
+#------------------------------------------------------------------------------
+def manual_test_fit_cache():
+    """
+    Fill a cache of two entries with three keys, check the LRU order and the
+    statistics, and reload it from disk. Run with: python -m AuxiliaryClasses.FitCache
+    """
+    import tempfile
+
+    data = np.linspace(0, 1, 5)
+    keys = [FitCache.fit_key([data], {"cost": cost}) for cost in ("cole", "bode", "other")]
+    print("Same inputs, same key:", FitCache.fit_key([data.copy()], {"cost": "cole"}) == keys[0])
+
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "fit_cache.json")
+        cache = FitCache(max_entries=2, path=path)
+        cache.put(keys[0], CachedFit({"Rh": 1.0}, 40, 0.5, 0.1))
+        cache.put(keys[1], CachedFit({"Rh": 2.0}, 50, 0.6, 0.1))
+        cache.get(keys[0])                     # keys[1] becomes the least recently used
+        cache.put(keys[2], CachedFit({"Rh": 3.0}, 60, 0.7, 0.1))
+        print("Evicted the least recently used:", cache.get(keys[1]) is None)
+        print("Stats:", cache.stats())
+
+        reloaded = FitCache(max_entries=2, path=path)
+        print("Reloaded from disk:", reloaded.get(keys[0]), reloaded.get(keys[2]) is not None)
+
+
+if __name__ == '__main__':
+    manual_test_fit_cache()
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+Warm starts for the fits of neighbouring files.
+
+FitChain keeps the best fit of every file fitted in the session with a short
+signature of its spectrum (log|Z| and phase on a fixed log-frequency grid).
+When chaining is on, the initial guess of a new file is the fit of the file
+with the closest spectrum, or of the previous file when no spectrum can be
+compared. The number of evaluations of each fit is kept, so that warm fits
+can be compared with the mean of the cold ones.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+
+
+@dataclass
+class ChainedFit:
+    """Best fit of one file, with the signature of its spectrum."""
+    params: dict
+    signature: np.ndarray
+    evaluations: int
+    warm: bool
+
+
+class FitChain(object):
+    """
+    Session memory of the fits, used to warm-start the next ones.
+    """
+    # Log-frequency grid of the spectral signatures (1e-3 Hz to 1e7 Hz).
+    SIGNATURE_GRID = np.linspace(-3, 7, 41)
+    MIN_OVERLAP = 4
+
+    def __init__(self):
+        self.enabled = False
+        self._fits = {}
+        self._last_file = None
+        self._cold_evaluations = []
+
+    # Public Methods
+    def set_enabled(self, state: bool) -> None:
+        self.enabled = state
+
+    def initial_guess(self, experiment_data: dict):
+        """
+        Return (params, source file name) to start the fit of a spectrum, or
+        None when nothing has been fitted yet. The source is the fitted file
+        with the closest spectrum, else the last fitted file.
+        """
+        if not self._fits:
+            return None
+
+        signature = self.signature(experiment_data)
+        distances = {name: self.distance(signature, fit.signature) for name, fit in self._fits.items()}
+        comparable = {name: d for name, d in distances.items() if np.isfinite(d)}
+        if comparable:
+            source = min(comparable, key=comparable.get)
+        else:
+            source = self._last_file
+        return dict(self._fits[source].params), source
+
+    def record(self, file_name: str, experiment_data: dict, params: dict, evaluations: int, warm: bool) -> None:
+        """Keep the best fit of file_name and the number of evaluations it took."""
+        self._fits[file_name] = ChainedFit(dict(params), self.signature(experiment_data), evaluations, warm)
+        self._last_file = file_name
+        if not warm:
+            self._cold_evaluations.append(evaluations)
+
+    def saved_evaluations(self, file_name: str):
+        """
+        Return the evaluations saved by the warm start of file_name compared
+        with the mean cold fit of the session, or None if it is unknown.
+        """
+        fit = self._fits.get(file_name)
+        if fit is None or not fit.warm or not self._cold_evaluations:
+            return None
+        return int(round(np.mean(self._cold_evaluations))) - fit.evaluations
+
+    def cold_fit_count(self) -> int:
+        """Return the number of cold fits the saved evaluations are compared with."""
+        return len(self._cold_evaluations)
+
+    def clear(self) -> None:
+        self._fits.clear()
+        self._last_file = None
+        self._cold_evaluations.clear()
+
+    # Spectral signatures
+    @classmethod
+    def signature(cls, experiment_data: dict) -> np.ndarray:
+        """
+        Return log10|Z| and the phase (rad) interpolated on SIGNATURE_GRID,
+        NaN outside the measured frequencies.
+        """
+        freq = np.asarray(experiment_data["freq"], dtype=float)
+        z = np.asarray(experiment_data["Z_real"]) + 1j * np.asarray(experiment_data["Z_imag"])
+        valid = (freq > 0) & (z != 0)
+        if np.count_nonzero(valid) < 2:
+            return np.full(2 * cls.SIGNATURE_GRID.size, np.nan)
+
+        log_freq = np.log10(freq[valid])
+        order = np.argsort(log_freq)
+        log_freq, z = log_freq[order], z[valid][order]
+        inside = (cls.SIGNATURE_GRID >= log_freq[0]) & (cls.SIGNATURE_GRID <= log_freq[-1])
+
+        log_abs = np.where(inside, np.interp(cls.SIGNATURE_GRID, log_freq, np.log10(np.abs(z))), np.nan)
+        phase = np.where(inside, np.interp(cls.SIGNATURE_GRID, log_freq, np.unwrap(np.angle(z))), np.nan)
+        return np.concatenate([log_abs, phase])
+
+    @classmethod
+    def distance(cls, signature_1: np.ndarray, signature_2: np.ndarray) -> float:
+        """RMS difference of two signatures on their common frequencies, inf if too few."""
+        difference = signature_1 - signature_2
+        common = np.isfinite(difference)
+        if np.count_nonzero(common) < 2 * cls.MIN_OVERLAP:
+            return np.inf
+        return float(np.sqrt(np.mean(difference[common] ** 2)))
+
+
+#------------------------------------------------------------------------------
+# Test
+#------------------------------------------------------------------------------
+def manual_test_fit_chain():
+    """
+    Two close spectra and one far away: the guess for a new spectrum must come
+    from the closest one. Run with: python -m AuxiliaryClasses.FitChain
+    """
+    freq = np.logspace(6, -1, 50)
+
+    def spectrum(r, f0):
+        z = r / (1 + 1j * freq / f0)
+        return {"freq": freq, "Z_real": z.real, "Z_imag": z.imag}
+
+    chain = FitChain()
+    print("Guess with no fit:", chain.initial_guess(spectrum(1e4, 1e3)))
+
+    chain.record("a", spectrum(1e4, 1e3), {"R": 1e4}, evaluations=40, warm=False)
+    chain.record("b", spectrum(1e6, 1e1), {"R": 1e6}, evaluations=60, warm=False)
+    params, source = chain.initial_guess(spectrum(1.1e4, 1.2e3))
+    print(f"Guess for a spectrum close to 'a': {params} from '{source}' (expected 'a')")
+
+    chain.record("c", spectrum(1.1e4, 1.2e3), params, evaluations=12, warm=True)
+    print(f"Evaluations saved for 'c': {chain.saved_evaluations('c')} (expected {50 - 12})")
+
+
+if __name__ == '__main__':
+    manual_test_fit_chain()
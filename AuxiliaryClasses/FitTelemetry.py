@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+Telemetry of the F1/F2 fits: what each fit cost and where its time went.
+
+FitBuilder times every fit with a FitTimer: the model impedance (and its
+Jacobian), the assembly of the residuals around it, and the Gaussian prior
+and ordering penalty. The rest of the wall time is the optimizer itself
+(trust-region steps, finite differences bookkeeping...). With the numba
+backend the model and the residual are one kernel, so its time is counted
+as model time.
+
+The FitTelemetry of each fit goes to a TelemetryLog: a rolling history of
+the session, optionally appended to a JSON-lines file, so that slow samples
+and regressions can be found afterwards.
+"""
+import json
+import threading
+from collections import deque
+from dataclasses import asdict, dataclass
+from datetime import datetime
+
+import numpy as np
+
+# Output file columns of FitTelemetry.columns, in order.
+TELEMETRY_COLUMNS = ("fit_method", "fit_cost", "fit_nfev", "fit_njev", "fit_status", "fit_wall_s",
+                     "fit_model_s", "fit_residual_s", "fit_prior_s", "fit_optimizer_s")
+
+
+class FitTimer(object):
+    """Seconds accumulated by the phases of one fit (see the module docstring)."""
+    def __init__(self):
+        self.model = 0.0
+        # Residual and Jacobian functions, model included.
+        self.evaluation = 0.0
+        self.prior = 0.0
+
+
+@dataclass
+class FitTelemetry:
+    """
+    Diagnostics of one fit. status is the least_squares status, or None
+    when the fit was stopped by its monitor or came from the fit cache.
+    """
+    cost_function: str
+    model: str
+    optimizer: str
+    nfev: int
+    njev: int
+    status: int
+    message: str
+    cost: float
+    wall: float
+    model_time: float = 0.0
+    residual_time: float = 0.0
+    prior_time: float = 0.0
+    cached: bool = False
+    timestamp: str = ""
+
+    @property
+    def optimizer_time(self) -> float:
+        """Wall time outside the model, the residuals and the prior."""
+        return max(0.0, self.wall - self.model_time - self.residual_time - self.prior_time)
+
+    @classmethod
+    def from_timer(cls, timer: FitTimer, wall: float, **fields) -> "FitTelemetry":
+        """Build the telemetry of a fit timed by timer, which took wall seconds."""
+        return cls(wall=wall, model_time=timer.model, residual_time=max(0.0, timer.evaluation - timer.model),
+                   prior_time=timer.prior, timestamp=datetime.now().strftime('%Y-%m-%d %H:%M:%S'), **fields)
+
+    def columns(self) -> dict:
+        """Return the values of TELEMETRY_COLUMNS."""
+        return {
+            "fit_method": self.optimizer, "fit_cost": self.cost, "fit_nfev": self.nfev, "fit_njev": self.njev,
+            "fit_status": "cached" if self.cached else ("stopped" if self.status is None else self.status),
+            "fit_wall_s": self.wall, "fit_model_s": self.model_time, "fit_residual_s": self.residual_time,
+            "fit_prior_s": self.prior_time, "fit_optimizer_s": self.optimizer_time,
+        }
+
+    def summary(self) -> str:
+        """One line for the status bar."""
+        if self.cached:
+            return f"{self.cost_function} fit ({self.optimizer}) from cache ({self.nfev} evaluations when fitted), cost {self.cost:.4g}"
+        wall = self.wall or 1.0
+        shares = ", ".join(f"{name} {100 * seconds / wall:.0f}%" for name, seconds in (
+            ("model", self.model_time), ("residuals", self.residual_time),
+            ("prior", self.prior_time), ("optimizer", self.optimizer_time)))
+        return (f"{self.cost_function} fit ({self.optimizer}): {self.nfev} evaluations, {self.njev} Jacobians, "
+                f"{self.wall:.3g} s ({shares}), cost {self.cost:.4g} - {self.message}")
+
+    def to_json(self) -> dict:
+        """Return the fields and the optimizer time, with plain Python types."""
+        data = asdict(self)
+        data["optimizer_time"] = self.optimizer_time
+        return data
+
+
+class TelemetryLog(object):
+    """
+    Rolling history of the last max_entries fits. When path is given, each
+    fit is also appended to it as one JSON line.
+    """
+    def __init__(self, max_entries: int = 200, path: str = None):
+        self.path = path or None
+        self._entries = deque(maxlen=max(1, int(max_entries)))
+        self._lock = threading.Lock()
+
+    def append(self, telemetry: FitTelemetry) -> None:
+        with self._lock:
+            self._entries.append(telemetry)
+        if self.path is not None:
+            try:
+                with open(self.path, "a") as f:
+                    f.write(json.dumps(telemetry.to_json()) + "\n")
+            except OSError as e:
+                print(f"TelemetryLog.append: cannot write '{self.path}': {e}")
+
+    def history(self) -> list:
+        """Return the recorded fits, oldest first."""
+        with self._lock:
+            return list(self._entries)
+
+    def stats(self) -> dict:
+        """
+        Return the number of fits, the median and maximum wall time of the
+        fits that were not cached, and the slowest of them.
+        """
+        fitted = [entry for entry in self.history() if not entry.cached]
+        if not fitted:
+            return {"fits": 0, "median_wall": np.nan, "max_wall": np.nan, "slowest": None}
+        walls = np.array([entry.wall for entry in fitted])
+        return {"fits": len(fitted), "median_wall": float(np.median(walls)),
+                "max_wall": float(walls.max()), "slowest": fitted[int(walls.argmax())]}
+
+    def __len__(self):
+        return len(self._entries)
+
+
+#------------------------------------------------------------------------------
+# Test
+#------------------------------------------------------------------------------
+def manual_test_fit_telemetry():
+    """
+    Fit a synthetic Parallel spectrum with both costs and print the telemetry
+    of each fit and of the session. Run with: python -m AuxiliaryClasses.FitTelemetry
+    """
+    from .FitBuilder import FitBuilder
+    from .ModelCircuits import ModelCircuitParallel
+
+    params = {"Linf": 1e-6, "Rinf": 1e3, "Rh": 5e4, "Fh": 1e4, "Ph": 0.8, "Rm": 1e3, "Fm": 1e2, "Pm": 0.6,
+              "Rl": 2e4, "Fl": 1.0, "Pl": 0.5, "Re": 1e8, "Qe": 1e-6, "Pef": 0.5, "Pei": 0.3}
+    freq = np.logspace(6, -1, 60)
+    model = ModelCircuitParallel()
+    z = model.evaluate(params, freq).z
+    fit = FitBuilder({"freq": freq, "Z_real": z.real * 1.02, "Z_imag": z.imag * 0.97}, model)
+    fit.set_bounds({k: ("DoubleSliderWithTicks", 0.0, 1.0) if k.startswith('P') else ("EPowerSliderWithTicks", -10, 10)
+                    for k in params})
+    guess = {k: v * (1.3 if not k.startswith('P') else 0.9) for k, v in params.items()}
+    fit.fit_model_cole(guess, 0)
+    print(fit.last_telemetry.summary())
+    fit.fit_model_bode(guess, 0)
+    print(fit.last_telemetry.summary())
+    print("Columns:", fit.last_telemetry.columns())
+    print("Session:", fit.telemetry_log.stats())
+
+
+if __name__ == '__main__':
+    manual_test_fit_telemetry()
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+Background threads of the F1/F2 fits and of the pool jobs.
+
+The fit runs in FitThread while the GUI keeps its event loop. The FitMonitor
+of the fit reports its progress, which the thread re-emits as a Qt signal
+(delivered in the GUI thread), and lets the GUI cancel the fit or bound its
+duration.
+
+The multi-start fit, bootstrap and range sweep run in JobThread the same
+way, their JobMonitor (see PoolJobs) taking the place of the FitMonitor.
+"""
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from .FitBuilder import FitInterrupted, FitMonitor
+from .PoolJobs import JobInterrupted, JobMonitor
+
+
+class FitThread(QThread):
+    """
+    Runs fit_function(initial_params, monitor=...) once.
+
+    progress(evaluations, cost, params) is emitted at most every
+    monitor.interval seconds with the best parameters so far, and
+    fit_done(best_fit) when the fit ends; best_fit is empty if the fit was
+    cancelled without keeping its best point, or failed.
+    """
+    progress = pyqtSignal(int, float, dict)
+    fit_done = pyqtSignal(dict)
+
+    def __init__(self, fit_function, initial_params: dict, time_budget: float = None, parent=None):
+        super().__init__(parent)
+        self._fit_function = fit_function
+        self._initial_params = dict(initial_params)
+        self.monitor = FitMonitor(time_budget, progress=self.progress.emit)
+        # Set when the result must be ignored (cancelled without keeping the best point).
+        self.discarded = False
+
+    def cancel(self, keep_best: bool = True) -> None:
+        """Stop the fit at its next evaluation; safe to call from the GUI thread."""
+        self.discarded = not keep_best
+        self.monitor.cancel(keep_best)
+
+    def run(self) -> None:
+        try:
+            best_fit = self._fit_function(self._initial_params, monitor=self.monitor)
+        except FitInterrupted:
+            best_fit = {}
+        except Exception as e:
+            print(f"FitThread: the fit failed: {type(e).__name__}: {e}")
+            best_fit = {}
+        self.fit_done.emit(best_fit)
+
+
+class JobThread(QThread):
+    """
+    Runs job_function(progress=..., monitor=...) once.
+
+    progress(done, total) is emitted as the tasks of the job complete, and
+    job_done(result) when the job ends; result is None if the job was
+    cancelled without keeping its completed part, or failed.
+    """
+    progress = pyqtSignal(int, int)
+    job_done = pyqtSignal(object)
+
+    def __init__(self, job_function, parent=None):
+        super().__init__(parent)
+        self._job_function = job_function
+        self.monitor = JobMonitor()
+        # Set when the result must be ignored (cancelled without keeping it).
+        self.discarded = False
+
+    def cancel(self, keep_best: bool = True) -> None:
+        """Stop the job without waiting for its pool; safe to call from the GUI thread."""
+        self.discarded = not keep_best
+        self.monitor.cancel(keep_best)
+
+    def run(self) -> None:
+        try:
+            result = self._job_function(progress=self.progress.emit, monitor=self.monitor)
+        except JobInterrupted:
+            result = None
+        except Exception as e:
+            print(f"JobThread: the job failed: {type(e).__name__}: {e}")
+            result = None
+        self.job_done.emit(result)
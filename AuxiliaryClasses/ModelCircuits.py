@@ -4,8 +4,33 @@ Created on Wed Mar  5 11:59:26 2025
 
 @author: agarcian
 """
+import threading
+from dataclasses import dataclass, field
+
 import numpy as np
 
+from . import CircuitKernels
+from .CircuitBuilder import R, L, CPE, Series, Parallel, FrequencyBasis, compile_circuit
+from .ParameterLayout import ParameterLayout
+
+
+@dataclass
+class ModelEvaluation:
+    """
+    Result of a stateless model evaluation (ModelCircuitParent.evaluate).
+    """
+    z: np.ndarray = None            # Impedance of the whole circuit
+    z_rock: np.ndarray = None       # Impedance of the rock alone
+    q: dict = field(default_factory=dict)
+    par_second: dict = field(default_factory=dict)
+    par_other_sec: dict = field(default_factory=dict)
+    terms: dict = field(default_factory=dict)   # Electrode ("zarce") and high-frequency ("zarch") arcs
+
+    @property
+    def secondary(self) -> tuple:
+        """Return (q, par_second, par_other_sec), as accepted by evaluate."""
+        return self.q, self.par_second, self.par_other_sec
+
 
 ###############################################################################
 # Circuit Models
@@ -13,7 +38,40 @@ import numpy as np
 class ModelCircuitParent(object):
     """
     Parent class for circuit models.
+    The freq_array of every evaluation may also be the FrequencyBasis of the
+    frequencies, kept by the caller when it evaluates them repeatedly.
     """
+    # Slider keys in the order of config.ini. Column order of the batched API.
+    PARAMETER_KEYS = ("Linf", "Rinf", "Rh", "Fh", "Ph", "Rm", "Fm", "Pm",
+                      "Rl", "Fl", "Pl", "Re", "Qe", "Pef", "Pei")
+    # Values computed by _secondary_parameters that circuits may also read.
+    SECONDARY_KEYS = ("Qh", "Qm", "Ql", "R0", "pRh", "pQh", "pRm", "pQm", "pRl", "pQl")
+    # Flat parameter vectors accepted by the models follow this layout.
+    LAYOUT = ParameterLayout(PARAMETER_KEYS)
+    # Parameters each secondary value is computed from (_secondary_values).
+    SECONDARY_DEPENDENCIES = {
+        "Qh": ("Rh", "Fh", "Ph"), "Qm": ("Rm", "Fm", "Pm"), "Ql": ("Rl", "Fl", "Pl"),
+        "R0": ("Rinf", "Rh", "Rm", "Rl"),
+        "pRh": ("Rinf", "Rh"), "pQh": ("Rinf", "Rh", "Fh", "Ph"),
+        "pRm": ("Rinf", "Rh", "Rm"), "pQm": ("Rinf", "Rh", "Rm", "Fm", "Pm"),
+        "pRl": ("Rinf", "Rh", "Rm", "Rl"), "pQl": ("Rinf", "Rh", "Rm", "Rl", "Fl", "Pl"),
+    }
+    # Arguments of _secondary_values, as indices of PARAMETER_KEYS.
+    _SECONDARY_INPUTS = LAYOUT.indices(("Rinf", "Rh", "Fh", "Ph", "Rm", "Fm", "Pm", "Rl", "Fl", "Pl"))
+    _RINF = LAYOUT.index["Rinf"]
+    # Order of the values read by the compiled circuits.
+    CIRCUIT_SYMBOLS = PARAMETER_KEYS + SECONDARY_KEYS
+
+    # Subclasses describe their circuit with CircuitBuilder elements. CIRCUIT
+    # must contain ROCK and name it "rock"; the electrode arc may be named
+    # "zarce" and a series high-frequency arc "zarch" (reused by estimate_rock).
+    name = ""
+    CIRCUIT = None
+    ROCK = None
+    # Id of the JIT kernel of CircuitKernels computing CIRCUIT, or None.
+    # A subclass that changes CIRCUIT must reset it.
+    KERNEL = None
+
     def __init__(self, negative_rinf=False, q=None, par_second=None, par_other_sec=None):
         super().__init__()
         # Avoid mutable default arguments; properly assign attributes.
@@ -24,12 +82,25 @@ class ModelCircuitParent(object):
         if par_other_sec is None:
             par_other_sec = {}
         # Attributes
-        self.name=""
-        
         self.negative_rinf = negative_rinf
         self.q = q
         self.par_second = par_second #secondary variables used in the calculations
         self.par_other_sec=par_other_sec   #other secondary variables not used in calculations
+        
+        # Electrode and high-frequency arc terms of the last run_model call,
+        # reused by estimate_rock: (parameter values, frequency array, terms).
+        self._last_terms = None
+        # Guards the attributes above when run_model is called from several threads.
+        self._state_lock = threading.RLock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_state_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._state_lock = threading.RLock()
 
     # ------------------------------------------
     # Public Methods
@@ -38,38 +109,176 @@ class ModelCircuitParent(object):
         """Return the current state of the model's attributes."""
         return self.negative_rinf, self.q, self.par_second, self.par_other_sec
 
+    def evaluate(self, parameters: dict, freq_array: np.ndarray, secondary=None) -> ModelEvaluation:
+        """
+        Stateless evaluation of the circuit. Returns a ModelEvaluation with
+        the impedances and the secondary variables; the model attributes are
+        not read nor modified, so one model can be used by several threads.
+        secondary, a (q, par_second, par_other_sec) tuple such as
+        ModelEvaluation.secondary, is used instead of recomputing them.
+        """
+        par = self._signed_parameters(parameters)
+        if secondary is None:
+            secondary = self._secondary_parameters(par)
+        q, par_second, par_other_sec = secondary
+
+        basis = self._frequency_basis(freq_array, self._exponents(par))
+        terms = {}
+        z, z_rock = self._impedance(par, q, par_second, basis, terms)
+        return ModelEvaluation(z, z_rock, q, par_second, par_other_sec, terms)
+
+    def impedance(self, values: np.ndarray, freq_array: np.ndarray) -> np.ndarray:
+        """
+        Stateless circuit impedance of a flat parameter vector in the order
+        of PARAMETER_KEYS (see LAYOUT). No parameter dict is built: this is
+        the path used at every step of a fit.
+        """
+        signed = self._signed_vector(values)
+        circuit_values = np.concatenate((signed, self._secondary_values(*signed[self._SECONDARY_INPUTS])))
+        circuit, _ = self._compiled()
+        basis = self._frequency_basis(freq_array, circuit_values[self._exponent_indices])
+        z, _ = circuit(circuit_values, basis)
+        return z
+
+    def evaluate_rock(self, parameters: dict, freq_array: np.ndarray, secondary=None) -> np.ndarray:
+        """Stateless impedance of the rock alone (no electrode, no inductance)."""
+        par = self._signed_parameters(parameters)
+        if secondary is None:
+            secondary = self._secondary_parameters(par)
+        q, par_second, _ = secondary
+
+        basis = self._frequency_basis(freq_array, self._exponents(par))
+        return self._rock_impedance(par, q, par_second, basis)
+
     def run_model(self, parameters: dict, freq_array: np.ndarray, old_par_second=False):
         """
         Model of an electric circuit that uses the received values v as variables
         and returns the impedance array of the circuit.
+        Wrapper of evaluate that stores the secondary variables in the model.
         """
-        return np.array([])
+        with self._state_lock:
+            evaluation = self.evaluate(parameters, freq_array, self._stored_secondary(old_par_second))
+            self._store_secondary(evaluation.secondary)
+            self._last_terms = (self._terms_key(parameters), freq_array, evaluation.terms)
+        return evaluation.z, evaluation.z_rock
 
     def run_rock(self, parameters: dict, freq_array: np.ndarray, old_par_second=False):
-        """Placeholder method for a variant of the rock's circuit model."""
-        return np.array([])
+        """Return the impedance of the rock alone (no electrode, no inductance)."""
+        with self._state_lock:
+            secondary = self._stored_secondary(old_par_second)
+            if secondary is None:
+                secondary = self._secondary_parameters(self._signed_parameters(parameters))
+                self._store_secondary(secondary)
+            return self.evaluate_rock(parameters, freq_array, secondary)
+
+    def run_model_batch(self, parameter_sets: np.ndarray, freq_array: np.ndarray, keys=None):
+        """
+        Evaluate M parameter sets in one call.
+
+        parameter_sets is an (M x P) matrix whose columns follow keys
+        (PARAMETER_KEYS by default). Returns the (M x F) circuit impedance and
+        the (M x F) rock impedance. The model attributes (q, par_second,
+        par_other_sec) are not modified.
+        """
+        if keys is None:
+            keys = self.PARAMETER_KEYS
+        parameter_sets = np.atleast_2d(np.asarray(parameter_sets, dtype=float))
+        if parameter_sets.shape[1] != len(keys):
+            raise ValueError(
+                f"ModelCircuitParent.run_model_batch: expected {len(keys)} columns, got {parameter_sets.shape[1]}."
+            )
+
+        # One column vector per parameter, broadcast against the frequencies.
+        columns = {key: parameter_sets[:, i, np.newaxis] for i, key in enumerate(keys)}
+        par = self._signed_parameters(columns)
+        basis = self._frequency_basis(freq_array, self._exponents(par))
+
+        kernel = self.jit_kernel()
+        if kernel is not None:
+            signed_sets = np.hstack([par[k] for k in self.PARAMETER_KEYS])
+            return CircuitKernels.impedance_batch(kernel, signed_sets, basis)
+
+        q, par_second, _ = self._secondary_parameters(par)
+        z, z_rock = self._impedance(par, q, par_second, basis)
+
+        shape = (parameter_sets.shape[0], basis.size)
+        return np.broadcast_to(z, shape), np.broadcast_to(z_rock, shape)
     
-    def estimate_rock(self, parameters: dict, freq_array: np.ndarray, impedance: np.ndarray):
-        """Estimates the rock impedance from experimental data."""
+    def run_model_jacobian(self, parameters: dict, freq_array: np.ndarray):
+        """
+        Return the circuit impedance and its closed-form derivatives.
+
+        The Jacobian is an (F x P) complex array whose column i is dZ/dp_i for
+        the keys of PARAMETER_KEYS, in slider units (the sign of Rinf is taken
+        into account). The model attributes are not modified.
+        """
+        par = self._signed_parameters(parameters)
+        q, par_second, _ = self._secondary_parameters(par)
+        basis = self._frequency_basis(freq_array, self._exponents(par))
+
+        z, _ = self._impedance(par, q, par_second, basis)
+        jacobian = np.zeros((basis.size, len(self.PARAMETER_KEYS)), dtype=complex)
+        self._electrode_inductor_jacobian(par, basis, jacobian)
+        self._circuit_jacobian(par, q, par_second, basis, jacobian)
+
+        if self.negative_rinf:
+            jacobian[:, self._index("Rinf")] *= -1
+        return z, jacobian
+
+    def jit_kernel(self):
+        """Return the CircuitKernels id of the model, or None when NumPy is used."""
+        if self.KERNEL is None or CircuitKernels.get_backend() != "numba":
+            return None
+        return self.KERNEL
+
+    def jit_inputs(self, parameters: dict, freq_array: np.ndarray):
+        """
+        Return (kernel, parameter vector, frequency basis) for the
+        CircuitKernels functions, or None when the model runs on NumPy.
+        parameters is a dict or a flat vector in the order of PARAMETER_KEYS.
+        The frequencies are validated as in evaluate.
+        """
+        kernel = self.jit_kernel()
+        if kernel is None:
+            return None
+        if isinstance(parameters, dict):
+            parameters = self.LAYOUT.to_array(parameters)
+        vector = self._signed_vector(parameters)
+        self._compiled()
+        basis = self._frequency_basis(freq_array, vector[self._exponent_indices])
+        return kernel, vector, basis
+
+    def has_jacobian(self) -> bool:
+        """Return True if the model implements run_model_jacobian in closed form."""
+        return type(self)._circuit_jacobian is not ModelCircuitParent._circuit_jacobian
+
+    def estimate_rock(self, parameters: dict, freq_array: np.ndarray, impedance: np.ndarray, terms=None):
+        """
+        Estimates the rock impedance from experimental data.
+        Reuses the electrode and high-frequency arc terms given in terms (the
+        ModelEvaluation.terms of the same parameters and frequencies) or, if
+        None, those of the last run_model call when it was made with the same
+        parameters and frequency array.
+        """
         par = parameters
-        z_to_substract= []
-        
-        for f in freq_array:
-            z_cpee = self._cpe(f, par["Qe"], par["Pef"], par["Pei"])
-            zarce = self._parallel(z_cpee, par["Re"])
-            
-            z_cpeh = self._cpe(f, self.q["Qh"], par["Ph"], par["Ph"])
-            zarch = self._parallel(z_cpeh, par["Rh"])
-    
-            z_to_substract.append( zarch + zarce - par["Rh"])
-    
-        z_to_substract = np.array(z_to_substract)
-        
+        terms = self._cached_terms(parameters, freq_array) if terms is None else dict(terms)
+
+        if "zarce" not in terms or "zarch" not in terms:
+            basis = self._frequency_basis(freq_array, (par["Ph"], par["Pef"]))
+            if "zarce" not in terms:
+                terms["zarce"] = self._parallel_arrays(self._cpe_arrays(basis, par["Qe"], par["Pef"], par["Pei"]), par["Re"])
+            if "zarch" not in terms:
+                qh = self._q_from_f0(par["Rh"], par["Fh"], par["Ph"])
+                terms["zarch"] = self._parallel_arrays(self._cpe_arrays(basis, qh, par["Ph"], par["Ph"]), par["Rh"])
+
         # Ensure correct shape for subtraction
-        if z_to_substract.shape != impedance.shape:
-            raise ValueError(f"Shape mismatch: impedance has shape {impedance.shape}, but z_to_subtract has shape {z_to_substract.shape}")
+        if terms["zarch"].shape != impedance.shape:
+            raise ValueError(f"Shape mismatch: impedance has shape {impedance.shape}, but z_to_subtract has shape {terms['zarch'].shape}")
     
-        z_estimated_rock = impedance - z_to_substract
+        # impedance - (zarch + zarce - Rh), with a single output array.
+        z_estimated_rock = np.subtract(impedance, terms["zarch"])
+        z_estimated_rock -= terms["zarce"]
+        z_estimated_rock += par["Rh"]
     
         return z_estimated_rock
     
@@ -77,36 +286,200 @@ class ModelCircuitParent(object):
     # Private Methods
     # ------------------------------------------
     def _calculate_secondary_parameters(self, par):
+        """
+        Compute 'series' and 'parallel' secondary variables and store them in
+        q, par_second and par_other_sec.
+        """
+        self._store_secondary(self._secondary_parameters(par))
+
+    def _store_secondary(self, secondary) -> None:
+        """Store a (q, par_second, par_other_sec) tuple in the model attributes."""
+        q, par_second, par_other_sec = secondary
+        with self._state_lock:
+            if q is not self.q:
+                self.q.update(q)
+                self.par_second.update(par_second)
+                self.par_other_sec.update(par_other_sec)
+
+    def _stored_secondary(self, old_par_second: bool):
+        """Return the stored secondary variables if old_par_second, else None."""
+        if not old_par_second:
+            return None
+        return self.q, self.par_second, self.par_other_sec
+
+    def _secondary_parameters(self, par):
         """
         Compute 'series' and 'parallel' secondary variables.
 
-        Returns a dict of newly calculated secondary variables.
+        Works on scalars and on column arrays alike.
+        Returns the dicts (q, par_second, par_other_sec).
+        """
+        q, par_second, par_other_sec = {}, {}, {}
+
+        secondary = self._secondary_values(par["Rinf"], par["Rh"], par["Fh"], par["Ph"], par["Rm"],
+                                           par["Fm"], par["Pm"], par["Rl"], par["Fl"], par["Pl"])
+        for key, value in zip(self.SECONDARY_KEYS, secondary):
+            if key in ("Qh", "Qm", "Ql"):
+                q[key] = value
+            else:
+                par_second[key] = value
+        
+        par_other_sec["Ch"]= 1/(2*np.pi*par["Fh"]*par["Rh"] )
+        #par_other_sec["pCh"]=1/(2*np.pi*par["Fh"]*par_second["pRh"] )
+        par_other_sec["pCh"]= par_other_sec["Ch"]*(par["Rh"]/(par["Rinf"] + par["Rh"]))**2
+        par_other_sec["Cm"]= 1/(2*np.pi*par["Fm"]*par["Rm"] )
+        #par_other_sec["pCm"]=1/(2*np.pi*par["Fm"]*par_second["pRm"] )
+        par_other_sec["pCm"]= par_other_sec["Cm"]*(par["Rm"]/(par["Rinf"] + par["Rh"] + par["Rm"]))**2
+        par_other_sec["Cl"]=1/(2*np.pi*par["Fl"]*par["Rl"] )
+        #par_other_sec["pCl"] =1/(2*np.pi*par["Fl"]*par_second["pRl"] )
+        par_other_sec["pCl"] = par_other_sec["Cl"]*(par["Rl"]/(par["Rinf"] + par["Rh"] + par["Rm"] + par["Rl"]))**2
+
+        return q, par_second, par_other_sec
+
+    def _secondary_values(self, rinf, rh, fh, ph, rm, fm, pm, rl, fl, pl) -> tuple:
+        """
+        Return the secondary variables read by the circuits, in the order of
+        SECONDARY_KEYS. Works on scalars and on column arrays alike.
+        """
+        Qh = self._q_from_f0(rh, fh, ph)
+        Qm = self._q_from_f0(rm, fm, pm)
+        Ql = self._q_from_f0(rl, fl, pl)
+
+        R0 = rinf + rh + rm + rl
+        pRh = rinf * (rinf + rh) / rh
+        pQh = Qh * (rh / (rinf + rh)) ** 2
+        pRm = (rinf + rh) * (rinf + rh + rm) / rm
+        pQm = Qm * (rm / (rinf + rh + rm)) ** 2
+        pRl = (rinf + rh + rm) * (rinf + rh + rm + rl) / rl
+        pQl = Ql * (rl / (rinf + rh + rm + rl)) ** 2
+        return Qh, Qm, Ql, R0, pRh, pQh, pRm, pQm, pRl, pQl
+
+    def _signed_parameters(self, parameters) -> dict:
         """
-        Qh = self._q_from_f0(par["Rh"], par["Fh"], par["Ph"])
-        Qm = self._q_from_f0(par["Rm"], par["Fm"], par["Pm"])
-        Ql = self._q_from_f0(par["Rl"], par["Fl"], par["Pl"])
+        Return a copy of the parameters with the sign of Rinf applied.
+        parameters is a dict or a flat vector in the order of PARAMETER_KEYS.
+        """
+        par = self.LAYOUT.to_dict(parameters) if isinstance(parameters, np.ndarray) else parameters.copy()
+        if self.negative_rinf:
+            par['Rinf'] = -par['Rinf']
+        return par
+
+    def _signed_vector(self, values: np.ndarray) -> np.ndarray:
+        """Return a copy of a parameter vector with the sign of Rinf applied."""
+        signed = np.array(values, dtype=float)
+        if self.negative_rinf:
+            signed[self._RINF] = -signed[self._RINF]
+        return signed
 
-        self.q["Qh"] = Qh
-        self.q["Qm"] = Qm
-        self.q["Ql"] = Ql
+    def _terms_key(self, parameters: dict) -> tuple:
+        """Return the parameter values that determine the reusable terms."""
+        return tuple(parameters[k] for k in ("Re", "Qe", "Pef", "Pei", "Rh", "Fh", "Ph"))
 
-        self.par_second["R0"] = par["Rinf"] + par["Rh"] + par["Rm"] + par["Rl"]
-        self.par_second["pRh"] = par["Rinf"] * (par["Rinf"] + par["Rh"]) / par["Rh"]
-        self.par_second["pQh"] = Qh * (par["Rh"] / (par["Rinf"] + par["Rh"])) ** 2
-        self.par_second["pRm"] = (par["Rinf"] + par["Rh"]) * (par["Rinf"] + par["Rh"] + par["Rm"]) / par["Rm"]
-        self.par_second["pQm"] = Qm * (par["Rm"] / (par["Rinf"] + par["Rh"] + par["Rm"])) ** 2
-        self.par_second["pRl"] = (par["Rinf"] + par["Rh"] + par["Rm"]) * (par["Rinf"] + par["Rh"] + par["Rm"] + par["Rl"]) / par["Rl"]
-        self.par_second["pQl"] = Ql * (par["Rl"] / (par["Rinf"] + par["Rh"] + par["Rm"] + par["Rl"])) ** 2
-        
-        self.par_other_sec["Ch"]= 1/(2*np.pi*par["Fh"]*par["Rh"] )
-        #self.par_other_sec["pCh"]=1/(2*np.pi*par["Fh"]*self.par_second["pRh"] )
-        self.par_other_sec["pCh"]= self.par_other_sec["Ch"]*(par["Rh"]/(par["Rinf"] + par["Rh"]))**2
-        self.par_other_sec["Cm"]= 1/(2*np.pi*par["Fm"]*par["Rm"] )
-        #self.par_other_sec["pCm"]=1/(2*np.pi*par["Fm"]*self.par_second["pRm"] )
-        self.par_other_sec["pCm"]= self.par_other_sec["Cm"]*(par["Rm"]/(par["Rinf"] + par["Rh"] + par["Rm"]))**2
-        self.par_other_sec["Cl"]=1/(2*np.pi*par["Fl"]*par["Rl"] )
-        #self.par_other_sec["pCl"] =1/(2*np.pi*par["Fl"]*self.par_second["pRl"] )
-        self.par_other_sec["pCl"] = self.par_other_sec["Cl"]*(par["Rl"]/(par["Rinf"] + par["Rh"] + par["Rm"] + par["Rl"]))**2
+    def _cached_terms(self, parameters: dict, freq_array: np.ndarray) -> dict:
+        """
+        Return a copy of the terms of the last run_model call if they belong
+        to the same parameters and frequency array, else an empty dict.
+        """
+        last_terms = self._last_terms   # read once: run_model replaces the tuple as a whole
+        if last_terms is None:
+            return {}
+        key, cached_freq, terms = last_terms
+        if cached_freq is not freq_array or key != self._terms_key(parameters):
+            return {}
+        return dict(terms)
+
+    @classmethod
+    def rock_keys(cls) -> tuple:
+        """
+        Return the PARAMETER_KEYS the rock impedance (evaluate_rock) depends
+        on, in their order; the sign of Rinf matters too when it is one.
+        """
+        if "_rock_keys" not in cls.__dict__:
+            needed = set()
+            for symbol in cls.ROCK.symbols():
+                needed.update(cls.SECONDARY_DEPENDENCIES.get(symbol, (symbol,)))
+            cls._rock_keys = tuple(key for key in cls.PARAMETER_KEYS if key in needed)
+        return cls._rock_keys
+
+    @classmethod
+    def _compiled(cls):
+        """
+        Return the compiled (circuit, rock) kernels of the class, compiling
+        them once. They read their values by position in CIRCUIT_SYMBOLS.
+        """
+        if "_compiled_kernels" not in cls.__dict__:
+            cls._compiled_kernels = (compile_circuit(cls.CIRCUIT, cls.CIRCUIT_SYMBOLS),
+                                     compile_circuit(cls.ROCK, cls.CIRCUIT_SYMBOLS))
+            cls._exponent_indices = np.array(
+                [cls.CIRCUIT_SYMBOLS.index(p) for p in cls._compiled_kernels[0].exponents], dtype=int)
+        return cls._compiled_kernels
+
+    def _circuit_values(self, par: dict, q: dict, par_second: dict) -> list:
+        """Return the values read by the compiled circuits, in the order of CIRCUIT_SYMBOLS."""
+        return ([par[k] for k in self.PARAMETER_KEYS]
+                + [q[k] if k in q else par_second[k] for k in self.SECONDARY_KEYS])
+
+    def _exponents(self, par: dict) -> tuple:
+        """Return the frequency exponents of every CPE of the circuit."""
+        return tuple(par[p] for p in self._compiled()[0].exponents)
+
+    def _impedance(self, par, q, par_second, basis, terms=None):
+        """
+        Return (circuit impedance, rock impedance) for a validated frequency
+        basis. When a terms dict is given, store in it the electrode
+        arc ("zarce") and, if the circuit has one, the series high-frequency
+        arc ("zarch").
+        """
+        z, named = self._compiled()[0](self._circuit_values(par, q, par_second), basis)
+        if terms is not None:
+            terms.update({k: named[k] for k in ("zarce", "zarch") if k in named})
+        return z, named["rock"]
+
+    def _rock_impedance(self, par, q, par_second, basis):
+        """Return the rock impedance for a validated frequency basis."""
+        z_rock, _ = self._compiled()[1](self._circuit_values(par, q, par_second), basis)
+        return z_rock
+
+    def _circuit_jacobian(self, par, q, par_second, basis, jacobian):
+        """
+        Fill the columns of the Jacobian that belong to the circuit arcs
+        (every parameter except Linf and the electrode). Subclasses implement it.
+        """
+        raise NotImplementedError(f"{self.name} has no closed-form Jacobian.")
+
+    # ---------- Closed-form derivatives ----------
+    def _index(self, key: str) -> int:
+        """Return the column of a parameter in PARAMETER_KEYS."""
+        return self.PARAMETER_KEYS.index(key)
+
+    def _unit(self, key: str) -> np.ndarray:
+        """Return the differential of a parameter as a vector over PARAMETER_KEYS."""
+        unit = np.zeros(len(self.PARAMETER_KEYS))
+        unit[self._index(key)] = 1.0
+        return unit
+
+    def _electrode_inductor_jacobian(self, par, basis, jacobian):
+        """
+        Fill the Linf, Re, Qe, Pef and Pei columns. Both circuits add the
+        inductor and the electrode ZARC, Re / (1 + v), in series.
+        """
+        v = par["Re"] * par["Qe"] * (1j) ** par["Pei"] * basis.omega_power(par["Pef"])
+        dz_dv = -par["Re"] / (1.0 + v) ** 2
+
+        jacobian[:, self._index("Linf")] = 1j * basis.omega
+        jacobian[:, self._index("Re")] = 1.0 / (1.0 + v) ** 2
+        jacobian[:, self._index("Qe")] = dz_dv * v / par["Qe"]
+        jacobian[:, self._index("Pef")] = dz_dv * v * basis.log_omega
+        jacobian[:, self._index("Pei")] = dz_dv * v * (0.5j * np.pi)
+
+    @staticmethod
+    def _parallel_jacobian(z_parallel, branches):
+        """
+        Return the derivatives of 1 / sum(1 / z_i) given (z_i, dz_i) pairs:
+        dz = z**2 * sum(dz_i / z_i**2).
+        """
+        total = sum(dz_i / (z_i ** 2)[..., np.newaxis] for z_i, dz_i in branches)
+        return (z_parallel ** 2)[..., np.newaxis] * total
              
     def _inductor(self, freq, linf):
         """
@@ -123,9 +496,9 @@ class ModelCircuitParent(object):
         """
         Return the Q of a CPE given the f0.
         """
-        if r == 0:
+        if np.any(r == 0):
             raise ValueError("Resistance r cannot be zero.")
-        if f0 <= 0:
+        if np.any(f0 <= 0):
             raise ValueError("Resonant frequency f0 must be positive.")
         result = 1.0 / (r * ((2.0 * np.pi * f0) ** p))
         
@@ -173,112 +546,178 @@ class ModelCircuitParent(object):
         result = 1.0 / denominator
         return result
 
+    # ---------- Whole-array helpers ----------
+    def _frequency_basis(self, freq_array, exponents):
+        """
+        Validate a frequency array once per model call and return its
+        FrequencyBasis: freq_array itself when it already is one (see
+        ExperimentWorkspace.basis and TimeDomainPlan.basis), else a new one.
+        Replaces the per-point checks done by _cpe.
+        """
+        basis = freq_array if isinstance(freq_array, FrequencyBasis) else FrequencyBasis(freq_array)
+        if basis.has_negative:
+            raise ValueError("Frequency must be non-negative for CPE model.")
+        if basis.has_zero:
+            exponents = np.asarray(exponents, dtype=float)
+            if np.any(exponents > 0):
+                raise ValueError("freq=0 and pf>0 results in division by zero in CPE.")
+            if np.any(exponents < 0):
+                raise ValueError("freq=0 and pf<0 is undefined (0 to a negative power).")
+        return basis
+
+    def _cpe_arrays(self, basis, q, pf, pi):
+        """
+        Return the impedance of a CPE for every frequency of the basis.
+        """
+        if np.any(q == 0):
+            raise ValueError("Parameter q cannot be zero.")
+        return (1j) ** -pi / q * basis.omega_power(-pf)
+
+
 
 class ModelCircuitSeries(ModelCircuitParent):
     """
     Circuit model where elements are in series.
     """
-    
-    def __init__(self, negative_rinf=False, q=None, par_second=None, par_other_sec=None):
-        super().__init__(negative_rinf, q, par_second, par_other_sec)
-        self.name = "Series Circuit"
-
-    def run_rock(self, parameters: dict, freq_array: np.ndarray, old_par_second=False):
-        par = parameters.copy()
-
-        if self.negative_rinf:
-            par['Rinf'] = -par['Rinf']
-        if not old_par_second:
-            self._calculate_secondary_parameters(par)
-
-        z = []
-
-        for freq in freq_array:
-            z_cpem = self._cpe(freq, self.q["Qm"], par["Pm"], par["Pm"])
-            zarcm = self._parallel(z_cpem, par["Rm"])
-            z_cpel = self._cpe(freq, self.q["Ql"], par["Pl"], par["Pl"])
-            zarcl = self._parallel(z_cpel, par["Rl"])
-
-            z_total = zarcm + zarcl
-            z.append(z_total)
-
-        return np.array(z)
-
-    def run_model(self, parameters: dict, freq_array: np.ndarray, old_par_second=False):
-        
-        par = parameters.copy()
-        if self.negative_rinf:
-            par['Rinf'] = -par['Rinf']
-        if not old_par_second:
-            self._calculate_secondary_parameters(par)
-            
-        z_rock = self.run_rock(par, freq_array, old_par_second=True)
+    name = "Series Circuit"
+    KERNEL = CircuitKernels.SERIES
+
+    ROCK = Series(
+        Parallel(CPE("Qm", "Pm"), R("Rm")),
+        Parallel(CPE("Ql", "Pl"), R("Rl")),
+        name="rock",
+    )
+    CIRCUIT = Series(
+        L("Linf"),
+        R("Rinf"),
+        Parallel(CPE("Qh", "Ph"), R("Rh"), name="zarch"),
+        ROCK,
+        Parallel(CPE("Qe", "Pef", "Pei"), R("Re"), name="zarce"),
+    )
+
+    def _circuit_jacobian(self, par, q, par_second, basis, jacobian):
+        """
+        Each arc is R / (1 + u) with u = (j*omega / (2*pi*F)) ** P.
+        """
+        jacobian[:, self._index("Rinf")] = 1.0
 
-        zinf = [self._inductor(freq, par["Linf"]) + par["Rinf"] for freq in freq_array]
-        z_cpeh =[ self._cpe(freq, self.q["Qh"], par["Ph"], par["Ph"]) for freq in freq_array]
-        zarch = [self._parallel(z_cpeh[i], par["Rh"]) for i in range(len(freq_array))]
-        
-        z_cpee = [self._cpe(freq, par["Qe"], par["Pef"], par["Pei"]) for freq in freq_array]
-        zarce = [self._parallel(z_cpee[i], par["Re"]) for i in range(len(freq_array))]
+        for arc in ("h", "m", "l"):
+            r, f, p = par["R" + arc], par["F" + arc], par["P" + arc]
+            log_ratio = basis.log_s - np.log(2.0 * np.pi * f)
+            u = (1j) ** p * basis.omega_power(p) / (2.0 * np.pi * f) ** p
+            dz_du = -r / (1.0 + u) ** 2
 
-        return np.array([zinf[i] + zarch[i] + z_rock[i] + zarce[i] for i in range(len(freq_array))]), np.array(z_rock)
+            jacobian[:, self._index("R" + arc)] = 1.0 / (1.0 + u)
+            jacobian[:, self._index("F" + arc)] = dz_du * u * (-p / f)
+            jacobian[:, self._index("P" + arc)] = dz_du * u * log_ratio
     
 
 class ModelCircuitParallel(ModelCircuitParent):
     """
     Circuit model where elements are in parallel.
     """
-    def __init__(self, negative_rinf=False, q=None, par_second=None, par_other_sec=None):
-        super().__init__(negative_rinf, q, par_second, par_other_sec)
-        self.name = "Parallel Circuit"
-
-    def run_rock(self, parameters: dict, freq_array: np.ndarray, old_par_second=False):
-        
-        par = parameters.copy()
-        
-        if self.negative_rinf:
-            par['Rinf'] = -par['Rinf']
-        if not old_par_second:
-            self._calculate_secondary_parameters(par)
-
-        par2 = self.par_second
-
-        z = []
-
-        for f in freq_array:
-            z_line_m = par2["pRm"] + self._cpe(f, par2["pQm"], par["Pm"], par["Pm"])
-            z_line_l = par2["pRl"] + self._cpe(f, par2["pQl"], par["Pl"], par["Pl"])
-
-            z_lines = self._parallel(z_line_m, z_line_l)
-            z_rock = self._parallel(z_lines, par2["R0"])
-            #zparallel = self._parallel(z_line_h, z_rock)
-
-            z.append(z_rock)
+    name = "Parallel Circuit"
+    KERNEL = CircuitKernels.PARALLEL
+
+    ROCK = Parallel(
+        Parallel(
+            Series(R("pRm"), CPE("pQm", "Pm")),
+            Series(R("pRl"), CPE("pQl", "Pl")),
+        ),
+        R("R0"),
+        name="rock",
+    )
+    CIRCUIT = Series(
+        L("Linf"),
+        Parallel(Series(R("pRh"), CPE("pQh", "Ph")), ROCK),
+        Parallel(CPE("Qe", "Pef", "Pei"), R("Re"), name="zarce"),
+    )
+
+    def _circuit_jacobian(self, par, q, par_second, basis, jacobian):
+        """
+        Chain rule through the secondary variables. Differentials of scalars
+        are vectors over PARAMETER_KEYS, those of arrays are (F x P) matrices.
+        """
+        par2 = par_second
+        log_jomega = basis.log_s
+
+        # Partial sums of resistances: S1 = Rinf+Rh, S2 = S1+Rm, S3 = S2+Rl = R0.
+        s1 = par["Rinf"] + par["Rh"]
+        s2 = s1 + par["Rm"]
+        s3 = s2 + par["Rl"]
+        d_s1 = self._unit("Rinf") + self._unit("Rh")
+        d_s2 = d_s1 + self._unit("Rm")
+        d_s3 = d_s2 + self._unit("Rl")
+
+        d_pr = {
+            "h": ((s1 * self._unit("Rinf") + par["Rinf"] * d_s1) - par2["pRh"] * self._unit("Rh")) / par["Rh"],
+            "m": ((s2 * d_s1 + s1 * d_s2) - par2["pRm"] * self._unit("Rm")) / par["Rm"],
+            "l": ((s3 * d_s2 + s2 * d_s3) - par2["pRl"] * self._unit("Rl")) / par["Rl"],
+        }
+        sums = {"h": (s1, d_s1), "m": (s2, d_s2), "l": (s3, d_s3)}
+
+        lines = {}
+        for arc in ("h", "m", "l"):
+            r, f, p = par["R" + arc], par["F" + arc], par["P" + arc]
+            s_arc, d_s_arc = sums[arc]
+            # d ln(pQ) = d ln(Q) + 2 d ln(R) - 2 d ln(S), with Q = 1 / (R (2 pi F)^P)
+            d_log_pq = (self._unit("R" + arc) / r - p * self._unit("F" + arc) / f
+                        - np.log(2.0 * np.pi * f) * self._unit("P" + arc) - 2.0 * d_s_arc / s_arc)
+
+            cpe = (1j) ** -p / par2["pQ" + arc] * basis.omega_power(-p)
+            d_cpe = -cpe[:, np.newaxis] * (d_log_pq[np.newaxis, :]
+                                           + log_jomega[:, np.newaxis] * self._unit("P" + arc)[np.newaxis, :])
+            lines[arc] = (par2["pR" + arc] + cpe, d_pr[arc][np.newaxis, :] + d_cpe)
+
+        r0 = (np.full(basis.shape, par2["R0"], dtype=complex), np.broadcast_to(d_s3, (basis.size, d_s3.size)))
+        z_rock = self._rock_impedance(par, q, par_second, basis)
+        d_rock = self._parallel_jacobian(z_rock, (lines["m"], lines["l"], r0))
+
+        z_rock_line_h = self._parallel_arrays(lines["h"][0], z_rock)
+        d_rock_line_h = self._parallel_jacobian(z_rock_line_h, (lines["h"], (z_rock, d_rock)))
+
+        circuit_columns = [self._index(k) for k in self.PARAMETER_KEYS
+                           if k not in ("Linf", "Re", "Qe", "Pef", "Pei")]
+        jacobian[:, circuit_columns] = d_rock_line_h[:, circuit_columns]
 
-        return np.array(z)
 
-    def run_model(self, parameters: dict, freq_array: np.ndarray, old_par_second=False):
-        
-        par = parameters.copy()
-        par2 = self.par_second
-        
-        if self.negative_rinf:
-            par['Rinf'] = -par['Rinf']
-        if not old_par_second:
-            self._calculate_secondary_parameters(par)
+###############################################################################
+# Registry
+###############################################################################
+class ModelCircuitRegistry:
+    """
+    Registry of the available circuit models, by name.
+    """
+    def __init__(self):
         
-        z_rock = self.run_rock(par, freq_array, old_par_second=True)
-        z_line_h = np.array([par2["pRh"] + self._cpe(f, par2["pQh"], par["Ph"], par["Ph"]) for f in freq_array])
-        z_rock_line_h = self._parallel_arrays(z_line_h, z_rock)
-
-        zinf = [self._inductor(f, par["Linf"]) for f in freq_array]
-        z_cpee = [self._cpe(f, par["Qe"], par["Pef"], par["Pei"]) for f in freq_array]
-        zarce = [self._parallel(z_cpee[i], par["Re"]) for i in range(len(freq_array))]
+        self._registry = {
+            ModelCircuitParallel.name: ModelCircuitParallel,
+            ModelCircuitSeries.name: ModelCircuitSeries,
+        }
+
+    def register(self, model_cls) -> None:
+        """Add a ModelCircuitParent subclass described with CircuitBuilder elements."""
+        if not model_cls.name:
+            raise ValueError("ModelCircuitRegistry.register: the model needs a name.")
+        model_cls._compiled()  # Fail now if the description is invalid.
+        self._registry[model_cls.name] = model_cls
+
+    def get_model_circuit(self, model_name, **kwargs):
         
-        z_circuit= np.array([zinf[i] + z_rock_line_h[i] + zarce[i] for i in range(len(freq_array))])
+        model_cls = self._registry.get(model_name)
+        if model_cls is None:
+            raise ValueError(f"Unknown circuit model: {model_name}")
+        return model_cls(**kwargs)
 
+    def get_default_model_circuit(self, **kwargs):
+        default_key = list(self._registry.keys())[0]
+        return self.get_model_circuit(default_key, **kwargs)
 
-        return z_circuit, np.array(z_rock)
+    def get_available_model_circuits(self):
+        """
+        Returns a list of all registered circuit model names.
+        """
+        return list(self._registry.keys())
 
 
 ###############################################################################
@@ -355,6 +794,83 @@ def manual_test_circuit_models():
     except Exception as e:
         print("Error in ModelCircuitSeries.estimate_rock:", e)
 
+    print("\n---- Testing run_model_batch (Parallel Model) ----")
+    try:
+        # Three parameter sets: the sample one and two with a different Rh.
+        keys = ModelCircuitParent.PARAMETER_KEYS
+        parameter_sets = np.array([[parameters[k] for k in keys] for _ in range(3)])
+        parameter_sets[1, keys.index("Rh")] = 200.0
+        parameter_sets[2, keys.index("Rh")] = 2000.0
+
+        z_batch, z_rock_batch = parallel_model.run_model_batch(parameter_sets, freq_array)
+        print("Batch impedance shape:", z_batch.shape)
+        print("First row matches run_model:", np.allclose(z_batch[0], z_total_parallel))
+    except Exception as e:
+        print("Error in ModelCircuitParallel.run_model_batch:", e)
+
+    print("\n---- Testing a circuit described with CircuitBuilder ----")
+    try:
+        # Series circuit without the mid-frequency arc.
+        class ModelCircuitTwoArcs(ModelCircuitParent):
+            name = "Two Arcs Circuit"
+            ROCK = Parallel(CPE("Ql", "Pl"), R("Rl"), name="rock")
+            CIRCUIT = Series(
+                L("Linf"),
+                R("Rinf"),
+                Parallel(CPE("Qh", "Ph"), R("Rh"), name="zarch"),
+                ROCK,
+                Parallel(CPE("Qe", "Pef", "Pei"), R("Re"), name="zarce"),
+            )
+
+        registry = ModelCircuitRegistry()
+        registry.register(ModelCircuitTwoArcs)
+        print("Available models:", registry.get_available_model_circuits())
+
+        two_arcs = registry.get_model_circuit("Two Arcs Circuit")
+        z_two_arcs, _ = two_arcs.run_model(parameters, freq_array)
+        print("Series model minus two-arc model equals the mid-frequency arc:",
+              np.allclose(z_total_series - z_two_arcs,
+                          1.0 / (1.0 / parameters["Rm"] + series_model.q["Qm"] * (2j * np.pi * freq_array) ** parameters["Pm"])))
+    except Exception as e:
+        print("Error in ModelCircuitRegistry:", e)
+
+    print("\n---- Testing evaluate from several threads (Parallel Model) ----")
+    try:
+        from concurrent.futures import ThreadPoolExecutor
+
+        shared_model = ModelCircuitParallel()
+        rh_values = np.logspace(1, 5, 16)
+        expected = [shared_model.evaluate({**parameters, "Rh": rh}, freq_array).z for rh in rh_values]
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            results = list(pool.map(lambda rh: shared_model.evaluate({**parameters, "Rh": rh}, freq_array).z, rh_values))
+
+        print("Threaded results match:", all(np.array_equal(a, b) for a, b in zip(expected, results)))
+        print("Model attributes untouched:", shared_model.q == {} and shared_model.par_second == {})
+    except Exception as e:
+        print("Error in ModelCircuitParallel.evaluate:", e)
+
+    print("\n---- Testing invalid parameters with both backends ----")
+    # run_model_batch and the fit residuals must raise the same ValueError
+    # with numba as with NumPy.
+    backend = CircuitKernels.get_backend()
+    invalid_cases = ({"Linf": 0.0}, {"Fh": np.inf}, {"Rm": 0.0}, {"Fl": -1.0})
+    try:
+        for model_cls in (ModelCircuitSeries, ModelCircuitParallel):
+            for invalid in invalid_cases:
+                parameter_set = [[{**parameters, **invalid}[k] for k in ModelCircuitParent.PARAMETER_KEYS]]
+                errors = []
+                for name in ("numpy", "numba") if CircuitKernels.available() else ("numpy",):
+                    CircuitKernels.set_backend(name)
+                    try:
+                        model_cls().run_model_batch(np.array(parameter_set), freq_array)
+                        errors.append(None)
+                    except ValueError as e:
+                        errors.append(str(e))
+                print(f"{model_cls.name} {invalid}: {errors[0]}")
+                assert errors[0] is not None and len(set(errors)) == 1, f"the backends disagree: {errors}"
+    finally:
+        CircuitKernels.set_backend(backend)
+
 
 if __name__ == '__main__':
     manual_test_circuit_models()
\ No newline at end of file
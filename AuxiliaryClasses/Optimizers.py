@@ -0,0 +1,291 @@
+# -*- coding: utf-8 -*-
+"""
+Optimizer backends of the least-squares fits.
+
+Every backend solves the same problem for FitBuilder: residuals and
+(optionally) Jacobian of the scaled free parameters, with their scaled
+bounds, and returns the scipy OptimizeResult (x, cost, nfev, njev, status,
+message), with the name of the method that produced it in result.optimizer.
+
+  - "trf": trust-region reflective, the historical method of ZarcFit.
+  - "dogbox": rectangular trust regions, suited to few bounded variables.
+    Experimental: it is left out of get_available_optimizers().
+  - "lm": MINPACK Levenberg-Marquardt, which ignores the bounds. It runs
+    while no bound is active: when a step leaves the bounds, the fit is
+    finished with trf from the best point found inside them.
+  - "quick": trf with QUICK_LOOSENING times looser tolerances and at most
+    QUICK_MAX_NFEV evaluations, for a first look at a file.
+  - "auto": lm when no free parameter has a finite bound (so it cannot
+    leave them), else trf.
+
+The tolerance (ftol, xtol and gtol) of every backend follows
+OptimizerRegistry.set_tolerance, i.e. [Fit] tolerance of config.ini.
+
+BroydenTracker is not in the registry: FitBuilder.fit_model_tracking uses it
+to re-solve a fit after a small change of its frequency range, starting from
+the Jacobian of the previous fit.
+
+On the sample spectra (Benchmarks.benchmark_optimizers), the first lm step
+leaves the bounds on all 14 fits, both from the default sliders and from the
+previous solution on a slightly shorter range, even when that solution is
+inside its bounds. Neither where the fit starts nor where the previous fit
+ended tells when lm would stay inside, so auto only uses lm when there is no
+finite bound; with the bounds of config.ini that is always trf. dogbox is
+slower than trf and often stops at a worse cost.
+"""
+import numpy as np
+import scipy.optimize as opt
+
+MAX_NFEV = 2000
+DEFAULT_TOLERANCE = 1e-8
+# The quick profile: its tolerance is QUICK_LOOSENING times the configured one.
+QUICK_LOOSENING = 1e3
+QUICK_MAX_NFEV = 300
+
+
+class LeastSquaresOptimizer(object):
+    """
+    One method of scipy.optimize.least_squares with its tolerances
+    (ftol, xtol and gtol) and evaluation budget.
+    """
+    def __init__(self, name: str, method: str, tolerance: float = DEFAULT_TOLERANCE, max_nfev: int = MAX_NFEV):
+        self.name = name
+        self.method = method
+        self.tolerance = tolerance
+        self.max_nfev = max_nfev
+
+    def solve(self, fun, x0: np.ndarray, jac, lower: np.ndarray, upper: np.ndarray):
+        """Minimize 0.5 * |fun(x)|^2 from x0 within [lower, upper]; jac may be '2-point'."""
+        result = opt.least_squares(fun, x0=x0, jac=jac, bounds=(lower, upper), method=self.method,
+                                   ftol=self.tolerance, xtol=self.tolerance, gtol=self.tolerance,
+                                   max_nfev=self.max_nfev)
+        result.optimizer = self.name
+        return result
+
+
+class _BoundReached(Exception):
+    """Raised inside the Levenberg-Marquardt iterations when a step leaves the bounds."""
+
+
+class LevenbergMarquardtOptimizer(object):
+    """
+    Unbounded Levenberg-Marquardt while no bound is active, then fallback
+    from the best point inside the bounds. Both use the tolerance of the
+    fallback.
+    """
+    name = "lm"
+
+    def __init__(self, fallback: LeastSquaresOptimizer, max_nfev: int = MAX_NFEV):
+        self.fallback = fallback
+        self.max_nfev = max_nfev
+
+    def solve(self, fun, x0: np.ndarray, jac, lower: np.ndarray, upper: np.ndarray):
+        best = {"x": x0, "cost": np.inf}
+        counts = {"nfev": 0, "njev": 0}
+
+        def _check_bounds(x):
+            if np.any(x < lower) or np.any(x > upper):
+                raise _BoundReached
+
+        def _bounded_fun(x):
+            _check_bounds(x)
+            counts["nfev"] += 1
+            residual = fun(x)
+            cost = 0.5 * float(residual @ residual)
+            if cost < best["cost"]:
+                best["x"], best["cost"] = x.copy(), cost
+            return residual
+
+        def _bounded_jac(x):
+            _check_bounds(x)
+            counts["njev"] += 1
+            return jac(x)
+
+        try:
+            tolerance = self.fallback.tolerance
+            result = opt.least_squares(_bounded_fun, x0=x0, jac=_bounded_jac if callable(jac) else jac,
+                                       method="lm", ftol=tolerance, xtol=tolerance, gtol=tolerance,
+                                       max_nfev=self.max_nfev)
+            result.optimizer = self.name
+            return result
+        except _BoundReached:
+            pass
+
+        finish = self.fallback.solve(fun, best["x"], jac, lower, upper)
+        finish.nfev += counts["nfev"]
+        finish.njev = (finish.njev or 0) + counts["njev"]
+        finish.optimizer = f"{self.name}+{self.fallback.name}"
+        return finish
+
+
+class AutoOptimizer(object):
+    """
+    Chooses the unbounded backend (lm) when no free parameter has a finite
+    bound, else the bounded one (trf). A start inside the bounds does not
+    predict that lm stays inside them (see the module docstring), and every
+    lm fit that leaves them costs what trf costs and more.
+    """
+    name = "auto"
+
+    def __init__(self, bounded, unbounded):
+        self.bounded, self.unbounded = bounded, unbounded
+
+    def choose(self, x0: np.ndarray, lower: np.ndarray, upper: np.ndarray):
+        """Return the backend used from x0 within [lower, upper]."""
+        bounded = np.any(np.isfinite(lower)) or np.any(np.isfinite(upper))
+        return self.bounded if bounded else self.unbounded
+
+    def solve(self, fun, x0: np.ndarray, jac, lower: np.ndarray, upper: np.ndarray):
+        return self.choose(x0, lower, upper).solve(fun, x0, jac, lower, upper)
+
+
+class BroydenTracker(object):
+    """
+    A few Levenberg-Marquardt steps from a good starting point and Jacobian.
+    jac may be the Jacobian matrix at (or near) x0, e.g. the one of the
+    previous fit; a callable is evaluated once at x0, and '2-point' estimated
+    by finite differences. Each step then costs one residual evaluation: the
+    Jacobian is kept up to date with Broyden rank-one updates. Steps are
+    clipped to the bounds. result.jac is the updated Jacobian.
+    """
+    name = "tracking"
+
+    def __init__(self, max_nfev: int = 8, tolerance: float = 1e-6):
+        self.max_nfev = max_nfev
+        self.tolerance = tolerance
+
+    def solve(self, fun, x0: np.ndarray, jac, lower: np.ndarray, upper: np.ndarray):
+        x = np.clip(x0, lower, upper)
+        residual = fun(x)
+        cost, nfev, njev = 0.5 * float(residual @ residual), 1, 0
+        if callable(jac):
+            jacobian, njev = np.array(jac(x), dtype=float), 1
+        elif isinstance(jac, str):
+            jacobian = np.atleast_2d(opt.approx_fprime(x, fun))
+            nfev += x.size
+        else:
+            jacobian = np.array(jac, dtype=float)
+
+        damping = 1e-3
+        status, message = 0, "The maximum number of function evaluations is exceeded."
+        while nfev < self.max_nfev:
+            normal = jacobian.T @ jacobian
+            scale = np.maximum(np.diag(normal), 1e-12)
+            try:
+                step = np.linalg.solve(normal + damping * np.diag(scale), -(jacobian.T @ residual))
+            except np.linalg.LinAlgError:
+                status, message = -1, "singular Jacobian"
+                break
+            x_new = np.clip(x + step, lower, upper)
+            step = x_new - x
+            if not np.any(step):
+                status, message = 2, "no step left within the bounds"
+                break
+            residual_new = fun(x_new)
+            nfev += 1
+            jacobian += np.outer(residual_new - residual - jacobian @ step, step) / (step @ step)
+            cost_new = 0.5 * float(residual_new @ residual_new)
+            if cost_new < cost:
+                converged = cost - cost_new <= self.tolerance * cost
+                x, residual, cost = x_new, residual_new, cost_new
+                damping = max(damping / 3, 1e-9)
+                if converged:
+                    status, message = 1, "cost change below the tolerance"
+                    break
+            else:
+                damping *= 4
+
+        return opt.OptimizeResult(x=x, cost=cost, fun=residual, jac=jacobian, nfev=nfev, njev=njev,
+                                  status=status, message=message, success=status > 0, optimizer=self.name)
+
+
+class OptimizerRegistry:
+    """
+    Registry of the optimizer backends, by name. The experimental ones can
+    be selected by name but are not offered (get_available_optimizers).
+    """
+    EXPERIMENTAL = ("dogbox",)
+
+    def __init__(self, tolerance: float = DEFAULT_TOLERANCE):
+        trf = LeastSquaresOptimizer("trf", "trf")
+        dogbox = LeastSquaresOptimizer("dogbox", "dogbox")
+        lm = LevenbergMarquardtOptimizer(fallback=trf)
+        self._registry = {
+            "trf": trf,
+            "dogbox": dogbox,
+            "lm": lm,
+            "quick": LeastSquaresOptimizer("quick", "trf", max_nfev=QUICK_MAX_NFEV),
+            "auto": AutoOptimizer(bounded=trf, unbounded=lm),
+        }
+        self.set_tolerance(tolerance)
+
+    def set_tolerance(self, tolerance: float) -> None:
+        """
+        Set ftol, xtol and gtol of the backends (lm uses that of trf); quick
+        uses QUICK_LOOSENING times tolerance.
+        """
+        if not 0 < tolerance < 1:
+            raise ValueError(f"OptimizerRegistry.set_tolerance: expected 0 < tolerance < 1 (got {tolerance}).")
+        self.tolerance = float(tolerance)
+        self._registry["trf"].tolerance = self._registry["dogbox"].tolerance = self.tolerance
+        self._registry["quick"].tolerance = min(QUICK_LOOSENING * self.tolerance, 0.1)
+
+    def register(self, optimizer) -> None:
+        """Add an object with a name and a solve(fun, x0, jac, lower, upper) method."""
+        if not getattr(optimizer, "name", ""):
+            raise ValueError("OptimizerRegistry.register: the optimizer needs a name.")
+        self._registry[optimizer.name] = optimizer
+
+    def get_optimizer(self, name: str):
+        optimizer = self._registry.get(name)
+        if optimizer is None:
+            raise ValueError(f"Unknown optimizer: {name}. Expected one of {self.get_available_optimizers(True)}.")
+        return optimizer
+
+    def get_default_optimizer(self):
+        return self._registry["trf"]
+
+    def get_available_optimizers(self, include_experimental: bool = False):
+        """
+        Returns a list of the registered optimizer names, without the
+        EXPERIMENTAL ones unless include_experimental.
+        """
+        return [name for name in self._registry if include_experimental or name not in self.EXPERIMENTAL]
+
+
+#------------------------------------------------------------------------------
+# Test
+#------------------------------------------------------------------------------
+def manual_test_optimizers():
+    """
+    Fit a bounded and an unbounded exponential decay with every backend.
+    Run with: python -m AuxiliaryClasses.Optimizers
+    """
+    t = np.linspace(0, 4, 30)
+    y = 2.0 * np.exp(-1.3 * t) + 0.1
+
+    def residual(x):
+        return x[0] * np.exp(-x[1] * t) + x[2] - y
+
+    registry = OptimizerRegistry()
+    x0 = np.array([1.0, 1.0, 0.0])
+    for label, lower, upper in (("unbounded", np.full(3, -np.inf), np.full(3, np.inf)),
+                                ("bounded", np.array([0.0, 0.0, -1.0]), np.array([5.0, 5.0, 1.0])),
+                                ("active bound", np.array([0.0, 0.0, 0.2]), np.array([5.0, 5.0, 1.0])),
+                                ("start on a bound", np.array([1.0, 0.0, -1.0]), np.array([5.0, 5.0, 1.0]))):
+        print(f"{label}:")
+        for name in registry.get_available_optimizers(include_experimental=True):
+            result = registry.get_optimizer(name).solve(residual, np.clip(x0, lower, upper), "2-point", lower, upper)
+            print(f"    {name:<7} -> {result.optimizer:<7} nfev {result.nfev:>4}, cost {result.cost:.3g}, "
+                  f"x {np.round(result.x, 4)}")
+
+    # The quick tolerance follows the configured one.
+    registry.set_tolerance(1e-6)
+    quick = registry.get_optimizer("quick")
+    print(f"tolerance 1e-6: trf {registry.get_optimizer('trf').tolerance:g}, quick {quick.tolerance:g}")
+    assert quick.tolerance == QUICK_LOOSENING * 1e-6
+    assert "dogbox" not in registry.get_available_optimizers()
+
+
+if __name__ == '__main__':
+    manual_test_optimizers()
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+Fixed mapping between the slider keys of config.ini and array indices.
+
+The fit works on flat parameter vectors in the order of the layout. Scaling
+to the optimizer space (log10 for resistances, frequencies, Q and L; x10 for
+the P exponents) and the selection of the free parameters are vector
+operations, so no dict is built per residual evaluation.
+"""
+import numpy as np
+
+
+class ParameterLayout(object):
+    """
+    Index of every parameter key, with the scaling and the free/locked masks.
+    Keys starting with 'P' are exponents, scaled by 10; the others are
+    positive values, scaled by log10.
+    """
+    def __init__(self, keys, disabled=()):
+        self.keys = tuple(keys)
+        self.index = {key: i for i, key in enumerate(self.keys)}
+        self.size = len(self.keys)
+
+        self.log_mask = np.array([not key.startswith('P') for key in self.keys])
+        self.free_mask = np.array([key not in disabled for key in self.keys])
+        self.free_indices = np.flatnonzero(self.free_mask)
+        self.free_keys = [self.keys[i] for i in self.free_indices]
+        self._free_log_mask = self.log_mask[self.free_indices]
+        self._free_log_indices = self.free_indices[self._free_log_mask]
+        self._free_linear_indices = self.free_indices[~self._free_log_mask]
+
+    def with_disabled(self, disabled) -> "ParameterLayout":
+        """Return a layout with the same keys and another set of locked parameters."""
+        return ParameterLayout(self.keys, disabled)
+
+    def indices(self, keys) -> np.ndarray:
+        """Return the indices of several keys."""
+        return np.array([self.index[key] for key in keys], dtype=int)
+
+    # ---------- dict <-> vector ----------
+    def to_array(self, params: dict) -> np.ndarray:
+        """Return the values of a parameter dict as a vector in the layout order."""
+        return np.array([params[key] for key in self.keys], dtype=float)
+
+    def to_dict(self, values: np.ndarray) -> dict:
+        """Return a parameter dict from a vector in the layout order."""
+        return {key: float(value) for key, value in zip(self.keys, values)}
+
+    # ---------- Scaling ----------
+    def scale(self, values: np.ndarray) -> np.ndarray:
+        """Convert a parameter vector into the scaled space of the optimizer."""
+        return self._scale(values, self.log_mask, self.keys)
+
+    def descale(self, x: np.ndarray) -> np.ndarray:
+        """Convert a scaled vector back to parameter values."""
+        values = np.empty(self.size)
+        values[self.log_mask] = 10.0 ** x[self.log_mask]
+        values[~self.log_mask] = x[~self.log_mask] / 10.0
+        return values
+
+    def scale_derivatives(self, values: np.ndarray) -> np.ndarray:
+        """Return d(value)/d(scaled value) for every parameter."""
+        return np.where(self.log_mask, values * np.log(10), 0.1)
+
+    # ---------- Free parameters ----------
+    def scale_free(self, values: np.ndarray) -> np.ndarray:
+        """Return the scaled vector of the free parameters."""
+        return self._scale(values[self.free_indices], self._free_log_mask, self.free_keys)
+
+    def compose(self, x_free: np.ndarray, values: np.ndarray) -> np.ndarray:
+        """
+        Return a full parameter vector: the locked entries of values and the
+        descaled free entries of x_free.
+        """
+        full = values.copy()
+        full[self._free_log_indices] = 10.0 ** x_free[self._free_log_mask]
+        full[self._free_linear_indices] = x_free[~self._free_log_mask] / 10.0
+        return full
+
+    def free_scale_derivatives(self, values: np.ndarray) -> np.ndarray:
+        """Return d(value)/d(scaled value) for the free parameters."""
+        return np.where(self._free_log_mask, values[self.free_indices] * np.log(10), 0.1)
+
+    @staticmethod
+    def _scale(values, log_mask, keys) -> np.ndarray:
+        values = np.asarray(values, dtype=float)
+        invalid = log_mask & (values <= 0)
+        if np.any(invalid):
+            key = keys[int(np.flatnonzero(invalid)[0])]
+            raise ValueError(f"Parameter {key} must be > 0; got {values[invalid][0]}.")
+        positive = np.where(log_mask, values, 1.0)
+        return np.where(log_mask, np.log10(positive), values * 10.0)
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+Cancellation of the jobs that run on a process pool: multi-start fits,
+bootstrap and frequency-range sweep.
+
+A JobMonitor is the FitMonitor of these jobs: cancel() may be called from any
+thread, and the job stops waiting for its pool at once. With keep_best (Esc)
+the job returns what it has completed so far; without it (Ctrl+Z, a new
+file) it raises JobInterrupted and returns nothing. Tasks already running in
+a worker process cannot be interrupted: they finish in the background and
+their result is ignored; the tasks not started yet are cancelled.
+"""
+import threading
+from concurrent.futures import FIRST_COMPLETED, wait
+
+# Seconds between two checks of the monitor while waiting for the pool.
+POLL_INTERVAL = 0.1
+
+
+class JobInterrupted(Exception):
+    """Raised by a job cancelled with keep_best=False."""
+
+
+class JobMonitor(object):
+    """Cancellation flag of one pool job."""
+    def __init__(self):
+        self.keep_best = True
+        self._cancelled = threading.Event()
+
+    def cancel(self, keep_best: bool = True) -> None:
+        """Stop the job; it returns its completed part, or nothing if keep_best is False."""
+        self.keep_best = keep_best
+        self._cancelled.set()
+
+    def is_cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def check(self) -> bool:
+        """
+        Return True if the job must stop and return what it has, raise
+        JobInterrupted if it must stop and return nothing, else False.
+        """
+        if not self._cancelled.is_set():
+            return False
+        if not self.keep_best:
+            raise JobInterrupted("cancelled")
+        return True
+
+
+def iter_completed(futures, monitor: JobMonitor = None, interval: float = POLL_INTERVAL):
+    """
+    Yield the futures as they complete, like concurrent.futures.as_completed,
+    checking monitor every interval seconds. When it is cancelled, the
+    futures not completed yet are cancelled and the iteration stops (or
+    JobInterrupted is raised, see JobMonitor.check).
+    """
+    pending = set(futures)
+    try:
+        while pending:
+            if monitor is not None and monitor.check():
+                break
+            done, pending = wait(pending, timeout=None if monitor is None else interval,
+                                 return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+#------------------------------------------------------------------------------
+# Test
+#------------------------------------------------------------------------------
+def manual_test_pool_jobs():
+    """
+    Cancel a pool of slow tasks after the first results, keeping them, then
+    cancel another one without keeping anything.
+    Run with: python -m AuxiliaryClasses.PoolJobs
+    """
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+
+    for keep_best in (True, False):
+        monitor = JobMonitor()
+        with ThreadPoolExecutor(2) as executor:
+            futures = [executor.submit(time.sleep, 0.2) for _ in range(10)]
+            threading.Timer(0.3, monitor.cancel, kwargs={"keep_best": keep_best}).start()
+            start, completed = time.perf_counter(), 0
+            try:
+                for _ in iter_completed(futures, monitor):
+                    completed += 1
+                outcome = f"{completed} of {len(futures)} tasks kept"
+            except JobInterrupted:
+                outcome = "JobInterrupted raised"
+            print(f"keep_best={keep_best}: {outcome} after {time.perf_counter() - start:.2f} s, "
+                  f"{sum(future.cancelled() for future in futures)} cancelled before they started")
+
+
+if __name__ == '__main__':
+    manual_test_pool_jobs()
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""
+Stability of the fit against the frequency range.
+
+The sweep refits a file on a grid of sub-ranges [start, end] of its
+frequency list (the indices of the frequency slider, as PgUp/PgDown move
+them). Each row of the grid (one start index) is fitted in one worker
+process, from the widest range to the narrowest, every range warm-started
+from the fit of the previous one; the first range of a row starts from the
+current sliders. The rows run in parallel on a ProcessPoolExecutor.
+
+The mismatch of each range is divided by its number of points, so that
+ranges of different widths can be compared.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from .PoolJobs import JobMonitor, iter_completed
+
+
+def sweep_grid(n_points: int, steps: int, min_points: int) -> (np.ndarray, np.ndarray):
+    """
+    Return the start and end indices of the grid: at most steps of each,
+    evenly spread, so that the narrowest range keeps min_points points.
+    """
+    min_points = max(2, min(int(min_points), n_points))
+    starts = np.unique(np.linspace(0, n_points - min_points, steps).round().astype(int))
+    ends = np.unique(np.linspace(min_points - 1, n_points - 1, steps).round().astype(int))
+    return starts, ends
+
+
+@dataclass
+class RangeSweepResult:
+    """
+    Fits of the grid of sub-ranges. fits[i][j] is the fit of the range
+    starts[i]..ends[j] (None when it is too narrow or failed), and
+    mismatch[i, j] its mismatch per point (NaN then).
+    """
+    freq: np.ndarray
+    starts: np.ndarray
+    ends: np.ndarray
+    cost: str
+    fits: list = field(default_factory=list)
+    mismatch: np.ndarray = None
+
+    def parameter_keys(self) -> list:
+        """Return the keys of the fitted parameters."""
+        for row in self.fits:
+            for fit in row:
+                if fit is not None:
+                    return list(fit.keys())
+        return []
+
+    def parameter_map(self, key: str) -> np.ndarray:
+        """Return the values of one parameter on the grid, NaN where there is no fit."""
+        return np.array([[np.nan if fit is None else fit.get(key, np.nan) for fit in row]
+                         for row in self.fits], dtype=float)
+
+    def most_stable(self, key: str) -> tuple:
+        """
+        Return the (i, j) cell where key changes the least with the range:
+        the largest difference of log10|key| with its fitted neighbours
+        is the smallest, ties broken by the mismatch. None if nothing fits.
+        """
+        values = np.log10(np.abs(self.parameter_map(key)) + 1e-300)
+        values[~np.isfinite(self.mismatch)] = np.nan
+        padded = np.pad(values, 1, constant_values=np.nan)
+        neighbours = np.stack([padded[:-2, 1:-1], padded[2:, 1:-1], padded[1:-1, :-2], padded[1:-1, 2:]])
+        difference = np.abs(neighbours - values)
+        change = np.where(np.isfinite(difference), difference, -np.inf).max(axis=0)
+        candidates = np.isfinite(values) & np.isfinite(change)
+        if not np.any(candidates):
+            return None
+        order = np.lexsort((np.where(candidates, self.mismatch, np.inf).ravel(),
+                            np.where(candidates, change, np.inf).ravel()))
+        return tuple(int(index) for index in np.unravel_index(order[0], values.shape))
+
+
+def run_range_sweep(settings, experiment_data: dict, initial_params: dict, cost: str = "cole",
+                    steps: int = 8, min_points: int = 10, max_workers: int = None,
+                    progress=None, monitor: JobMonitor = None) -> RangeSweepResult:
+    """
+    Fit every sub-range of the grid of experiment_data (the whole file) with
+    the fit settings of Calculator.worker_settings, on max_workers processes
+    (all the cores by default, in this process when it is 1).
+    progress(done, total) is called as the rows complete. A cancelled
+    monitor stops the sweep: the rows not completed are left empty, or
+    JobInterrupted is raised (see PoolJobs.JobMonitor).
+    """
+    data = {key: np.asarray(experiment_data[key], dtype=float) for key in ("freq", "Z_real", "Z_imag")}
+    starts, ends = sweep_grid(data["freq"].size, steps, min_points)
+    result = RangeSweepResult(data["freq"], starts, ends, cost,
+                              fits=[[None] * ends.size for _ in starts],
+                              mismatch=np.full((starts.size, ends.size), np.nan))
+    tasks = [(data, int(start), [int(end) for end in ends], dict(initial_params), cost, min_points)
+             for start in starts]
+    done = [0]
+
+    def _collect(i, row):
+        for j, (fit, mismatch) in enumerate(row):
+            result.fits[i][j] = fit
+            result.mismatch[i, j] = mismatch
+        done[0] += 1
+        if progress is not None:
+            progress(done[0], len(tasks))
+
+    if max_workers == 1:
+        _init_sweep_worker(settings)
+        for i, task in enumerate(tasks):
+            if monitor is not None and monitor.check():
+                break
+            _collect(i, _sweep_row(*task))
+    else:
+        executor = ProcessPoolExecutor(max_workers, initializer=_init_sweep_worker, initargs=(settings,))
+        try:
+            futures = {executor.submit(_sweep_row, *task): i for i, task in enumerate(tasks)}
+            for future in iter_completed(futures, monitor):
+                try:
+                    row = future.result()
+                except Exception as e:
+                    print(f"RangeSweep: a row failed: {e}")
+                    row = [(None, np.nan)] * ends.size
+                _collect(futures[future], row)
+        finally:
+            # Once cancelled, the rows still running are not waited for.
+            executor.shutdown(wait=monitor is None or not monitor.is_cancelled(), cancel_futures=True)
+    return result
+
+
+###############################################################################
+# Workers
+###############################################################################
+# Each process builds its Calculator once, in the initializer.
+_worker_calculator = None
+
+
+def _init_sweep_worker(settings) -> None:
+    # Imported here: the Calculator imports this module.
+    from .Calculator import Calculator
+
+    global _worker_calculator
+    _worker_calculator = Calculator.from_settings(settings)
+
+
+def _sweep_row(experiment_data: dict, start: int, ends: list, initial_params: dict,
+               cost: str, min_points: int) -> list:
+    """
+    Fit the ranges start..end, widest first, each from the previous fit.
+    Returns (fit, mismatch per point) per end, (None, NaN) when not fitted.
+    """
+    calculator = _worker_calculator
+    fit_function = calculator.fit_model_bode if cost == "bode" else calculator.fit_model_cole
+    row = {}
+    params = initial_params
+    for end in sorted(ends, reverse=True):
+        n_points = end - start + 1
+        if n_points < min_points:
+            row[end] = (None, np.nan)
+            continue
+        calculator.initialize_expdata({key: values[start:end + 1] for key, values in experiment_data.items()})
+        try:
+            fit = fit_function(params)
+            row[end] = ({key: float(value) for key, value in fit.items()},
+                        calculator.fit_mismatch(fit) / n_points)
+            params = fit
+        except ValueError as e:
+            print(f"RangeSweep: range {start}..{end} failed: {e}")
+            row[end] = (None, np.nan)
+    return [row[end] for end in ends]
+
+
+#------------------------------------------------------------------------------
+# Test
+#------------------------------------------------------------------------------
+def manual_test_range_sweep():
+    """
+    Sweep a 3x3 grid of a sample file in this process and print the mismatch
+    and Rh maps. Run with: python -m AuxiliaryClasses.RangeSweep
+    """
+    import os
+    from .Calculator import Calculator
+    from .ConfigImporter import ConfigImporter
+    from .WidgetInputFile import NewZFile, read_impedance_file
+
+    folder = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    config = ConfigImporter(os.path.join(folder, "config.ini"))
+    freq, z_real, z_imag = read_impedance_file(os.path.join(folder, "Sample Files", "BC29074-2024-11-07.z"),
+                                               NewZFile())
+    calculator = Calculator()
+    calculator.set_bounds(config.slider_configurations)
+
+    result = run_range_sweep(calculator.worker_settings(), {"freq": freq, "Z_real": z_real, "Z_imag": z_imag},
+                             config.get_default_parameters(), "bode", steps=3, min_points=10, max_workers=1)
+    np.set_printoptions(precision=4)
+    print("starts:", result.starts, "ends:", result.ends)
+    print("mismatch per point:\n", result.mismatch)
+    print("Rh:\n", result.parameter_map("Rh"))
+    print("Most stable cell for Rh:", result.most_stable("Rh"))
+
+
+if __name__ == '__main__':
+    manual_test_range_sweep()
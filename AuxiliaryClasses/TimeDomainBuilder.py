@@ -4,14 +4,154 @@ Created on Wed Mar  5 12:36:22 2025
 
 @author: agarcian
 """
+from collections import OrderedDict
+
 import numpy as np
 import scipy.signal as sig
 from scipy.interpolate import interp1d
 from scipy.interpolate import PchipInterpolator
 from PyQt5.QtCore import QCoreApplication, QObject, pyqtSignal
+from .CircuitBuilder import FrequencyBasis
 from .ModelCircuits import ModelCircuitParent, ModelCircuitParallel, ModelCircuitSeries
 
-    
+
+# Times of the V(...) output values, in seconds.
+SAMPLE_KEYS = ('V(.1ms)', 'V(1ms)', 'V(10)', 'V(100)', 'V(200)', 'V(400)', 'V(800)', 'V(1.2s)', 'V(1.6s)')
+SAMPLE_SECONDS = (0.0001, 0.001, 0.01, 0.1, 0.2, 0.4, 0.8, 1.2, 1.6)
+# End of the current pulse: V(t) decays from there.
+PULSE_SECONDS = 2
+# Ranges of the mx and mt integrals, in seconds (see chargeability).
+MX_SECONDS = (0.45, 1.1)
+MT_SECONDS = (0.0, 2.0)
+# Samples at each end of the curve where filtfilt differs from a circular
+# filter (odd extension and initial conditions); its impulse response
+# decays below 1e-20 well within them.
+FILTER_EDGE = 64
+
+
+###############################################################################
+# Plan of the transform
+###############################################################################
+class TimeDomainPlan(object):
+    """
+    Everything run_time_domain needs that only depends on N and T: the
+    frequency grid and its FrequencyBasis, the Butterworth filter and its initial conditions, the
+    time axis, the indices of the end of the pulse, of the plotted range and
+    of the V(...) samples, and the work arrays of the filter and the
+    integration. The work arrays make a plan usable by one call at a time.
+    The weights of TimeDomainBuilder.direct_values are built on their first
+    use (see direct_weights).
+    """
+    def __init__(self, N: int, T: float):
+        if N < 16 or N & (N - 1):
+            raise ValueError(f"TimeDomainPlan: N must be a power of 2, at least 16 (got {N}).")
+        if T <= PULSE_SECONDS:
+            raise ValueError(f"TimeDomainPlan: T must be longer than the {PULSE_SECONDS} s pulse (got {T}).")
+        self.N = int(N)
+        self.T = T
+        self.dt = T / N
+
+        freq = np.linspace(0, (N // 2) / T, N // 2 + 1)
+        freq[0] = 0.001
+        freq.flags.writeable = False
+        self.freq = freq
+        self.basis = FrequencyBasis(freq)
+        self.t = np.arange(N) * self.dt
+        self.t.flags.writeable = False
+
+        self.b, self.a = sig.butter(2, 0.45)
+        self.zi = sig.lfilter_zi(self.b, self.a)
+        # Odd extension of sig.filtfilt, with its default length.
+        self.padlen = 3 * max(len(self.a), len(self.b))
+
+        self.pulse_end = int(np.searchsorted(self.t, PULSE_SECONDS, side="right"))
+        self.plot_end = int(np.searchsorted(self.t, T // 2)) + 1
+        self.sample_index = np.searchsorted(self.t, SAMPLE_SECONDS)
+
+        self._extended = np.empty(N + 2 * self.padlen)
+        self.volt_up = np.empty(N)
+        self.volt_down = np.empty(N)
+        self._direct_weights = None
+
+    def filtfilt(self, x: np.ndarray) -> np.ndarray:
+        """sig.filtfilt(b, a, x) of a signal of N points, using the precomputed initial conditions."""
+        padlen, extended = self.padlen, self._extended
+        extended[padlen:-padlen] = x
+        extended[:padlen] = 2 * x[0] - x[padlen:0:-1]
+        extended[-padlen:] = 2 * x[-1] - x[-2:-padlen - 2:-1]
+        y, _ = sig.lfilter(self.b, self.a, extended, zi=self.zi * extended[0])
+        y, _ = sig.lfilter(self.b, self.a, y[::-1], zi=self.zi * y[-1])
+        return y[-padlen - 1:padlen - 1:-1]
+
+    def direct_weights(self) -> np.ndarray:
+        """
+        Return the complex weights W, one row per output, such that
+        Re(W @ z) of the rock impedance z on the frequency grid gives, for
+        the curve of run_time_domain: Vp, the V(...) samples, V(1ms) and the
+        trapezoid integrals over MX_SECONDS and MT_SECONDS.
+        Every step from z to those values is linear, so each output is a
+        sum over the frequencies (a direct DFT at the needed times only):
+        - an output is sum(alpha * volt_down) over the plotted time axis;
+        - volt_down is a cumulative sum of the filtered curve y, so that is
+          sum(beta * y) with beta the cumulative sum of alpha (the closed
+          form of the geometric sum per frequency);
+        - y = filtfilt(h), so that is sum(g * h) with g the transposed
+          filter applied to beta: |H|^2 in frequency, with a correction at
+          the ends where filtfilt is not circular;
+        - h = irfft(z), so that is Re(sum(W * z)).
+        """
+        if self._direct_weights is None:
+            self._direct_weights = self._build_direct_weights()
+        return self._direct_weights
+
+    def _build_direct_weights(self) -> np.ndarray:
+        N, t = self.N, self.t[:self.plot_end]
+        n_samples = len(SAMPLE_SECONDS)
+        alpha = np.zeros((n_samples + 4, N))
+        # Vp = V(0), then the samples, as in chargeability and _integration_variables.
+        alpha[0, 0] = 1.0
+        alpha[np.arange(1, n_samples + 1), self.sample_index] = 1.0
+        # np.interp of V(1ms).
+        i = int(np.searchsorted(t, 0.001, side="right")) - 1
+        fraction = (0.001 - t[i]) / (t[i + 1] - t[i])
+        alpha[-3, i] += 1 - fraction
+        alpha[-3, i + 1] += fraction
+        # np.trapz over the masks of _integrate_chargeability.
+        for row, (tmin, tmax) in ((-2, MX_SECONDS), (-1, MT_SECONDS)):
+            index = np.flatnonzero((t >= tmin) & (t <= tmax))
+            half_steps = np.diff(t[index]) / 2
+            alpha[row, index[:-1]] += half_steps
+            alpha[row, index[1:]] += half_steps
+
+        # volt_down[n] = sum(y[n:pulse_end]) before the end of the pulse and
+        # -sum(y[pulse_end:n]) after it.
+        beta = np.cumsum(alpha, axis=1)
+        beta[:, self.pulse_end:] -= beta[:, -1:]
+
+        g = self._filtfilt_transposed(beta)
+        # irfft counts the frequencies between 0 and N/2 twice.
+        counts = np.full(N // 2 + 1, 2.0)
+        counts[0] = counts[-1] = 1.0
+        return counts * np.conj(np.fft.rfft(g, axis=1)) / N
+
+    def _filtfilt_transposed(self, beta: np.ndarray) -> np.ndarray:
+        """Apply the transpose of filtfilt (a linear map of N points) to each row of beta."""
+        N = self.N
+        _, response = sig.freqz(self.b, self.a, worN=np.linspace(0, np.pi, N // 2 + 1))
+        gain = np.abs(response) ** 2
+        # Circular part: filtering forwards and backwards multiplies by
+        # |H|^2, which is symmetric.
+        g = np.fft.irfft(np.fft.rfft(beta, axis=1) * gain, N, axis=1)
+        # Columns of filtfilt that differ from the circular filter.
+        circular_column = np.fft.irfft(gain, N)
+        impulse = np.zeros(N)
+        for j in np.r_[0:FILTER_EDGE, N - FILTER_EDGE:N]:
+            impulse[j] = 1.0
+            g[:, j] += beta @ (self.filtfilt(impulse) - np.roll(circular_column, j))
+            impulse[j] = 0.0
+        return g
+
+
 ###############################################################################
 # v/t class
 ###############################################################################
@@ -25,8 +165,17 @@ class TimeDomainBuilder(QObject):
         super().__init__() 
         self.N = 2 ** 14     #number of frequencies, power of 2
         self.T = 4           # Time range for Fourier Transform 
+        self.preview_N = 2 ** 11     # N of the previews (0: full resolution)
         self.model_circuit = model_circuit  
         self._integral_variables = {}
+        # Plans of run_time_domain by (N, T), with the frequency basis of the model.
+        self._plans = {}
+        # Results of run_time_domain and their integral variables, by the
+        # parameters of the rock (least recently used evicted first).
+        self.cache_size = 32
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._cache = OrderedDict()
         
     #-------------------------------------------    
     #   Public Methods
@@ -37,35 +186,138 @@ class TimeDomainBuilder(QObject):
     def set_model_circuit(self, model_circuit):
         self.model_circuit=model_circuit
 
-    def run_time_domain(self, params: dict, model_circuit: ModelCircuitParent):
+    def set_resolution(self, N: int, T: float) -> None:
+        """Use N points (a power of 2) over T seconds from the next run_time_domain."""
+        N = int(N)
+        self._plan(N, T)
+        self.N, self.T = N, T
+
+    def set_preview_resolution(self, N: int) -> None:
+        """Use N points (a power of 2) for run_time_domain(..., preview=True); 0 uses N."""
+        N = int(N)
+        if N:
+            self._plan(N, self.T)
+        self.preview_N = N
+
+    def set_cache_size(self, max_entries: int) -> None:
+        """Keep the last max_entries results of run_time_domain (0 disables the cache)."""
+        self.cache_size = max(0, int(max_entries))
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def cache_stats(self) -> dict:
+        lookups = self.cache_hits + self.cache_misses
+        return {"entries": len(self._cache), "hits": self.cache_hits, "misses": self.cache_misses,
+                "hit_rate": self.cache_hits / lookups if lookups else 0.0}
+
+    def resolution(self, preview: bool = False) -> int:
+        """Return the number of points of run_time_domain(..., preview)."""
+        return min(self.preview_N, self.N) if preview and self.preview_N else self.N
+
+    def run_time_domain(self, params: dict, model_circuit: ModelCircuitParent, preview: bool = False):
         """
-        Calculate time-domain values using a real IFFT.
-        """ 
-        n_freq = (self.N // 2) #+1
-        
-        dt = self.T / self.N
-        df = 1.0 / self.T
+        Calculate time-domain values using a real IFFT, on preview_N points
+        instead of N when preview is True (a quicker, coarser curve for the
+        slider drags). A preview leaves the V(...) integral variables of the
+        last full-resolution run: its early samples are far off.
+        The result only depends on the rock, so it is cached by the rock
+        parameters of the model: moving the electrode, inductance (and, for
+        the Series model, high-frequency arc) sliders reuses it. The cached
+        arrays are read-only.
+        """
+        N = self.resolution(preview)
+        key = self._cache_key(params, model_circuit, N)
+        cached = self._cache.get(key) if key is not None else None
+        if cached is not None:
+            self._cache.move_to_end(key)
+            self.cache_hits += 1
+            result, integral_variables = cached
+        else:
+            if key is not None:
+                self.cache_misses += 1
+            result, integral_variables = self._run_time_domain(params, model_circuit, self._plan(N, self.T))
+            if key is not None:
+                for array in result:
+                    array.flags.writeable = False
+                self._cache[key] = (result, integral_variables)
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        if N == self.N:
+            self._integral_variables.update(integral_variables)
+        return result
 
-        fmin   = 0
-        fmax   = n_freq * df
-        freq_even = np.linspace(fmin, fmax, int(n_freq + 1))
-        freq_even[0] = 0.001
+    def _cache_key(self, params: dict, model_circuit, N: int) -> tuple:
+        """
+        Return the cache key of run_time_domain: model, sign of Rinf, N, T and
+        rock parameters. None when the cache is off or the model does not
+        declare its rock parameters.
+        """
+        if self.cache_size == 0 or not hasattr(model_circuit, "rock_keys"):
+            return None
+        return (model_circuit.name, bool(model_circuit.negative_rinf), N, self.T,
+                tuple(float(params[key]) for key in model_circuit.rock_keys()))
+
+    def _run_time_domain(self, params: dict, model_circuit: ModelCircuitParent, plan: TimeDomainPlan):
+        """
+        Uncached run_time_domain on the grid of plan: the arrays returned are
+        copies, followed by the V(...) integral variables of the curve.
+        """
 
-        z_complex = model_circuit.run_rock(params, freq_even)
+        z_complex = model_circuit.evaluate_rock(params, plan.basis)
         z_complex[0] = z_complex[0].real
         
-        t, volt_down, volt_up=self._fourier_transform_pulse(z_complex, dt)
+        t, volt_down, volt_up=self._planned_pulse(z_complex, plan)
         
         ################ experimental portion.  Check IFFT
-        # freq_even_stepresponse=freq_even*2j*np.pi
+        # freq_even_stepresponse=plan.freq*2j*np.pi
         # z_complex_stepresponse = z_complex / freq_even_stepresponse
-        # t, volt_down, volt_up=self._fourier_transform_response(z_complex_stepresponse, dt) 
+        # t, volt_down, volt_up=self._fourier_transform_response(z_complex_stepresponse, plan.dt) 
         ########################
         
-        self._integration_variables(t, volt_down)
+        integral_variables = self._integration_variables(plan, volt_down)
         
-        index = np.searchsorted(t, self.T//2)
-        return freq_even[:index+1], t[:index+1], volt_down[:index+1], volt_up[:index+1]
+        end = plan.plot_end
+        return ((plan.freq[:end].copy(), t[:end].copy(), volt_down[:end].copy(), volt_up[:end].copy()),
+                integral_variables)
+
+    @staticmethod
+    def chargeability(t: np.ndarray, v_down: np.ndarray) -> dict:
+        """
+        Return the chargeabilities of a decay curve from run_time_domain:
+        Vp = V(0), mx and mt (integrals over 0.45-1.1 s and 0-2 s, in ms)
+        and m0 = V(1ms) / Vp. Shared by the time graph and BatchFit.
+        """
+        Vp = np.interp(0.0, t, v_down)
+        integral_mx = TimeDomainBuilder._integrate_chargeability(t, v_down, *MX_SECONDS)
+        integral_mt = TimeDomainBuilder._integrate_chargeability(t, v_down, *MT_SECONDS)
+        v_at_0p001 = np.interp(0.001, t, v_down) if np.any(t >= 0.001) else 0.0
+        return TimeDomainBuilder._chargeability_values(Vp, v_at_0p001, integral_mx, integral_mt)
+
+    def direct_values(self, params: dict, model_circuit: ModelCircuitParent) -> dict:
+        """
+        Set the V(...) integral variables and return the chargeability of
+        run_time_domain followed by chargeability, without building V(t):
+        a direct DFT of the same curve at the needed times only (see
+        TimeDomainPlan.direct_weights), for BatchFit and the bootstrap,
+        which print the values but not the curve. It agrees with them to
+        rounding (tested to 1e-9 of Vp).
+        """
+        plan = self._plan(self.N, self.T)
+        values = (plan.direct_weights() @ model_circuit.evaluate_rock(params, plan.basis)).real
+        n_samples = len(SAMPLE_KEYS)
+        self._integral_variables.update(zip(SAMPLE_KEYS, values[1:n_samples + 1]))
+        return self._chargeability_values(values[0], *values[n_samples + 1:])
+
+    @staticmethod
+    def _chargeability_values(Vp, v_at_0p001, integral_mx, integral_mt) -> dict:
+        if abs(Vp) < 1e-12:
+            return {'mx': 0.0, 'mt': 0.0, 'm0': 0.0, 'Vp': Vp}
+        return {
+            'mx': 1000.0 * (integral_mx / Vp),
+            'mt': 1000.0 * (integral_mt / Vp),
+            'm0': (v_at_0p001 / Vp),
+            'Vp': Vp,
+        }
 
     #This method is not used since it was not fully satisfactory. However it was preserved jsut in case
     def transform_to_time_domain(self,experiment_data):
@@ -100,6 +352,13 @@ class TimeDomainBuilder(QObject):
     #--------------------------------------
     #   Private Methods
     #------------------------------------------
+    def _plan(self, N: int, T: float) -> TimeDomainPlan:
+        """Return the plan of (N, T), built on its first use."""
+        plan = self._plans.get((N, T))
+        if plan is None:
+            plan = self._plans[(N, T)] = TimeDomainPlan(N, T)
+        return plan
+
     def _interpolate_points_for_time_domain(self, freqs_even: np.ndarray, experiment_data) -> np.ndarray:
         """
         Interpolate measured impedance data for the time-domain transform.
@@ -190,14 +449,31 @@ class TimeDomainBuilder(QObject):
         
         return t, volt_down, volt_up
 
-    def _integration_variables(self, t, v_down):
-        
-        keys=['V(.1ms)',	'V(1ms)', 'V(10)',	'V(100)','V(200)',	'V(400)',	'V(800)',	'V(1.2s)', 'V(1.6s)']
-        seconds=[0.0001,	0.001, 0.01,	0.1, 0.2, 0.4, 0.8, 1.2, 1.6]
-        
-        for key, mili in zip (keys, seconds):
-            index = np.searchsorted(t, mili)
-            self._integral_variables[key]=v_down[index]
+    def _planned_pulse(self, z_complex: np.ndarray, plan: TimeDomainPlan):
+        """
+        _fourier_transform_pulse on the grid of plan, with its filter and
+        indices. volt_down and volt_up are the work arrays of the plan.
+        """
+        z_inversefft = plan.filtfilt(np.fft.irfft(z_complex, plan.N))
+
+        volt_up = plan.volt_up
+        volt_up[0] = 0
+        np.cumsum(z_inversefft[:-1], out=volt_up[1:])
+        volt_down = np.subtract(volt_up[plan.pulse_end], volt_up, out=plan.volt_down)
+        return plan.t, volt_down, volt_up
+
+    @staticmethod
+    def _integrate_chargeability(t, v, tmin, tmax):
+        """
+        Simple trapezoidal integration of v(t) from tmin to tmax.
+        """
+        mask = (t >= tmin) & (t <= tmax)
+        if not np.any(mask):
+            return 0.0
+        return np.trapz(y=v[mask], x=t[mask])
+
+    def _integration_variables(self, plan: TimeDomainPlan, v_down) -> dict:
+        return {key: value for key, value in zip(SAMPLE_KEYS, v_down[plan.sample_index])}
             
 #------------------------------------------------------------------------------
 # Test
@@ -213,9 +489,11 @@ from PyQt5.QtCore import QObject
 class DummyModelCircuit:
     """
     Simulates a 'model circuit' for testing. 
-    The 'run_rock(params, freq_even)' method must return an array of complex impedances.
+    The 'evaluate_rock(params, freq_even)' method must return an array of complex impedances.
+    freq_even is the FrequencyBasis of the frequencies, as for the real models.
     """
-    def run_rock(self, params, freq_even: np.ndarray) -> np.ndarray:
+    def evaluate_rock(self, params, freq_even) -> np.ndarray:
+        freq_even = freq_even.freq
         # For testing, just return some made-up impedance:
         # z = R + jX, here let's do a frequency-dependent real and imaginary part:
         R = params.get("R", 50)  # default 50 ohms
@@ -258,6 +536,12 @@ def manual_test_time_domain_builder():
     for k, val in tdb.get_integral_variables().items():
         print(f"  {k} = {val:.4f}")
 
+    # Same parameters on a coarser plan, then back to the first one.
+    tdb.set_resolution(2 ** 11, tdb.T)
+    coarse = tdb.run_time_domain(test_params, circuit)
+    print("N = 2**11: {} times, plans {}".format(len(coarse[1]), sorted(tdb._plans)))
+    tdb.set_resolution(2 ** 14, tdb.T)
+
     # -------------------------------------------------------------------
     # 4) Test transform_to_time_domain(...) with some made-up experiment data
     # -------------------------------------------------------------------
@@ -282,8 +566,38 @@ def manual_test_time_domain_builder():
     print("\nManual test completed with no errors.\n")
 
 
+def manual_test_direct_values():
+    """
+    Check that direct_values gives the V(...) samples and the chargeability
+    of run_time_domain followed by chargeability, to 1e-9 of Vp (the mx and
+    mt integrals, in ms, to 1e-9 of their value).
+    """
+    params = {"Rinf": 10.0, "Rh": 20.0, "Rm": 30.0, "Rl": 40.0, "Linf": 0.001, "Re": 50.0,
+              "Ph": 0.8, "Pm": 0.6, "Pl": 0.4, "Fh": 100.0, "Fm": 10.0, "Fl": 1.0,
+              "Pef": 0.7, "Pei": 0.5, "Qe": 0.9}
+    tolerance = 1e-9
+    for model_circuit in (ModelCircuitSeries(), ModelCircuitParallel(), ModelCircuitParallel(negative_rinf=True)):
+        tdb = TimeDomainBuilder(model_circuit)
+        direct = tdb.direct_values(params, model_circuit)
+        direct_samples = dict(tdb.get_integral_variables())
+        _, t, v_down, _ = tdb.run_time_domain(params, model_circuit)
+        expected = TimeDomainBuilder.chargeability(t, v_down)
+        Vp = abs(expected['Vp'])
+
+        errors = {key: abs(direct_samples[key] - value) / Vp for key, value in tdb.get_integral_variables().items()}
+        errors['Vp'] = abs(direct['Vp'] - expected['Vp']) / Vp
+        errors['m0'] = abs(direct['m0'] - expected['m0'])
+        for key in ('mx', 'mt'):
+            errors[key] = abs(direct[key] - expected[key]) / abs(expected[key])
+        worst = max(errors, key=errors.get)
+        print(f"{type(model_circuit).__name__}: largest difference {errors[worst]:.1e} ({worst})")
+        assert errors[worst] < tolerance, f"direct_values differs from the IFFT: {errors}"
+    print("direct_values agrees with the IFFT.")
+
+
 # -------------------------------------------------------------------
 # 6) Run the test if this file is executed directly
 # -------------------------------------------------------------------
 if __name__ == "__main__":
-    manual_test_time_domain_builder()
\ No newline at end of file
+    manual_test_time_domain_builder()
+    manual_test_direct_values()
\ No newline at end of file
@@ -41,12 +41,20 @@ class WidgetButtonsRow(QWidget):
         self.f9_button: DualLabelButton = DualLabelButton("F9 +Rinf", "F9 -Rinf")
         self.f10_button: DualLabelButton = DualLabelButton("F10 Tail Right", "F11 Tail Left")
         self.f11_button: DualLabelButton = DualLabelButton("F11 Damping", "F12 Constrains On")
+        self.chain_button: DualLabelButton = DualLabelButton("Ctrl+K Chain Off", "Ctrl+K Chain On")
+        self.tracking_button: DualLabelButton = DualLabelButton("Ctrl+T Tracking Off", "Ctrl+T Tracking On")
 
         # Create additional regular buttons.
         self.f12_button: DualLabelButton = QPushButton("F12 Print Headers")
         self.fup_button: QPushButton = QPushButton("PUp. Min Freq")
         self.fdown_button: QPushButton = QPushButton("PDown. Max freq")
         self.ctrlz_button: QPushButton = QPushButton("Ctrl+Z Undo Fit")
+        self.multi_cole_button: QPushButton = QPushButton("Ctrl+F1 Multi Cole")
+        self.multi_bode_button: QPushButton = QPushButton("Ctrl+F2 Multi Bode")
+        self.cancel_fit_button: QPushButton = QPushButton("Esc Cancel Fit")
+        self.bootstrap_button: QPushButton = QPushButton("Ctrl+B Bootstrap")
+        self.optimizer_button: QPushButton = QPushButton("Ctrl+O Optimizer")
+        self.range_sweep_button: QPushButton = QPushButton("Ctrl+R Range Sweep")
 
         # Group all buttons into a list for easy iteration.
         self._buttons_list = [
@@ -54,7 +62,10 @@ class WidgetButtonsRow(QWidget):
             self.f4_button, self.f5_button, self.f6_button,
             self.f7_button, self.f8_button, self.f9_button,
             self.f10_button, self.f11_button, self.f12_button,
-            self.fup_button, self.fdown_button, self.ctrlz_button
+            self.fup_button, self.fdown_button, self.ctrlz_button,
+            self.multi_cole_button, self.multi_bode_button, self.chain_button,
+            self.cancel_fit_button, self.bootstrap_button, self.optimizer_button,
+            self.range_sweep_button, self.tracking_button
         ]
 
         self._setup_layout()
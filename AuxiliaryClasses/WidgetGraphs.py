@@ -22,6 +22,8 @@ from PyQt5.QtWidgets import (
 from PyQt5.QtCore import Qt
 from PyQt5.QtGui import QFont
 
+from .TimeDomainBuilder import TimeDomainBuilder
+
 # Example import for the type-hinted method below:
 # from ModelManual import CalculationResult
 # In your real code, ensure CalculationResult is defined or properly imported.
@@ -648,6 +650,8 @@ class TimeGraph(ParentGraph):
         self._secondary_dynamic_plot = None
 
         self.mx = self.mt = self.m0 = self.Vp = None
+        # The manual curve is a coarse preview (see update_parameters_manual).
+        self._manual_preview = False
         # Anchor so that (1, 0) is the reference point – top-right corner of the text.
         self.mx_text = pg.TextItem(color='w', anchor=(1, 0))
         self.mt_text = pg.TextItem(color='w', anchor=(1, 0))
@@ -802,11 +806,13 @@ class TimeGraph(ParentGraph):
         """
         super().update_parameters_base(freq, z_real, z_imag)
 
-    def update_parameters_manual(self, freq, time, voltage_down, voltage_up):
+    def update_parameters_manual(self, freq, time, voltage_down, voltage_up, preview=False):
         """
         - The parent's manual data holds (time, voltage_down).
         - The 'secondary' line will hold (time, voltage_up).
+        - A preview curve keeps the M-values of the last full-resolution one.
         """
+        self._manual_preview = preview
         super().update_parameters_manual(freq, time, voltage_down)
 
         # Assign the secondary data (voltage_up)
@@ -846,18 +852,11 @@ class TimeGraph(ParentGraph):
             # No shading in that range
             self._shading_item.setData([], [])
 
-        # Compute M-values
-        self.Vp = np.interp(0.0, t, v)
-        if abs(self.Vp) < 1e-12:
-            self.mx, self.mt, self.m0 = 0.0, 0.0, 0.0
-        else:
-            integral_mx = self._integrate_chargeability(t, v, 0.45, 1.1)
-            integral_mt = self._integrate_chargeability(t, v, 0.0, 2.0)
-            v_at_0p001 = np.interp(0.001, t, v) if np.any(t >= 0.001) else 0.0
-
-            self.mx = 1000.0 * (integral_mx / self.Vp)
-            self.mt = 1000.0 * (integral_mt / self.Vp)
-            self.m0 = (v_at_0p001 / self.Vp)
+        # Compute M-values (the early part of a preview is too coarse for them)
+        if self._manual_preview and self.mx is not None:
+            return
+        special_values = TimeDomainBuilder.chargeability(t, v)
+        self.mx, self.mt, self.m0, self.Vp = (special_values[k] for k in ('mx', 'mt', 'm0', 'Vp'))
 
         # Update the text items
         self.mx_text.setText(f"Mx= {self.mx:8.3f} ms")
@@ -872,16 +871,6 @@ class TimeGraph(ParentGraph):
             if idx != -1:
                 w.setTabText(idx, f"Time Domain Graph: Mx {self.mx:6.3f} ms")
 
-    @staticmethod
-    def _integrate_chargeability(t, v, tmin, tmax):
-        """
-        Simple trapezoidal integration of v(t) from tmin to tmax.
-        """
-        mask = (t >= tmin) & (t <= tmax)
-        if not np.any(mask):
-            return 0.0
-        return np.trapz(y=v[mask], x=t[mask])
-
     def get_special_values(self):
         """
         Example method returning the last computed M-values.
@@ -1040,11 +1029,14 @@ class WidgetGraphs(QWidget):
         self._small_graph_1.update_special_frequencies(freq_sp, z_real_sp, z_imag_sp)
         self._small_graph_2.update_special_frequencies(freq_sp, z_real_sp, z_imag_sp)
 
+        if calc_result.timedomain_time is None:
+            return  # run_model_manual(..., time_domain=False): keep the last V(t)
         self._tab_graph.update_parameters_manual(
             calc_result.timedomain_freq,
             calc_result.timedomain_time,
             calc_result.timedomain_volt_down,
-            calc_result.timedomain_volt_up
+            calc_result.timedomain_volt_up,
+            calc_result.timedomain_preview
         )
 
     def apply_filter_frequency_range(self, f_min, f_max):
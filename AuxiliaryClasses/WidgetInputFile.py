@@ -99,6 +99,37 @@ class FileTypesRegistry:
         return list(self._registry.keys())
 
 
+def read_impedance_file(file_path: str, file_type) -> (np.ndarray, np.ndarray, np.ndarray):
+    """
+    Read the frequency, real Z and imaginary Z columns of a file using the
+    characteristics of one of the registered file types.
+    Shared by WidgetInputFile and the scripts that run without widgets.
+    """
+    config_p = file_type.caracteristics
+
+    df = pd.read_csv(
+        file_path,
+        sep=file_type.step,
+        skiprows=int(config_p["skip_rows"]),
+        header=None,
+        
+        encoding="cp1252"  
+    )
+    freq_col = int(config_p["freq_column"])
+    z_real_col = int(config_p["z_real_column"])
+    z_imag_col = int(config_p["z_imag_column"])
+    max_col = max(freq_col, z_real_col, z_imag_col)
+
+    if max_col >= len(df.columns):
+        raise ValueError("WidgetInputFile.read_impedance_file: File does not contain the required columns.")
+
+    freq = df[freq_col].to_numpy()
+    z_real = df[z_real_col].to_numpy()
+    z_imag = df[z_imag_col].to_numpy()
+
+    return freq, z_real, z_imag
+
+
 class WidgetInputFile(QWidget):
     """
     A widget for browsing supported files in a directory, reading them in,
@@ -497,28 +528,8 @@ class WidgetInputFile(QWidget):
         and emits a signal with the extracted data.
         """
 
-        this_step= self._file_type.step
-        
         try:
-            df = pd.read_csv(
-                file_path,
-                sep=this_step,
-                skiprows=self.config_p["skip_rows"],
-                header=None,
-                
-                encoding="cp1252"  
-            )
-            freq_col = self.config_p["freq_column"]
-            z_real_col = self.config_p["z_real_column"]
-            z_imag_col = self.config_p["z_imag_column"]
-            max_col = max(freq_col, z_real_col, z_imag_col)
-    
-            if max_col >= len(df.columns):
-                raise ValueError("WidgetInputFile._extract_content :File does not contain the required columns.")
-    
-            freq = df[freq_col].to_numpy()
-            z_real = df[z_real_col].to_numpy()
-            z_imag = df[z_imag_col].to_numpy()
+            freq, z_real, z_imag = read_impedance_file(file_path, self._file_type)
     
             # Instead of empty arrays, send the arrays we just read:
             self.file_data_updated.emit(freq, z_real, z_imag)
@@ -25,6 +25,11 @@ class FileWriter:
     """
     Handles writing rows of data to CSV files safely.
     """
+    @staticmethod
+    def row_from_dictionary(dictionary, variables_to_print):
+        """Return the values of dictionary in the order of variables_to_print, '' when missing."""
+        return [dictionary.get(key, "") for key in variables_to_print]
+
     @staticmethod
     def write_to_file(file_path, rows, header=None):
         if not file_path:
@@ -151,7 +156,7 @@ class WidgetOutputFile(QWidget):
         if not isinstance(dictionary, dict):
             ErrorWindow.show_error_message("write_to_file requires a dictionary. Received something else.")
             return
-        row = [dictionary.get(key, "") for key in self.variables_to_print]
+        row = FileWriter.row_from_dictionary(dictionary, self.variables_to_print)
         FileWriter.write_to_file(
             file_path=self._output_file,
             rows=row,
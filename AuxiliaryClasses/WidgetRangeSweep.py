@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+Window of the Ctrl+R frequency-range sweep: heatmaps of the mismatch per
+point (log10) and of one fitted parameter (log10 of its magnitude) over the
+grid of sub-ranges. The rows are the lowest index of the range (highest
+frequency), the columns its highest index. The most stable cell of the
+parameter is framed; clicking a cell applies its range and its fit.
+"""
+import numpy as np
+import pyqtgraph as pg
+
+from PyQt5.QtCore import pyqtSignal
+from PyQt5.QtWidgets import QComboBox, QDialog, QHBoxLayout, QLabel, QVBoxLayout
+
+from .RangeSweep import RangeSweepResult
+
+
+class SweepHeatmap(pg.PlotWidget):
+    """One heatmap of the grid; emits cell_clicked(i, j)."""
+    cell_clicked = pyqtSignal(int, int)
+
+    def __init__(self, title: str):
+        super().__init__()
+        self.setTitle(title)
+        self.setLabel('left', "Range start (Hz)")
+        self.setLabel('bottom', "Range end (Hz)")
+        self.getViewBox().invertY(True)
+        self._image = pg.ImageItem()
+        self._marker = pg.ScatterPlotItem(symbol='s', size=18, pen=pg.mkPen('w', width=2), brush=None)
+        self.addItem(self._image)
+        self.addItem(self._marker)
+        self._bar = pg.ColorBarItem(colorMap=pg.colormap.get('viridis'), interactive=False)
+        self._bar.setImageItem(self._image, insert_in=self.getPlotItem())
+        self.scene().sigMouseClicked.connect(self._on_click)
+        self._shape = (0, 0)
+
+    def set_data(self, values: np.ndarray, starts_hz: np.ndarray, ends_hz: np.ndarray):
+        """Show values[i, j]; NaN cells are left blank."""
+        self._shape = values.shape
+        # ImageItem indexes [x, y], so columns (ends) on x and rows (starts) on y.
+        self._image.setImage(values.T, autoLevels=False)
+        finite = values[np.isfinite(values)]
+        if finite.size:
+            low, high = float(finite.min()), float(finite.max())
+            self._bar.setLevels((low, high if high > low else low + 1))
+        self._set_ticks(self.getAxis('left'), starts_hz)
+        self._set_ticks(self.getAxis('bottom'), ends_hz)
+
+    def mark(self, cell):
+        """Frame the cell (i, j), or nothing when cell is None."""
+        if cell is None:
+            self._marker.setData([], [])
+        else:
+            self._marker.setData([cell[1] + 0.5], [cell[0] + 0.5])
+
+    @staticmethod
+    def _set_ticks(axis, freqs: np.ndarray):
+        axis.setTicks([[(k + 0.5, f"{f:.2g}") for k, f in enumerate(freqs)]])
+
+    def _on_click(self, event):
+        point = self.getViewBox().mapSceneToView(event.scenePos())
+        i, j = int(np.floor(point.y())), int(np.floor(point.x()))
+        if 0 <= i < self._shape[0] and 0 <= j < self._shape[1]:
+            self.cell_clicked.emit(i, j)
+
+
+class WidgetRangeSweep(QDialog):
+    """
+    Shows a RangeSweepResult. Clicking a fitted cell emits
+    range_selected(start index, end index, fit).
+    """
+    range_selected = pyqtSignal(int, int, dict)
+
+    def __init__(self, result: RangeSweepResult, file_name: str, parameter: str = "Rh", parent=None):
+        super().__init__(parent)
+        self.result = result
+        self.setWindowTitle(f"Range sweep of {file_name} ({result.cost})")
+        self.resize(1100, 500)
+
+        self.parameter_box = QComboBox()
+        self.parameter_box.addItems(result.parameter_keys())
+        self.info_label = QLabel("")
+        self.mismatch_map = SweepHeatmap("log10 mismatch per point")
+        self.parameter_map = SweepHeatmap("")
+
+        top = QHBoxLayout()
+        top.addWidget(QLabel("Parameter:"))
+        top.addWidget(self.parameter_box)
+        top.addWidget(self.info_label, 1)
+        maps = QHBoxLayout()
+        maps.addWidget(self.mismatch_map)
+        maps.addWidget(self.parameter_map)
+        layout = QVBoxLayout(self)
+        layout.addLayout(top)
+        layout.addLayout(maps)
+
+        self._starts_hz = result.freq[result.starts]
+        self._ends_hz = result.freq[result.ends]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.mismatch_map.set_data(np.log10(result.mismatch), self._starts_hz, self._ends_hz)
+
+        self.parameter_box.currentTextChanged.connect(self._show_parameter)
+        self.mismatch_map.cell_clicked.connect(self._select_cell)
+        self.parameter_map.cell_clicked.connect(self._select_cell)
+        if parameter in result.parameter_keys():
+            self.parameter_box.setCurrentText(parameter)
+        self._show_parameter(self.parameter_box.currentText())
+
+    def _show_parameter(self, key: str):
+        """Show the map of key and frame its most stable cell."""
+        if not key:
+            return
+        self.parameter_map.setTitle(f"log10 |{key}|")
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.parameter_map.set_data(np.log10(np.abs(self.result.parameter_map(key))),
+                                        self._starts_hz, self._ends_hz)
+        cell = self.result.most_stable(key)
+        self.mismatch_map.mark(cell)
+        self.parameter_map.mark(cell)
+        if cell is None:
+            self.info_label.setText("No range was fitted.")
+        else:
+            self.info_label.setText(f"Most stable {key}: {self._describe(*cell)}. Click a cell to apply its range.")
+
+    def _describe(self, i: int, j: int) -> str:
+        value = self.result.fits[i][j][self.parameter_box.currentText()]
+        return (f"{self._starts_hz[i]:.3g} to {self._ends_hz[j]:.3g} Hz, {self.parameter_box.currentText()} "
+                f"{value:.4g}, mismatch per point {self.result.mismatch[i, j]:.3g}")
+
+    def _select_cell(self, i: int, j: int):
+        fit = self.result.fits[i][j]
+        if fit is None:
+            return
+        self.info_label.setText(f"Applied {self._describe(i, j)}.")
+        self.range_selected.emit(int(self.result.starts[i]), int(self.result.ends[j]), dict(fit))
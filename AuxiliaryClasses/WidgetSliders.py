@@ -26,6 +26,8 @@ class WidgetSliders(QWidget):
     """
     
     slider_value_updated = pyqtSignal(str, float)
+    # Key of a slider moved by the user.
+    slider_moved_by_user = pyqtSignal(str)
     slider_was_disabled = pyqtSignal(str, bool)
     all_sliders_values_reseted = pyqtSignal(dict)
     all_sliders_disabling_reseted = pyqtSignal(dict)
@@ -158,6 +160,7 @@ class WidgetSliders(QWidget):
         for key, slider in self.sliders.items():
             slider.value_changed().connect(partial(self.slider_value_updated.emit, key))
             slider.was_disabled.connect(partial(self.slider_was_disabled.emit, key))
+            slider.user_action().connect(lambda _, key=key: self.slider_moved_by_user.emit(key))
 
 
 # -------------------------------
@@ -0,0 +1,260 @@
+"""
+Headless batch fitting of every impedance file of a folder.
+
+Run from the project folder, for example:
+    python BatchFit.py "Sample Files" results.csv --cost cole --model parallel --workers 4
+
+Each file is fitted from the default slider values of config.ini, with the
+bounds and disabled sliders of config.ini, as F1 or F2 would in the GUI. One
+row per file is appended to the output .csv, in the [VariablesToPrint] layout
+that F4 writes. The files are fitted on a process pool and no widget is created.
+With --bootstrap N, the _lo/_hi interval columns of N bootstrap replicates
+are appended to every row (see AuxiliaryClasses/Bootstrap.py). With
+--telemetry (or [Telemetry] columns = yes), the fit_* columns of the fit
+telemetry are appended too, and --telemetry-log appends every fit to a
+JSON-lines file (see AuxiliaryClasses/FitTelemetry.py).
+"""
+
+import argparse
+import csv
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, replace
+from datetime import datetime
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "AuxiliaryClasses")))
+
+from AuxiliaryClasses.Bootstrap import interval_columns
+from AuxiliaryClasses.Calculator import Calculator
+from AuxiliaryClasses.ConfigImporter import ConfigImporter
+from AuxiliaryClasses.FitTelemetry import TELEMETRY_COLUMNS
+from AuxiliaryClasses.ModelCircuits import ModelCircuitParallel, ModelCircuitSeries
+from AuxiliaryClasses.Optimizers import OptimizerRegistry
+from AuxiliaryClasses.WidgetInputFile import FileTypesRegistry, read_impedance_file
+from AuxiliaryClasses.WidgetOutputFile import FileWriter
+
+
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.ini")
+MODELS = {"parallel": ModelCircuitParallel.name, "series": ModelCircuitSeries.name}
+
+
+@dataclass
+class BatchSettings:
+    """Options of a batch run, sent once to every worker process."""
+    config_file: str = CONFIG_FILE
+    file_type_name: str = None
+    cost: str = "cole"
+    model: str = "parallel"
+    negative_rinf: bool = False
+    constraints: bool = False
+    f_min: float = None
+    f_max: float = None
+    bootstrap: int = 0
+    bootstrap_mode: str = None
+    bootstrap_workers: int = None
+    telemetry: bool = False
+    optimizer: str = None
+    telemetry_log: str = None
+
+
+###############################################################################
+# Batch fitter
+###############################################################################
+class BatchFitter:
+    """
+    Fits one file at a time with the Calculator used by the GUI, configured
+    from config.ini, and returns its output row.
+    """
+    def __init__(self, settings: BatchSettings) -> None:
+        self.settings = settings
+        config = ConfigImporter(settings.config_file)
+
+        self.initial_params = config.get_default_parameters()
+        self.variables_to_print = list(config.variables_to_print)
+        if settings.bootstrap > 0:
+            self.variables_to_print += interval_columns(config.variables_to_print)
+        self.telemetry = settings.telemetry or config.telemetry_columns
+        if self.telemetry:
+            self.variables_to_print += TELEMETRY_COLUMNS
+        registry = FileTypesRegistry()
+        file_type_name = settings.file_type_name or config.input_file_type
+        self.file_type = (registry.get_file_type(file_type_name) if file_type_name
+                          else registry.get_default_file_type())
+
+        self.calculator = Calculator()
+        self.calculator.set_bounds(config.slider_configurations)
+        self.calculator.set_backend(config.performance_backend)
+        self.calculator.set_time_domain_resolution(config.time_domain_points, config.time_domain_duration)
+        self.calculator.set_optimizer(settings.optimizer or config.fit_optimizer)
+        self.calculator.set_fit_tolerance(config.fit_tolerance)
+        for key in config.get_default_disabled():
+            self.calculator.set_disabled_variables(key, True)
+        self.calculator.set_circuit_model(MODELS[settings.model])
+        self.calculator.set_rinf_negative(settings.negative_rinf)
+        self.calculator.set_gaussian_prior(settings.constraints)
+        workers = config.bootstrap_workers if settings.bootstrap_workers is None else settings.bootstrap_workers
+        self.calculator.set_bootstrap(settings.bootstrap, workers,
+                                      settings.bootstrap_mode or config.bootstrap_mode, config.bootstrap_level)
+        self.calculator.set_fit_telemetry(config.telemetry_history, settings.telemetry_log or config.telemetry_log)
+
+    def list_files(self, folder: str) -> list:
+        """Return the sorted paths of the files of folder with the extension of the file type."""
+        extension = self.file_type.caracteristics["supported_file_extension"].lower()
+        return [os.path.join(folder, name) for name in sorted(os.listdir(folder))
+                if name.lower().endswith(extension)]
+
+    def fit_file(self, file_path: str) -> list:
+        """Fit one file and return its row in the [VariablesToPrint] layout."""
+        freq, z_real, z_imag = read_impedance_file(file_path, self.file_type)
+        keep = np.ones(freq.shape, dtype=bool)
+        if self.settings.f_min is not None:
+            keep &= freq >= self.settings.f_min
+        if self.settings.f_max is not None:
+            keep &= freq <= self.settings.f_max
+        if not np.any(keep):
+            raise ValueError("no frequency left after trimming")
+
+        self.calculator.initialize_expdata({"freq": freq[keep], "Z_real": z_real[keep], "Z_imag": z_imag[keep]})
+        if self.settings.cost == "bode":
+            best_fit = self.calculator.fit_model_bode(self.initial_params)
+        else:
+            best_fit = self.calculator.fit_model_cole(self.initial_params)
+
+        # Same dictionaries as MainWidget._print_model_parameters.
+        row = (self.calculator.output_values(best_fit)
+               | {'date/time': datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+               | {'file': os.path.basename(file_path)}
+               | {'comment': ''})
+        if self.telemetry:
+            row |= self.calculator.fit_telemetry().columns()
+        if self.settings.bootstrap > 0:
+            row |= self.calculator.run_bootstrap(best_fit, self.settings.cost).columns()
+        return FileWriter.row_from_dictionary(row, self.variables_to_print)
+
+
+# Each process of the pool builds its BatchFitter once, in the initializer.
+_worker_fitter = None
+
+
+def _init_worker(settings: BatchSettings) -> None:
+    global _worker_fitter
+    _worker_fitter = BatchFitter(settings)
+
+
+def _fit_file(file_path: str):
+    """Return (file path, row, error message)."""
+    try:
+        return file_path, _worker_fitter.fit_file(file_path), None
+    except Exception as e:
+        return file_path, None, str(e)
+
+
+###############################################################################
+# Batch run
+###############################################################################
+def run_batch(folder: str, output_file: str, settings: BatchSettings, max_workers: int = None) -> int:
+    """
+    Fit every file of folder and append the rows to output_file, writing
+    the header first when the file is new. max_workers processes are used
+    (all the cores by default; in this process when it is 1). When the files
+    are fitted on a pool, each file is bootstrapped in its own worker;
+    otherwise the bootstrap has its own pool, kept for the whole folder.
+    Returns the number of files fitted.
+    """
+    if max_workers != 1:
+        settings = replace(settings, bootstrap_workers=1)
+    _init_worker(settings)
+    files = _worker_fitter.list_files(folder)
+    if not files:
+        print(f"BatchFit: no '{_worker_fitter.file_type.name}' file in '{folder}'.")
+        return 0
+
+    write_header = not os.path.exists(output_file) or os.path.getsize(output_file) == 0
+    fitted = 0
+    start = time.perf_counter()
+
+    with open(output_file, "a", newline="") as f:
+        writer = csv.writer(f)
+        if write_header:
+            writer.writerow(_worker_fitter.variables_to_print)
+
+        if max_workers == 1:
+            results = map(_fit_file, files)
+            executor = None
+        else:
+            executor = ProcessPoolExecutor(max_workers, initializer=_init_worker, initargs=(settings,))
+            results = executor.map(_fit_file, files)
+
+        try:
+            for done, (file_path, row, error) in enumerate(results, start=1):
+                rate = done / (time.perf_counter() - start)
+                name = os.path.basename(file_path)
+                if error is None:
+                    writer.writerow(row)
+                    f.flush()
+                    fitted += 1
+                    print(f"[{done}/{len(files)}] {name}  ({rate:.2f} files/s)")
+                else:
+                    print(f"[{done}/{len(files)}] {name}  skipped: {error}")
+        finally:
+            if executor is not None:
+                executor.shutdown()
+            _worker_fitter.calculator.bootstrap_runner.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"BatchFit: {fitted} of {len(files)} files fitted in {elapsed:.1f} s "
+          f"({len(files) / elapsed:.2f} files/s), written to '{output_file}'.")
+    return fitted
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Fit every impedance file of a folder without the GUI.")
+    parser.add_argument("folder", help="folder of the input files")
+    parser.add_argument("output", help=".csv file the rows are appended to")
+    parser.add_argument("--config", default=CONFIG_FILE, help="config.ini with the sliders and the output layout")
+    parser.add_argument("--file-type", default=None,
+                        help="input file type, e.g. '*.Z' (default: [InputFileType] of config.ini)")
+    parser.add_argument("--cost", choices=("cole", "bode"), default="cole", help="cost function (F1 or F2)")
+    parser.add_argument("--model", choices=sorted(MODELS), default="parallel", help="circuit model")
+    parser.add_argument("--optimizer", choices=OptimizerRegistry().get_available_optimizers(), default=None,
+                        help="optimizer backend (default: [Fit] optimizer of config.ini; the experimental "
+                             "dogbox is only selected there)")
+    parser.add_argument("--workers", type=int, default=0, help="worker processes (0: all the cores)")
+    parser.add_argument("--fmin", type=float, default=None, help="ignore the frequencies below fmin [Hz]")
+    parser.add_argument("--fmax", type=float, default=None, help="ignore the frequencies above fmax [Hz]")
+    parser.add_argument("--negative-rinf", action="store_true", help="fit with a negative Rinf (F9)")
+    parser.add_argument("--constraints", action="store_true", help="fit with the constraints on (F11)")
+    parser.add_argument("--bootstrap", type=int, default=0,
+                        help="bootstrap replicates per file, adding the _lo/_hi interval columns (0: none)")
+    parser.add_argument("--bootstrap-mode", choices=("residuals", "points"), default=None,
+                        help="bootstrap resampling (default: [Bootstrap] of config.ini)")
+    parser.add_argument("--telemetry", action="store_true",
+                        help="add the fit_* telemetry columns (evaluations, time split) to the rows")
+    parser.add_argument("--telemetry-log", default=None,
+                        help="JSON-lines file every fit is appended to (default: [Telemetry] log of config.ini)")
+    args = parser.parse_args(argv)
+
+    settings = BatchSettings(
+        config_file=args.config,
+        file_type_name=args.file_type,
+        cost=args.cost,
+        model=args.model,
+        negative_rinf=args.negative_rinf,
+        constraints=args.constraints,
+        f_min=args.fmin,
+        f_max=args.fmax,
+        bootstrap=args.bootstrap,
+        bootstrap_mode=args.bootstrap_mode,
+        telemetry=args.telemetry,
+        telemetry_log=args.telemetry_log,
+        optimizer=args.optimizer,
+    )
+    run_batch(args.folder, args.output, settings, args.workers or None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,459 @@
+"""
+Benchmarks for the numerical core of ZarcFit.
+
+Run from the project folder:
+    python Benchmarks.py
+
+Uses the sample .z files and the default slider values of config.ini.
+No widget is created.
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "AuxiliaryClasses")))
+
+from AuxiliaryClasses import CircuitKernels
+from AuxiliaryClasses.CircuitBuilder import FrequencyBasis
+from AuxiliaryClasses.ConfigImporter import ConfigImporter
+from AuxiliaryClasses.FitBuilder import FitBuilder
+from AuxiliaryClasses.ModelCircuits import ModelCircuitParallel, ModelCircuitSeries
+from AuxiliaryClasses.Optimizers import OptimizerRegistry
+from AuxiliaryClasses.TimeDomainBuilder import TimeDomainBuilder, TimeDomainPlan
+from AuxiliaryClasses.WidgetInputFile import FileTypesRegistry, read_impedance_file
+
+
+SAMPLE_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Sample Files")
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.ini")
+
+
+#------------------------------------------------------------------------------
+# Helpers
+#------------------------------------------------------------------------------
+def load_sample_files(folder=SAMPLE_FOLDER, file_type_name="*.Z"):
+    """Return a list of (file name, experiment data dict) for a folder."""
+    file_type = FileTypesRegistry().get_file_type(file_type_name)
+    extension = file_type.caracteristics["supported_file_extension"].lower()
+    samples = []
+
+    for name in sorted(os.listdir(folder)):
+        if not name.lower().endswith(extension):
+            continue
+        try:
+            freq, z_real, z_imag = read_impedance_file(os.path.join(folder, name), file_type)
+        except Exception as e:
+            print(f"Benchmarks.load_sample_files: skipping '{name}': {e}")
+            continue
+        samples.append((name, {"freq": freq, "Z_real": z_real, "Z_imag": z_imag}))
+
+    return samples
+
+
+def default_parameters(config_file=CONFIG_FILE):
+    """Return the default slider values of config.ini in model units."""
+    return ConfigImporter(config_file).get_default_parameters()
+
+
+def time_domain_frequencies(n=2 ** 14, t=4):
+    """Return the frequency grid used by TimeDomainBuilder.run_time_domain."""
+    freq_even = np.linspace(0, (n // 2) / t, n // 2 + 1)
+    freq_even[0] = 0.001
+    return freq_even
+
+
+def time_call(func, repeats=20):
+    """Return the best wall time, in seconds, of several calls to func."""
+    best = np.inf
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def loop_run_model(model, parameters: dict, freq_array: np.ndarray):
+    """
+    Per-frequency evaluation with the scalar helpers, as the models did it
+    before the whole-array path. Kept only as the reference of the benchmark.
+    """
+    par = parameters.copy()
+    if model.negative_rinf:
+        par['Rinf'] = -par['Rinf']
+    model._calculate_secondary_parameters(par)
+    q, par2 = model.q, model.par_second
+
+    z = []
+    for f in freq_array:
+        z_cpee = model._cpe(f, par["Qe"], par["Pef"], par["Pei"])
+        zarce = model._parallel(z_cpee, par["Re"])
+        zinf = model._inductor(f, par["Linf"])
+
+        if isinstance(model, ModelCircuitSeries):
+            zarcm = model._parallel(model._cpe(f, q["Qm"], par["Pm"], par["Pm"]), par["Rm"])
+            zarcl = model._parallel(model._cpe(f, q["Ql"], par["Pl"], par["Pl"]), par["Rl"])
+            zarch = model._parallel(model._cpe(f, q["Qh"], par["Ph"], par["Ph"]), par["Rh"])
+            z.append(zinf + par["Rinf"] + zarch + zarcm + zarcl + zarce)
+        else:
+            z_line_m = par2["pRm"] + model._cpe(f, par2["pQm"], par["Pm"], par["Pm"])
+            z_line_l = par2["pRl"] + model._cpe(f, par2["pQl"], par["Pl"], par["Pl"])
+            z_rock = model._parallel(model._parallel(z_line_m, z_line_l), par2["R0"])
+            z_line_h = par2["pRh"] + model._cpe(f, par2["pQh"], par["Ph"], par["Ph"])
+            z.append(zinf + model._parallel(z_line_h, z_rock) + zarce)
+
+    return np.array(z)
+
+
+def dict_residual_cole(fit, values):
+    """
+    Cole residual reading the experimental arrays from the data dict at every
+    call, as FitBuilder did before its ExperimentWorkspace. Reference only.
+    """
+    data = fit._experiment_data
+    weight = fit._weight_function(values)
+    z = fit._model_circuit.impedance(values, data["freq"])
+    return np.concatenate([(z.real - data["Z_real"]) * weight, (z.imag - data["Z_imag"]) * weight])
+
+
+def dict_residual_bode(fit, values):
+    """
+    Bode residual recomputing the modulus and phase of the experimental data
+    at every call, as FitBuilder did before its ExperimentWorkspace. Reference only.
+    """
+    data = fit._experiment_data
+    z = fit._model_circuit.impedance(values, data["freq"])
+    z_phase_deg = np.degrees(np.arctan2(z.imag, z.real))
+    exp_abs = np.hypot(data["Z_real"], data["Z_imag"])
+    exp_phase_deg = np.degrees(np.arctan2(data["Z_imag"], data["Z_real"]))
+    res_abs = np.log10(np.hypot(z.real, z.imag)) - np.log10(exp_abs)
+    res_phase = np.log10(np.abs(z_phase_deg) + 1e-10) - np.log10(np.abs(exp_phase_deg) + 1e-10)
+    weight = fit._weight_function(values)
+    return np.concatenate([res_abs * weight, res_phase * weight])
+
+
+#------------------------------------------------------------------------------
+# Benchmarks
+#------------------------------------------------------------------------------
+def benchmark_circuit_models(repeats=20):
+    """
+    Compare the per-frequency loop with the whole-array run_model on every
+    sample file and on the 8,193-point time-domain grid.
+    """
+    params = default_parameters()
+    samples = load_sample_files()
+    grids = [(name, data["freq"]) for name, data in samples]
+    grids.append(("time-domain grid", time_domain_frequencies()))
+
+    print("\n==== Circuit model evaluation (best of %d) ====" % repeats)
+    print(f"{'model':<18}{'frequencies':<26}{'points':>8}{'loop [ms]':>12}{'array [ms]':>12}{'speedup':>10}")
+
+    for model in (ModelCircuitParallel(), ModelCircuitSeries()):
+        for name, freq in grids:
+            z_loop = loop_run_model(model, params, freq)
+            z_array, _ = model.run_model(params, freq)
+            if not np.allclose(z_loop, z_array, rtol=1e-10, atol=0):
+                raise AssertionError(f"Benchmarks: {model.name} differs from the loop reference on {name}")
+
+            t_loop = time_call(lambda: loop_run_model(model, params, freq), max(1, repeats // 10))
+            t_array = time_call(lambda: model.run_model(params, freq), repeats)
+            print(f"{model.name:<18}{name:<26}{len(freq):>8}{1e3 * t_loop:>12.3f}"
+                  f"{1e3 * t_array:>12.3f}{t_loop / t_array:>9.1f}x")
+
+
+def benchmark_batch_evaluation(n_sets=64, repeats=20):
+    """
+    Compare n_sets calls to run_model with one call to run_model_batch,
+    as used by finite-difference Jacobians and parameter scans.
+    """
+    params = default_parameters()
+    freq = load_sample_files()[0][1]["freq"]
+    keys = ModelCircuitParallel.PARAMETER_KEYS
+
+    rng = np.random.default_rng(0)
+    base = np.array([params[k] for k in keys])
+    parameter_sets = base * (1.0 + 0.05 * rng.standard_normal((n_sets, len(keys))))
+    dict_sets = [dict(zip(keys, row)) for row in parameter_sets]
+
+    print("\n==== Batched evaluation of %d parameter sets (best of %d) ====" % (n_sets, repeats))
+    print(f"{'model':<18}{'loop [ms]':>12}{'batch [ms]':>12}{'speedup':>10}")
+
+    for model in (ModelCircuitParallel(), ModelCircuitSeries()):
+        t_loop = time_call(lambda: [model.run_model(p, freq) for p in dict_sets], repeats)
+        t_batch = time_call(lambda: model.run_model_batch(parameter_sets, freq), repeats)
+        print(f"{model.name:<18}{1e3 * t_loop:>12.3f}{1e3 * t_batch:>12.3f}{t_loop / t_batch:>9.1f}x")
+
+
+def benchmark_frequency_basis(repeats=20):
+    """
+    Compare run_model given the frequency array (its FrequencyBasis built at
+    every call) and given the FrequencyBasis kept by ExperimentWorkspace or
+    TimeDomainPlan, as in a fit or a time-domain update.
+    """
+    params = default_parameters()
+    grids = [("sample file", load_sample_files()[0][1]["freq"]),
+             ("time-domain grid", time_domain_frequencies())]
+
+    print("\n==== Precomputed frequency basis (best of %d) ====" % repeats)
+    print(f"{'model':<18}{'frequencies':<26}{'array [ms]':>12}{'basis [ms]':>12}{'speedup':>10}")
+
+    for model in (ModelCircuitParallel(), ModelCircuitSeries()):
+        for name, freq in grids:
+            basis = FrequencyBasis(freq)
+            t_array = time_call(lambda: model.run_model(params, freq), repeats)
+            t_basis = time_call(lambda: model.run_model(params, basis), repeats)
+            print(f"{model.name:<18}{name:<26}{1e3 * t_array:>12.3f}"
+                  f"{1e3 * t_basis:>12.3f}{t_array / t_basis:>9.1f}x")
+
+
+def benchmark_backends(n_sets=64, repeats=20):
+    """
+    Compare the NumPy and numba backends of CircuitKernels on every sample
+    spectrum: batched evaluation of n_sets parameter sets and one Cole and
+    Bode residual, as computed at every step of a fit.
+    """
+    print("\n==== Kernel backends (best of %d) ====" % repeats)
+    if not CircuitKernels.available():
+        print("numba is not installed: only the numpy backend is available.")
+        return
+
+    params = default_parameters()
+    keys = ModelCircuitParallel.PARAMETER_KEYS
+    rng = np.random.default_rng(0)
+    values = ModelCircuitParallel.LAYOUT.to_array(params)
+    parameter_sets = values * (1.0 + 0.05 * rng.standard_normal((n_sets, len(keys))))
+    workloads = [
+        ("batch of %d" % n_sets, lambda model, fit, data: model.run_model_batch(parameter_sets, data["freq"])),
+        ("Cole residual", lambda model, fit, data: fit._residual_cole(values)),
+        ("Bode residual", lambda model, fit, data: fit._residual_bode(values)),
+    ]
+
+    print(f"{'model':<18}{'workload':<16}{'file':<26}{'numpy [ms]':>12}{'numba [ms]':>12}{'speedup':>10}")
+    previous_backend = CircuitKernels.get_backend()
+    try:
+        for model in (ModelCircuitParallel(), ModelCircuitSeries()):
+            for name, data in load_sample_files():
+                fit = FitBuilder(data, model)
+                for workload, func in workloads:
+                    timings = {}
+                    for backend in ("numpy", "numba"):
+                        CircuitKernels.set_backend(backend)
+                        func(model, fit, data)   # compiles the numba kernels on first use
+                        timings[backend] = time_call(lambda: func(model, fit, data), repeats)
+                    print(f"{model.name:<18}{workload:<16}{name:<26}{1e3 * timings['numpy']:>12.3f}"
+                          f"{1e3 * timings['numba']:>12.3f}{timings['numpy'] / timings['numba']:>9.1f}x")
+    finally:
+        CircuitKernels.set_backend(previous_backend)
+
+
+def benchmark_residual_workspace(repeats=200):
+    """
+    Compare one NumPy residual call reading the data dict (reference above)
+    with FitBuilder's residuals, which read the precomputed
+    ExperimentWorkspace and write the model side in place.
+    """
+    params = default_parameters()
+    values = ModelCircuitParallel.LAYOUT.to_array(params)
+    workloads = [("Cole residual", dict_residual_cole, lambda fit: fit._residual_cole(values)),
+                 ("Bode residual", dict_residual_bode, lambda fit: fit._residual_bode(values))]
+
+    print("\n==== Residuals with the experimental workspace, numpy backend (best of %d) ====" % repeats)
+    print(f"{'model':<18}{'workload':<16}{'file':<26}{'dict [us]':>12}{'workspace [us]':>16}{'saved [us]':>12}")
+    previous_backend = CircuitKernels.get_backend()
+    CircuitKernels.set_backend("numpy")
+    try:
+        for model in (ModelCircuitParallel(), ModelCircuitSeries()):
+            for name, data in load_sample_files():
+                fit = FitBuilder(data, model)
+                for workload, reference, func in workloads:
+                    if not np.allclose(reference(fit, values), func(fit), rtol=1e-12, atol=0):
+                        raise AssertionError(f"Benchmarks: {workload} differs from the reference on {name}")
+                    t_dict = time_call(lambda: reference(fit, values), repeats)
+                    t_workspace = time_call(lambda: func(fit), repeats)
+                    print(f"{model.name:<18}{workload:<16}{name:<26}{1e6 * t_dict:>12.1f}"
+                          f"{1e6 * t_workspace:>16.1f}{1e6 * (t_dict - t_workspace):>12.1f}")
+    finally:
+        CircuitKernels.set_backend(previous_backend)
+
+
+def benchmark_jacobians(costs=("cole", "bode")):
+    """
+    Fit every sample spectrum with the Parallel model from the default
+    sliders (trf, bounds and disabled sliders of config.ini) with
+    finite-difference and closed-form Jacobians, with both kernel backends.
+    Prints the wall time, residual evaluations (including those of the
+    finite differences, which nfev leaves out), Jacobians and status of
+    every fit, then the median and range of the speedup per backend.
+    FitBuilder._cost_functions uses the closed form with NumPy only.
+    """
+    config = ConfigImporter(CONFIG_FILE)
+    params = config.get_default_parameters()
+    samples = load_sample_files()
+    backends = ("numpy", "numba") if CircuitKernels.available() else ("numpy",)
+    speedups = {backend: [] for backend in backends}
+
+    print("\n==== Finite-difference and closed-form Jacobians, Parallel model, trf ====")
+    print(f"{'backend':<8}{'cost':<6}{'file':<26}{'jacobian':<10}{'time [s]':>10}{'evals':>7}{'nfev':>7}{'njev':>7}"
+          f"{'status':>8}{'cost':>14}")
+    previous_backend = CircuitKernels.get_backend()
+    try:
+        for backend in backends:
+            CircuitKernels.set_backend(backend)
+            for cost in costs:
+                for file_name, data in samples:
+                    fit = FitBuilder(data, ModelCircuitParallel())
+                    fit.set_bounds(config.slider_configurations)
+                    fit.disabled_variables = set(config.get_default_disabled())
+                    residual_func, _ = fit._cost_functions(cost)
+                    jacobian_func = getattr(fit, f"_jacobian_{cost}")
+                    fit.fit_model(residual_func, params, 0, jacobian_func)   # compiles the numba kernels
+                    walls = []
+                    for label, jacobian in (("2-point", None), ("closed", jacobian_func)):
+                        calls = [0]
+
+                        def counted(values, residual_func=residual_func):
+                            calls[0] += 1
+                            return residual_func(values)
+                        fit.fit_model(counted, params, 0, jacobian)
+                        telemetry = fit.last_telemetry
+                        walls.append(telemetry.wall)
+                        print(f"{backend:<8}{cost:<6}{file_name:<26}{label:<10}{telemetry.wall:>10.3f}{calls[0]:>7}"
+                              f"{telemetry.nfev:>7}{telemetry.njev:>7}{telemetry.status!s:>8}{telemetry.cost:>14.6g}")
+                    speedups[backend].append(walls[0] / walls[1])
+    finally:
+        CircuitKernels.set_backend(previous_backend)
+
+    print(f"\n{'backend':<8}{'median speedup':>16}{'min':>8}{'max':>8}")
+    for backend, ratios in speedups.items():
+        print(f"{backend:<8}{np.median(ratios):>15.1f}x{min(ratios):>7.1f}x{max(ratios):>7.1f}x")
+
+
+def benchmark_optimizers(costs=("cole", "bode")):
+    """
+    Fit every sample spectrum with the Parallel model from the default
+    sliders, with the bounds and disabled sliders of config.ini, using each
+    optimizer backend. Prints the wall time, evaluations and final cost of
+    every fit, then the totals and the cost relative to trf per backend.
+    """
+    config = ConfigImporter(CONFIG_FILE)
+    params = config.get_default_parameters()
+    samples = load_sample_files()
+    names = OptimizerRegistry().get_available_optimizers(include_experimental=True)
+    totals = {name: [0.0, 0, []] for name in names}
+
+    print("\n==== Optimizer backends, Parallel model from the default sliders ====")
+    print(f"{'cost':<6}{'file':<26}{'optimizer':<10}{'used':<9}{'time [s]':>10}{'nfev':>7}{'cost':>14}")
+    for cost in costs:
+        for file_name, data in samples:
+            fit = FitBuilder(data, ModelCircuitParallel())
+            fit.set_bounds(config.slider_configurations)
+            fit.disabled_variables = set(config.get_default_disabled())
+            fit_function = fit.fit_model_bode if cost == "bode" else fit.fit_model_cole
+            reference = None
+            for name in names:
+                fit.set_optimizer(name)
+                fit_function(params, 0)
+                telemetry = fit.last_telemetry
+                reference = telemetry.cost if reference is None else reference
+                totals[name][0] += telemetry.wall
+                totals[name][1] += telemetry.nfev
+                totals[name][2].append(telemetry.cost / reference if reference > 0 else 1.0)
+                print(f"{cost:<6}{file_name:<26}{name:<10}{telemetry.optimizer:<9}{telemetry.wall:>10.3f}"
+                      f"{telemetry.nfev:>7}{telemetry.cost:>14.6g}")
+
+    print(f"\n{'optimizer':<10}{'time [s]':>10}{'nfev':>8}{'median cost/trf':>17}{'worse by >1%':>14}")
+    for name, (wall, nfev, ratios) in totals.items():
+        ratios = np.array(ratios)
+        print(f"{name:<10}{wall:>10.2f}{nfev:>8}{np.median(ratios):>17.4f}"
+              f"{np.count_nonzero(ratios > 1.01):>9}/{ratios.size}")
+
+
+def benchmark_time_domain_cache(steps=10):
+    """
+    Drag each slider over steps positions and back, as a user does, and time
+    TimeDomainBuilder.run_time_domain per update with and without its cache
+    of rock parameters. Sliders outside the rock never recompute the
+    transform; rock sliders hit the cache on the way back.
+    """
+    params = default_parameters()
+    print("\n==== Time-domain response per slider update, drag and back (%d positions) ====" % steps)
+    print(f"{'model':<18}{'slider':<8}{'rock':<6}{'uncached [ms]':>15}{'cached [ms]':>13}{'hits':>7}")
+    for model in (ModelCircuitParallel(), ModelCircuitSeries()):
+        for key in model.PARAMETER_KEYS:
+            positions = params[key] * np.linspace(0.8, 1.2, steps)
+            updates = [dict(params, **{key: value}) for value in np.concatenate([positions, positions[::-1]])]
+            timings = []
+            for cache_size in (0, 32):
+                builder = TimeDomainBuilder(model)
+                builder.set_cache_size(cache_size)
+                builder.run_time_domain(params, model)
+                start = time.perf_counter()
+                for update in updates:
+                    builder.run_time_domain(update, model)
+                timings.append((time.perf_counter() - start) / len(updates))
+            print(f"{model.name:<18}{key:<8}{'yes' if key in model.rock_keys() else 'no':<6}"
+                  f"{1e3 * timings[0]:>15.2f}{1e3 * timings[1]:>13.3f}{builder.cache_hits:>7}")
+
+
+def benchmark_time_domain_plan(powers=range(11, 17), repeats=20):
+    """
+    Time an uncached TimeDomainBuilder.run_time_domain with its plan built
+    once for each N = 2**power (T = 4 s), the time to build that plan, and
+    how far V(1ms) and V(100) move from the values at N = 2**14.
+    """
+    params = default_parameters()
+    model = ModelCircuitParallel()
+    reference = TimeDomainBuilder(model)
+    reference.run_time_domain(params, model)
+    reference = dict(reference.get_integral_variables())
+
+    print("\n==== Time-domain transform by resolution (best of %d) ====" % repeats)
+    print(f"{'N':>8}{'plan [ms]':>11}{'run [ms]':>10}{'V(1ms) error':>14}{'V(100) error':>14}")
+    for power in powers:
+        builder = TimeDomainBuilder(model)
+        builder.set_cache_size(0)
+        build = time_call(lambda: TimeDomainPlan(2 ** power, 4), repeats)
+        builder.set_resolution(2 ** power, 4)
+        run = time_call(lambda: builder.run_time_domain(params, model), repeats)
+        values = builder.get_integral_variables()
+        errors = [abs(values[key] / reference[key] - 1) for key in ("V(1ms)", "V(100)")]
+        print(f"{2 ** power:>8}{1e3 * build:>11.2f}{1e3 * run:>10.2f}{errors[0]:>14.2%}{errors[1]:>14.2%}")
+
+
+def benchmark_time_domain_direct(repeats=50):
+    """
+    Time the values BatchFit prints from the time domain: the IFFT curve
+    followed by chargeability, against TimeDomainBuilder.direct_values
+    (after the one-off build of its weights), and the largest difference.
+    """
+    params = default_parameters()
+    print("\n==== Time-domain output values: IFFT vs direct DFT (best of %d) ====" % repeats)
+    print(f"{'model':>16}{'weights [ms]':>14}{'IFFT [ms]':>11}{'direct [ms]':>13}{'speedup':>9}{'max error':>11}")
+    for model in (ModelCircuitSeries(), ModelCircuitParallel()):
+        builder = TimeDomainBuilder(model)
+        builder.set_cache_size(0)
+        weights = time_call(lambda: TimeDomainPlan(builder.N, builder.T).direct_weights(), 3)
+
+        def ifft():
+            _, t, v_down, _ = builder.run_time_domain(params, model)
+            return TimeDomainBuilder.chargeability(t, v_down)
+        expected, direct = ifft(), builder.direct_values(params, model)
+        error = max(abs(direct[key] / expected[key] - 1) for key in expected if expected[key])
+        ifft_time = time_call(ifft, repeats)
+        direct_time = time_call(lambda: builder.direct_values(params, model), repeats)
+        print(f"{model.name:>16}{1e3 * weights:>14.1f}{1e3 * ifft_time:>11.2f}{1e3 * direct_time:>13.2f}"
+              f"{ifft_time / direct_time:>8.1f}x{error:>11.1e}")
+
+
+if __name__ == "__main__":
+    benchmark_circuit_models()
+    benchmark_batch_evaluation()
+    benchmark_frequency_basis()
+    benchmark_backends()
+    benchmark_residual_workspace()
+    benchmark_jacobians()
+    benchmark_optimizers()
+    benchmark_time_domain_cache()
+    benchmark_time_domain_plan()
+    benchmark_time_domain_direct()
@@ -16,19 +16,22 @@ from PyQt5 import QtWidgets
 from PyQt5.QtCore import Qt, QTimer, QEvent
 from PyQt5.QtGui import (QKeySequence, QMouseEvent, QFont, QFontMetrics, QPalette, QColor)
 from PyQt5.QtWidgets import (
-    QApplication, QMainWindow, QShortcut, QSizePolicy, QSplitter,
+    QApplication, QMainWindow, QShortcut, QSizePolicy, QSplitter, QStatusBar,
     QWidget, QHBoxLayout, QVBoxLayout,  QPushButton, QLabel
     )
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "AuxiliaryClasses")))
 
+from AuxiliaryClasses.Bootstrap import interval_columns
 from AuxiliaryClasses.ConfigImporter import ConfigImporter
 from AuxiliaryClasses.CustomListSliders import ListSliderRange
 from AuxiliaryClasses.Calculator import Calculator
+from AuxiliaryClasses.FitTelemetry import TELEMETRY_COLUMNS
 from AuxiliaryClasses.WidgetButtonsRow import WidgetButtonsRow
 from AuxiliaryClasses.WidgetGraphs import WidgetGraphs
 from AuxiliaryClasses.WidgetInputFile import WidgetInputFile
 from AuxiliaryClasses.WidgetOutputFile import WidgetOutputFile
+from AuxiliaryClasses.WidgetRangeSweep import WidgetRangeSweep
 from AuxiliaryClasses.WidgetSliders import WidgetSliders
 from AuxiliaryClasses.WidgetTextBar import WidgetTextBar
 
@@ -40,6 +43,21 @@ class MainWidget(QWidget):
         # Data attributes
         self.file_data = {"freq": None, "Z_real": None, "Z_imag": None}
         self.v_sliders = None
+        # File whose sliders were set from the fit chain, if any.
+        self._chain_warm_file = None
+        # Background fit in progress: (button, its label, file name, warm start).
+        self._running_fit = None
+        # Background pool job in progress: (button, its label, file name, cost).
+        self._running_job = None
+        # Cost of the last fit, and last bootstrap as (file name, BootstrapResult).
+        self._last_fit_cost = "cole"
+        self._bootstrap = None
+        # Window of the last range sweep.
+        self._range_sweep_window = None
+        # Last frequency range (low, high indices), for the tracking refits.
+        self._tracked_range = None
+        # Telemetry of the last F1/F2 fit as (file name, FitTelemetry).
+        self._telemetry = None
 
         # Initialization
         self._initialize_core_widgets()
@@ -72,9 +90,14 @@ class MainWidget(QWidget):
         self.splitter.setStretchFactor(1, 0)  # Bottom area remains fixed initially
         self.splitter.setHandleWidth(10)
              
+        # Telemetry of the last fit.
+        self.status_bar = QStatusBar()
+        self.status_bar.setSizeGripEnabled(False)
+
         main_layout = QVBoxLayout()
         main_layout.addWidget(top_bar)
         main_layout.addWidget(self.splitter)
+        main_layout.addWidget(self.status_bar)
         main_layout.setContentsMargins(2, 2, 6, 2) #left, top, right, bottom
         #main_layout.setSpacing(0)
         self.setLayout(main_layout)
@@ -160,7 +183,12 @@ class MainWidget(QWidget):
                                                  self.config.input_file_type, 
                                                  font = self.config.small_font
                                                  )    
-        self.widget_output_file = WidgetOutputFile(self.config.variables_to_print, 
+        variables_to_print = list(self.config.variables_to_print)
+        if self.config.bootstrap_columns:
+            variables_to_print += interval_columns(self.config.variables_to_print)
+        if self.config.telemetry_columns:
+            variables_to_print += TELEMETRY_COLUMNS
+        self.widget_output_file = WidgetOutputFile(variables_to_print, 
                                                    self.config.output_file,
                                                    font = self.config.small_font
                                                    )
@@ -179,6 +207,23 @@ class MainWidget(QWidget):
                                               )
         self.calculator = Calculator()
         self.calculator.set_bounds(self.config.slider_configurations)
+        self.calculator.set_backend(self.config.performance_backend)
+        self.calculator.set_time_domain_resolution(self.config.time_domain_points, self.config.time_domain_duration)
+        self.calculator.set_time_domain_preview(self.config.time_domain_preview_points)
+        self.calculator.set_time_domain_cache(self.config.time_domain_cache)
+        self.calculator.set_multistart(self.config.multistart_starts, self.config.multistart_workers)
+        self.calculator.set_fit_time_budget(self.config.fit_time_budget)
+        self.calculator.set_two_stage_fit(self.config.two_stage_fit, self.config.coarse_fit,
+                                          self.config.refine_time_budget)
+        self.calculator.set_tracking(self.config.tracking_shift, self.config.tracking_evaluations)
+        self.calculator.set_optimizer(self.config.fit_optimizer)
+        self.calculator.set_fit_tolerance(self.config.fit_tolerance)
+        self.calculator.set_fit_cache(self.config.fit_cache_size, self.config.fit_cache_file)
+        self.calculator.set_fit_telemetry(self.config.telemetry_history, self.config.telemetry_log)
+        self.calculator.set_bootstrap(self.config.bootstrap_replicates, self.config.bootstrap_workers,
+                                      self.config.bootstrap_mode, self.config.bootstrap_level)
+        self.calculator.set_range_sweep(self.config.sweep_steps, self.config.sweep_min_points,
+                                        self.config.sweep_workers)
     
     # minor widget 1
     def _create_button_toggle_model(self):
@@ -286,12 +331,17 @@ class MainWidget(QWidget):
 
         # Slider signals
         self.widget_sliders.slider_value_updated.connect(self._handle_slider_update)
+        self.widget_sliders.slider_moved_by_user.connect(self._handle_slider_moved_by_user)
         self.widget_sliders.all_sliders_values_reseted.connect(self._reset_v_sliders)
         self.widget_sliders.slider_was_disabled.connect(self.calculator.set_disabled_variables)
         self.freq_slider.sliderMoved.connect(self._handle_frequency_update)
         # Calculator signals
         self.calculator.model_manual_result.connect(self.widget_graphs.update_manual_plot)
         self.calculator.fit_builder.model_manual_values.connect(self.widget_sliders.set_all_variables)
+        self.calculator.fit_progress.connect(self._on_fit_progress)
+        self.calculator.fit_finished.connect(self._on_fit_finished)
+        self.calculator.job_progress.connect(self._on_job_progress)
+        self.calculator.job_finished.connect(self._on_job_finished)
 
     def _initialize_hotkeys_and_buttons(self):
         """Initializes keyboard shortcuts and connects button actions."""
@@ -299,15 +349,11 @@ class MainWidget(QWidget):
         # All actions from buttons in WidgetButon
         shortcut_f1 = QShortcut(QKeySequence(Qt.Key_F1), self)
         shortcut_f1.activated.connect(self.widget_buttons.f1_button.click)
-        self.widget_buttons.f1_button.clicked.connect(
-            lambda: self.calculator.fit_model_cole(self.v_sliders)
-        )
+        self.widget_buttons.f1_button.clicked.connect(lambda: self._handle_fit("cole"))
 
         shortcut_f2 = QShortcut(QKeySequence(Qt.Key_F2), self)
         shortcut_f2.activated.connect(self.widget_buttons.f2_button.click)
-        self.widget_buttons.f2_button.clicked.connect(
-            lambda: self.calculator.fit_model_bode(self.v_sliders)
-        )
+        self.widget_buttons.f2_button.clicked.connect(lambda: self._handle_fit("bode"))
 
         shortcut_f3 = QShortcut(QKeySequence(Qt.Key_F3), self)
         shortcut_f3.activated.connect(self.widget_buttons.f3_button.click)
@@ -358,8 +404,45 @@ class MainWidget(QWidget):
         self.widget_buttons.fup_button.clicked.connect(self.freq_slider.down_max)
 
         shortcut_ctrl_z = QShortcut(QKeySequence(Qt.CTRL + Qt.Key_Z), self)
-        shortcut_ctrl_z.activated.connect(self.calculator.fit_builder.recover_previous_fit)
-        self.widget_buttons.ctrlz_button.clicked.connect(self.calculator.fit_builder.recover_previous_fit)
+        shortcut_ctrl_z.activated.connect(self.widget_buttons.ctrlz_button.click)
+        self.widget_buttons.ctrlz_button.clicked.connect(self._handle_undo_fit)
+
+        shortcut_esc = QShortcut(QKeySequence(Qt.Key_Escape), self)
+        shortcut_esc.activated.connect(self.widget_buttons.cancel_fit_button.click)
+        self.widget_buttons.cancel_fit_button.clicked.connect(self._handle_cancel)
+
+        shortcut_ctrl_f1 = QShortcut(QKeySequence(Qt.CTRL + Qt.Key_F1), self)
+        shortcut_ctrl_f1.activated.connect(self.widget_buttons.multi_cole_button.click)
+        self.widget_buttons.multi_cole_button.clicked.connect(
+            lambda: self._handle_multistart_fit("cole", self.widget_buttons.multi_cole_button)
+        )
+
+        shortcut_ctrl_f2 = QShortcut(QKeySequence(Qt.CTRL + Qt.Key_F2), self)
+        shortcut_ctrl_f2.activated.connect(self.widget_buttons.multi_bode_button.click)
+        self.widget_buttons.multi_bode_button.clicked.connect(
+            lambda: self._handle_multistart_fit("bode", self.widget_buttons.multi_bode_button)
+        )
+
+        shortcut_ctrl_k = QShortcut(QKeySequence(Qt.CTRL + Qt.Key_K), self)
+        shortcut_ctrl_k.activated.connect(self.widget_buttons.chain_button.click)
+        self.widget_buttons.chain_button.toggled.connect(self.calculator.set_fit_chain)
+
+        shortcut_ctrl_b = QShortcut(QKeySequence(Qt.CTRL + Qt.Key_B), self)
+        shortcut_ctrl_b.activated.connect(self.widget_buttons.bootstrap_button.click)
+        self.widget_buttons.bootstrap_button.clicked.connect(self._handle_bootstrap)
+
+        shortcut_ctrl_o = QShortcut(QKeySequence(Qt.CTRL + Qt.Key_O), self)
+        shortcut_ctrl_o.activated.connect(self.widget_buttons.optimizer_button.click)
+        self.widget_buttons.optimizer_button.clicked.connect(self._handle_next_optimizer)
+        self._show_optimizer()
+
+        shortcut_ctrl_t = QShortcut(QKeySequence(Qt.CTRL + Qt.Key_T), self)
+        shortcut_ctrl_t.activated.connect(self.widget_buttons.tracking_button.click)
+        self.widget_buttons.tracking_button.setChecked(self.config.tracking_enabled)
+
+        shortcut_ctrl_r = QShortcut(QKeySequence(Qt.CTRL + Qt.Key_R), self)
+        shortcut_ctrl_r.activated.connect(self.widget_buttons.range_sweep_button.click)
+        self.widget_buttons.range_sweep_button.clicked.connect(self._handle_range_sweep)
 
         # The button for the models
         self.toggle_model_button.toggled.connect(self.calculator.switch_circuit_model)
@@ -383,11 +466,14 @@ class MainWidget(QWidget):
         self.widget_graphs.update_timedomain_graph(freqs_uniform, t, volt)
             
         self.calculator.initialize_expdata(self.file_data)
+        self._tracked_range = None
         self.freq_slider.set_list(freq)
         self._update_sliders_data()
             
         self.config.set_input_file_type(self.widget_input_file.get_file_type_name())
         self.config.set_input_file(self.widget_input_file.get_current_file_path())
+
+        self._apply_chain_guess()
             
         #self.widget_at_bottom.clear_text_box()
 
@@ -417,6 +503,16 @@ class MainWidget(QWidget):
             
         self.widget_sliders.set_all_variables(self.v_sliders)
 
+    def _handle_slider_moved_by_user(self, key: str):
+        """
+        Drop the background refinement of a two-stage fit: the user took over.
+        The update of this move shows a preview of V(t).
+        """
+        self._preview_next_update = True
+        if self.calculator.is_refining():
+            print(f"Main: {key} moved, refinement dropped.")
+            self.calculator.cancel_fit(keep_best=False)
+
     def _handle_slider_update(self, key, value):
         """
         Handles incoming slider updates by storing them and starting the debounce timer.
@@ -427,16 +523,42 @@ class MainWidget(QWidget):
         self.update_timer.start(arbitrary_time_delay)  
 
     def _update_sliders_data(self):
-        """Processes all pending slider updates. Updates affected widgets and refreshes the UI."""
+        """
+        Processes all pending slider updates. Updates affected widgets and refreshes the UI.
+        While the user drags a slider, V(t) is a preview, computed again at
+        full resolution once the sliders stay still for preview_delay seconds.
+        """
         
         for key, value in self.pending_updates.items():
             self.v_sliders[key] = value
         self.pending_updates.clear()
 
-        self.calculator.run_model_manual(self.v_sliders)
+        preview = self._preview_next_update and self.config.time_domain_preview_points > 0
+        self._preview_next_update = False
+        self.calculator.run_model_manual(self.v_sliders, preview=preview)
+        self._preview_shown = preview
+        if preview:
+            self.full_resolution_timer.start(int(1000 * self.config.time_domain_preview_delay))
+        else:
+            self.full_resolution_timer.stop()
         v_second = self.calculator.get_latest_secondaries()
         self.widget_at_bottom._update_text(v_second)
 
+    def _update_full_resolution(self):
+        """Replace the V(t) preview of the last slider drag by the full-resolution curve."""
+        if self._preview_shown:
+            self._preview_shown = False
+            self.calculator.run_model_manual(self.v_sliders)
+
+    def _finish_slider_updates(self):
+        """Apply the pending slider updates and the full-resolution V(t) now."""
+        if self.update_timer.isActive():
+            self.update_timer.stop()
+            self._preview_next_update = False
+            self._update_sliders_data()
+        self.full_resolution_timer.stop()
+        self._update_full_resolution()
+
     def _reset_v_sliders(self, dictionary):
         """
         Resets slider values to the values in the incoming dictionary.
@@ -468,6 +590,27 @@ class MainWidget(QWidget):
 
         self.calculator.initialize_expdata(new_data)
         self.widget_graphs.apply_filter_frequency_range(f_min, f_max)
+        self._track_range(bottom_i, top_i)
+
+    def _track_range(self, bottom_i: int, top_i: int):
+        """
+        With Ctrl+T on, re-solve the sliders with the cost of the last fit when
+        the range moved by at most [Tracking] max_shift points.
+        """
+        previous, self._tracked_range = self._tracked_range, (bottom_i, top_i)
+        if (not self.widget_buttons.tracking_button.isChecked() or previous is None
+                or previous == self._tracked_range or self.calculator.is_busy()):
+            return
+        if abs(bottom_i - previous[0]) + abs(top_i - previous[1]) > self.calculator.tracking_shift:
+            return
+        try:
+            self.calculator.track_fit(self._last_fit_cost, {**self.v_sliders, **self.pending_updates})
+        except ValueError as e:
+            print(f"Main._track_range: {e}")
+            return
+        telemetry = self.calculator.tracking_telemetry()
+        self.status_bar.showMessage(f"Tracking {telemetry.cost_function}: {telemetry.nfev} evaluations in "
+                                    f"{1000 * telemetry.wall:.0f} ms, cost {telemetry.cost:.4g}")
 
     def _handle_set_allfreqs(self):
         """
@@ -485,6 +628,212 @@ class MainWidget(QWidget):
         # TODO: Update time-domain graph if needed.
         self._update_sliders_data()
 
+    def _handle_fit(self, cost: str):
+        """
+        Start the Cole or Bode fit of the current file in the background. The
+        sliders follow its progress; Esc stops it and keeps the best point.
+        """
+        button = self.widget_buttons.f2_button if cost == "bode" else self.widget_buttons.f1_button
+        if not self.calculator.start_fit(cost, self.v_sliders):
+            print("Main._handle_fit: a fit or job is already running (Esc cancels it).")
+            return
+
+        file_name = self.widget_input_file.get_current_file_name()
+        self._running_fit = (button, button.text(), file_name, file_name == self._chain_warm_file)
+        self._last_fit_cost = cost
+        coarse = self.calculator.coarse_fit_telemetry()
+        if coarse is not None:
+            self.status_bar.showMessage(f"Coarse {cost} fit: {coarse.nfev} evaluations in {1000 * coarse.wall:.0f} ms, "
+                                        f"cost {coarse.cost:.4g} - refining (moving a slider drops it)")
+
+    def _on_fit_progress(self, evaluations: int, cost: float, params: dict):
+        """Show the best parameters so far and the number of evaluations."""
+        if self._running_fit is None:
+            return
+        button, label, _, _ = self._running_fit
+        button.setText(f"{label} {evaluations} ev, cost {cost:.3g}")
+        self.widget_sliders.set_all_variables(params)
+
+    def _on_fit_finished(self, best_fit: dict):
+        """
+        Restore the fit button and keep the fit for the warm starts of the
+        next files.
+        """
+        if self._running_fit is None:
+            return
+        button, label, file_name, warm = self._running_fit
+        self._running_fit = None
+        button.setText(label)
+        if not best_fit:
+            print("Main: fit cancelled.")
+            self.status_bar.showMessage("Fit cancelled")
+            return
+        self._show_fit_telemetry(file_name)
+        if self.calculator.fit_builder.last_fit_cached:
+            stats = self.calculator.fit_cache_stats()
+            print(f"Fit cache: same fit found ({stats['hits']} hits, {stats['misses']} misses, "
+                  f"{stats['entries']} entries)")
+
+        saved = self.calculator.record_chain_fit(file_name, best_fit, warm=warm)
+        if saved is not None:
+            evaluations = self.calculator.fit_builder.last_evaluations
+            print(f"Chain: {file_name} fitted in {evaluations} evaluations, {saved:+d} saved "
+                  f"compared with the mean of {self.calculator.fit_chain.cold_fit_count()} cold fit(s)")
+            button = self.widget_buttons.chain_button
+            button.setText(f"{button.on_label} ({saved:+d})")
+
+    def _show_fit_telemetry(self, file_name: str):
+        """
+        Show the telemetry of the last fit in the status bar, compared with
+        the median fit of the session.
+        """
+        telemetry = self.calculator.fit_telemetry()
+        if telemetry is None:
+            return
+        self._telemetry = (file_name, telemetry)
+        message = telemetry.summary()
+        stats = self.calculator.fit_builder.telemetry_log.stats()
+        if stats["fits"] > 1 and not telemetry.cached:
+            message += f" | session median {stats['median_wall']:.3g} s over {stats['fits']} fits"
+            if telemetry.wall > 3 * stats["median_wall"]:
+                message = "SLOW " + message
+        self.status_bar.showMessage(message)
+
+    def _handle_cancel(self):
+        """Stop the running fit or pool job, keeping its best point or completed part."""
+        self.calculator.cancel_fit(keep_best=True)
+        self.calculator.cancel_job(keep_best=True)
+
+    def _handle_undo_fit(self):
+        """Drop a running fit or job, then restore the sliders as they were before the last fit."""
+        self.calculator.cancel_fit(keep_best=False, wait=True)
+        self.calculator.cancel_job(keep_best=False, wait=True)
+        self.calculator.fit_builder.recover_previous_fit()
+
+    def _apply_chain_guess(self):
+        """
+        When chaining is on, start the new file from the fit of the closest
+        fitted file.
+        """
+        self._chain_warm_file = None
+        guess = self.calculator.chain_initial_guess()
+        if guess is None:
+            return
+
+        params, source = guess
+        self._chain_warm_file = self.widget_input_file.get_current_file_name()
+        print(f"Chain: starting {self._chain_warm_file} from the fit of {source}")
+        self.widget_sliders.set_all_variables(params)
+
+    def _handle_multistart_fit(self, cost: str, button: QPushButton):
+        """
+        Start a multi-start fit in the background, showing the number of
+        finished starts on the button; Esc stops it and keeps the best of the
+        finished starts.
+        """
+        if not self.calculator.start_multistart(self.v_sliders, cost):
+            print("Main._handle_multistart_fit: a fit or job is already running (Esc cancels it).")
+            return
+        self._last_fit_cost = cost
+        self._running_job = (button, button.text(), self.widget_input_file.get_current_file_name(), cost)
+        self._on_job_progress(0, self.calculator.multistart_starts)
+
+    def _on_job_progress(self, done: int, total: int):
+        """Show the number of completed tasks of the running job on its button."""
+        if self._running_job is None:
+            return
+        button, label, _, _ = self._running_job
+        button.setText(f"{label} {done}/{total}")
+
+    def _on_job_finished(self, name: str, result):
+        """Restore the button of the job and show its result."""
+        if self._running_job is None:
+            return
+        button, label, file_name, cost = self._running_job
+        self._running_job = None
+        button.setText(label)
+        if result is None:
+            print(f"Main: {name} stopped without a result.")
+            self.status_bar.showMessage(f"{name} stopped without a result")
+            return
+        if name == "multistart":
+            print(f"Multi-start {cost}: best cost {result.ranked[0][0]:.6g} "
+                  f"of {len(result.ranked)} successful starts")
+        elif name == "bootstrap":
+            self._show_bootstrap(result, file_name, cost)
+        elif name == "sweep":
+            self._show_range_sweep(result, file_name)
+
+    def _handle_bootstrap(self):
+        """
+        Start the bootstrap of the current slider values as the fit of the
+        current file, with the cost of the last fit, in the background. The
+        intervals are printed and added to the next F4 row of this file; Esc
+        stops it and keeps the completed replicates.
+        """
+        if self.calculator.bootstrap_replicates < 1:
+            print("Main._handle_bootstrap: set replicates in the [Bootstrap] section of config.ini.")
+            return
+        if not self.calculator.start_bootstrap(dict(self.v_sliders), self._last_fit_cost):
+            print("Main._handle_bootstrap: a fit or job is running (Esc cancels it).")
+            return
+        button = self.widget_buttons.bootstrap_button
+        self._running_job = (button, button.text(), self.widget_input_file.get_current_file_name(),
+                             self._last_fit_cost)
+        self._on_job_progress(0, self.calculator.bootstrap_replicates)
+
+    def _show_bootstrap(self, result, file_name: str, cost: str):
+        """Keep the bootstrap intervals for the next F4 row of file_name and print them."""
+        self._bootstrap = (file_name, result)
+        print(f"Bootstrap of {file_name} ({cost}, {self.calculator.bootstrap_mode}): "
+              f"{result.replicates}/{result.requested} replicates, {result.level:g}% intervals")
+        for key in ("Rh", "Fh", "Ph", "Rm", "Fm", "Pm", "Rl", "Fl", "Pl", "R0", "mx", "mt"):
+            if key in result.intervals:
+                low, high = result.intervals[key]
+                print(f"    {key:<4} [{low:.4g}, {high:.4g}]")
+
+    def _handle_range_sweep(self):
+        """
+        Start the refits of the current file on the grid of frequency
+        sub-ranges in the background, from the current sliders and with the
+        cost of the last fit, and show the maps when it ends. Esc stops it
+        and shows the rows completed so far.
+        """
+        if self.file_data["freq"] is None:
+            return
+        if not self.calculator.start_range_sweep(self.file_data, dict(self.v_sliders), self._last_fit_cost):
+            print("Main._handle_range_sweep: a fit or job is running (Esc cancels it).")
+            return
+        button = self.widget_buttons.range_sweep_button
+        self._running_job = (button, button.text(), self.widget_input_file.get_current_file_name(),
+                             self._last_fit_cost)
+        self._on_job_progress(0, self.calculator.sweep_steps)
+
+    def _show_range_sweep(self, result, file_name: str):
+        """Show the maps of a range sweep of file_name."""
+        self._range_sweep_window = WidgetRangeSweep(result, file_name, self.config.sweep_parameter, self)
+        self._range_sweep_window.range_selected.connect(self._apply_sweep_range)
+        self._range_sweep_window.show()
+
+    def _apply_sweep_range(self, start: int, end: int, fit: dict):
+        """Set the frequency range and the sliders to one cell of the range sweep."""
+        self.freq_slider.set_range(start, end)
+        self.widget_sliders.set_all_variables(fit)
+
+    def _handle_next_optimizer(self):
+        """Select the next optimizer backend of the F1/F2 fits."""
+        fit_builder = self.calculator.fit_builder
+        names = fit_builder.optimizer_registry.get_available_optimizers()
+        current = fit_builder.optimizer.name
+        following = names[(names.index(current) + 1) % len(names)] if current in names else names[0]
+        self.calculator.set_optimizer(following)
+        self._show_optimizer()
+        self.status_bar.showMessage(f"Optimizer: {following}")
+
+    def _show_optimizer(self):
+        """Show the optimizer backend on its button."""
+        self.widget_buttons.optimizer_button.setText(f"Ctrl+O Optimizer: {self.calculator.fit_builder.optimizer.name}")
+
     def _handle_set_default(self):
         """
         Resets sliders to their default values and refreshes frequency settings.
@@ -521,13 +870,21 @@ class MainWidget(QWidget):
         self.update_timer.setSingleShot(True)
         self.update_timer.timeout.connect(self._update_sliders_data)
         self.pending_updates = {}
+        # V(t) previews of the slider drags (see _update_sliders_data).
+        self.full_resolution_timer = QTimer()
+        self.full_resolution_timer.setSingleShot(True)
+        self.full_resolution_timer.timeout.connect(self._update_full_resolution)
+        self._preview_next_update = False
+        self._preview_shown = False
         self.value_labels = {}
 
     def _print_model_parameters(self):
         """
         Called when Print is requested.
         Merges slider values, timestamp, and file information before writing output.
+        The time-domain values always come from a full-resolution V(t).
         """
+        self._finish_slider_updates()
         date = {'date/time': datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
         file = {'file': self.widget_input_file.get_current_file_name()}
         v_copy = self.v_sliders.copy()
@@ -541,9 +898,18 @@ class MainWidget(QWidget):
         model_dictionary = self.calculator.get_model_parameters()
         graphs_dictionary = self.widget_graphs.get_graphs_parameters()
         bottom_dictionary= self.widget_at_bottom.get_comment()
+        # Intervals of the last bootstrap, if it was run on this file.
+        interval_dictionary = {}
+        if self._bootstrap is not None and self._bootstrap[0] == file['file']:
+            interval_dictionary = self._bootstrap[1].columns()
+        # Telemetry of the last fit, if it was a fit of this file.
+        telemetry_dictionary = {}
+        if self._telemetry is not None and self._telemetry[0] == file['file']:
+            telemetry_dictionary = self._telemetry[1].columns()
 
         self.widget_output_file.write_to_file(
             main_dictionary | model_dictionary | graphs_dictionary | bottom_dictionary
+            | interval_dictionary | telemetry_dictionary
         )
 
 